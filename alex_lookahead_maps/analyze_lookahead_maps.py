@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+
+# Compares the quality of lookahead maps.
+#
+# The maps (text, capnp, or npy; see convert_lookahead_map.py) are loaded as
+# arrays and diffed cell by cell against the first map: how many cells differ,
+# which map is higher, and by how much, by the Manhattan distance of the cell.
+#
+# The maps can also be joined with the per-connection data of routing runs
+# (<circuit>_connection_data.csv, see vpr_profiling/data_analysis). If the data
+# has the dx, dy, and actual routed delay of each connection, the estimate of
+# each map is compared with the routed delay: overestimating connections (a
+# ratio above 1) make the search inadmissible, which hurts determinism and QoR,
+# and underestimating ones make the router pop more nodes off the heap, so the
+# heap pops are reported by how much the map underestimates. Otherwise, only
+# the Manhattan distance of each connection is known, and the heap pops and
+# route time are reported by distance next to the estimate of each map at that
+# distance.
+
+import os
+import sys
+import math
+import pathlib
+import argparse
+
+import numpy as np
+
+import convert_lookahead_map
+
+# The connection data helpers are shared with the data analysis scripts.
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()) + "/../vpr_profiling/data_analysis")
+import connection_data
+
+# Entries which could not be filled when the map was built hold FLT_MAX.
+UNFILLED_THRESHOLD = 1e38
+
+# Bounds of the buckets of the ratio of the estimated to the routed delay.
+RATIO_BUCKETS = [0.0, 0.25, 0.5, 0.8, 0.95, 1.05, 1.25, 2.0, math.inf]
+
+# Default names of the columns of the connection data used for the join.
+DEFAULT_DX_COLUMN = "Delta X"
+DEFAULT_DY_COLUMN = "Delta Y"
+DEFAULT_DELAY_COLUMN = "Routed Delay"
+DEFAULT_CHAN_COLUMN = "Chan"
+DEFAULT_SEG_COLUMN = "Seg Type"
+DISTANCE_COLUMN = "Manhattan Distance"
+
+# Helper method to get the name of a map from its file.
+def get_map_name(map_file):
+    return os.path.splitext(os.path.basename(map_file))[0]
+
+# Helper method to get the geomean of the positive values of an array.
+def geomean(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[values > 0]
+    if len(values) == 0:
+        return math.nan
+    return math.exp(np.log(values).mean())
+
+# Helper method to format the geomean of a list of values for a table, or "-"
+# if there are no positive values to take it of.
+def format_geomean(values, format_spec):
+    value = geomean(values)
+    if math.isnan(value):
+        return "-"
+    return format(value, format_spec)
+
+# Helper method to get the Manhattan distance (dx + dy) of every cell of a map.
+def get_cell_distances(shape):
+    _, _, num_dxs, num_dys = shape
+    return np.add.outer(np.arange(num_dxs), np.arange(num_dys))
+
+# Helper method to get the buckets of distances (of width bucket_width) as
+# (label, low, high) tuples covering 0 to max_distance.
+def get_distance_buckets(max_distance, bucket_width):
+    buckets = []
+    for low in range(0, max_distance + 1, bucket_width):
+        high = min(low + bucket_width - 1, max_distance)
+        buckets.append((str(low) if low == high else f"{low}-{high}", low, high))
+    return buckets
+
+# Helper method to print a table of rows (lists of strings) with a header.
+def print_table(header, rows):
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(header)]
+    print("  ".join(column.rjust(width) for column, width in zip(header, widths)))
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+
+# Diff a map with the reference map cell by cell, printing the differences of
+# each field overall and by distance.
+def diff_maps(reference_name, reference, name, lookahead_map, rtol, bucket_width):
+    print(f"{name} vs {reference_name}:")
+    if lookahead_map.get_shape() != reference.get_shape():
+        print(f"    The maps have different shapes: {lookahead_map.get_shape()} and {reference.get_shape()}")
+        print("")
+        return
+    distances = np.broadcast_to(get_cell_distances(reference.get_shape()), reference.get_shape())
+    # field -> (filled cells, ratio of each cell, cells which differ)
+    diffs = dict()
+    for field in ["delay", "congestion"]:
+        ref_values = np.asarray(getattr(reference, field), dtype=np.float64)
+        values = np.asarray(getattr(lookahead_map, field), dtype=np.float64)
+        ref_unfilled = ref_values >= UNFILLED_THRESHOLD
+        unfilled = values >= UNFILLED_THRESHOLD
+        filled = ~ref_unfilled & ~unfilled
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(filled, values / ref_values, 1.0)
+        different = filled & (np.abs(ratio - 1.0) > rtol)
+        diffs[field] = (filled, ratio, different)
+        print(f"    {field}: {int(different.sum())} of {int(filled.sum())} filled cells differ "
+              f"({int((different & (ratio > 1.0)).sum())} higher, {int((different & (ratio < 1.0)).sum())} lower)"
+              f", geomean ratio {format_geomean(ratio[filled], '.4f')}, min {ratio[filled].min():.4f}, "
+              f"max {ratio[filled].max():.4f}")
+        if (ref_unfilled != unfilled).any():
+            print(f"    {field}: {int((unfilled & ~ref_unfilled).sum())} cells are unfilled only in {name}, "
+                  f"{int((ref_unfilled & ~unfilled).sum())} only in {reference_name}")
+    rows = []
+    for label, low, high in get_distance_buckets(int(distances.max()), bucket_width):
+        in_bucket = (distances >= low) & (distances <= high)
+        row = [label, str(int(in_bucket.sum()))]
+        for filled, ratio, different in diffs.values():
+            row += [str(int((different & in_bucket).sum())), format_geomean(ratio[filled & in_bucket], '.4f')]
+        rows.append(row)
+    print_table(["distance", "cells", "delay diffs", "delay ratio", "cong diffs", "cong ratio"], rows)
+    print("")
+
+# Load the columns of the connection data which are used in the join.
+def load_connections(csv_file, dx_column, dy_column, delay_column, chan_column, seg_column):
+    columns = connection_data.load_columns(csv_file)
+    names = list(columns.keys())
+    connections = {
+        "route_time": columns[connection_data.find_column(names, connection_data.ROUTE_TIME_COLUMN)],
+        "heap_pops": columns[connection_data.find_column(names, connection_data.HEAP_POPS_COLUMN)],
+    }
+    # The other columns are optional.
+    for key, column in [("dx", dx_column), ("dy", dy_column), ("delay", delay_column), ("chan", chan_column),
+                        ("seg", seg_column), ("distance", DISTANCE_COLUMN)]:
+        try:
+            connections[key] = columns[connection_data.find_column(names, column)]
+        except ValueError:
+            pass
+    return connections
+
+# Get the delay each map estimates for each connection from its dx and dy (and
+# the channel and segment type of the connection if they are known; otherwise
+# the lowest estimate over them is used). Deltas beyond the map are clamped.
+def estimate_connection_delays(lookahead_map, connections):
+    num_segs, num_chans, num_dxs, num_dys = lookahead_map.get_shape()
+    delay = np.asarray(lookahead_map.delay, dtype=np.float64)
+    dx = np.clip(np.abs(connections["dx"].astype(np.int64)), 0, num_dxs - 1)
+    dy = np.clip(np.abs(connections["dy"].astype(np.int64)), 0, num_dys - 1)
+    if "seg" in connections and "chan" in connections:
+        seg = np.clip(connections["seg"].astype(np.int64), 0, num_segs - 1)
+        chan = np.clip(connections["chan"].astype(np.int64), 0, num_chans - 1)
+        return delay[seg, chan, dx, dy]
+    return delay.min(axis=(0, 1))[dx, dy]
+
+# Compare the estimates of each map with the routed delay of every connection.
+def print_estimate_errors(names, maps, connections):
+    routed_delay = connections["delay"].astype(np.float64)
+    heap_pops = connections["heap_pops"].astype(np.float64)
+    route_time = connections["route_time"].astype(np.float64)
+    valid = routed_delay > 0
+    print(f"Estimated vs routed delay of {int(valid.sum())} connections:")
+    for name, lookahead_map in zip(names, maps):
+        estimate = estimate_connection_delays(lookahead_map, connections)
+        usable = valid & (estimate < UNFILLED_THRESHOLD)
+        ratio = estimate[usable] / routed_delay[usable]
+        pops = heap_pops[usable]
+        times = route_time[usable]
+        print(f"{name}:")
+        if len(ratio) == 0:
+            print("    No connections with an estimate.")
+            continue
+        over = ratio > 1.0
+        p10, p50, p90 = np.percentile(ratio, [10, 50, 90])
+        print(f"    Overestimated: {over.mean() * 100.0:.2f}% of the connections "
+              f"(geomean ratio {format_geomean(ratio[over], '.4f')})" if over.any() else
+              "    Overestimated: 0% of the connections (admissible)")
+        print(f"    Ratio of estimate to routed delay: geomean {format_geomean(ratio, '.4f')}, P10 {p10:.4f}, "
+              f"P50 {p50:.4f}, P90 {p90:.4f}")
+        print(f"    Geomean heap pops: {format_geomean(pops, '.1f')} "
+              f"(underestimated: {format_geomean(pops[~over], '.1f')}, "
+              f"overestimated: {format_geomean(pops[over], '.1f')})")
+        print(f"    Unfilled estimates: {int((valid & (estimate >= UNFILLED_THRESHOLD)).sum())} connections")
+        rows = []
+        for low, high in zip(RATIO_BUCKETS[:-1], RATIO_BUCKETS[1:]):
+            in_bucket = (ratio >= low) & (ratio < high)
+            if not in_bucket.any():
+                continue
+            rows.append([f"[{low:g}, {high:g})", str(int(in_bucket.sum())),
+                         f"{in_bucket.mean() * 100.0:.2f}", format_geomean(pops[in_bucket], '.1f'),
+                         f"{times[in_bucket].sum() * 100.0 / max(times.sum(), 1e-300):.2f}"])
+        print_table(["estimate/routed", "connections", "% conns", "geomean pops", "% route time"], rows)
+    print("")
+
+# Without the routed delays, report the effort of the router by the Manhattan
+# distance of the connections, next to what each map estimates at that distance
+# (the lowest estimate of any cell at the distance).
+def print_effort_by_distance(names, maps, connections, bucket_width):
+    distance = connections["distance"].astype(np.int64)
+    heap_pops = connections["heap_pops"].astype(np.float64)
+    route_time = connections["route_time"].astype(np.float64)
+    print(f"Router effort by Manhattan distance of {len(distance)} connections (no routed delays in the data):")
+    buckets = get_distance_buckets(int(distance.max()), bucket_width)
+    estimates = []
+    for lookahead_map in maps:
+        cell_distances = get_cell_distances(lookahead_map.get_shape())
+        delay = np.asarray(lookahead_map.delay, dtype=np.float64).min(axis=(0, 1))
+        delay = np.where(delay >= UNFILLED_THRESHOLD, np.inf, delay)
+        estimates.append((cell_distances, delay))
+    rows = []
+    for label, low, high in buckets:
+        in_bucket = (distance >= low) & (distance <= high)
+        if not in_bucket.any():
+            continue
+        row = [label, str(int(in_bucket.sum())), format_geomean(heap_pops[in_bucket], '.1f'),
+               f"{route_time[in_bucket].sum() * 100.0 / max(route_time.sum(), 1e-300):.2f}"]
+        for cell_distances, delay in estimates:
+            cells = (cell_distances >= low) & (cell_distances <= high)
+            row.append(f"{delay[cells].min():.4g}" if cells.any() and np.isfinite(delay[cells]).any() else "-")
+        rows.append(row)
+    print_table(["distance", "connections", "geomean pops", "% route time"] + [f"{name} (s)" for name in names], rows)
+    print("")
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Diffs lookahead maps and compares their estimates with routed connections.",
+    )
+    parser.add_argument("maps", nargs="+", help="lookahead maps (text, capnp, or npy); the first is the reference")
+    parser.add_argument("-connections", nargs="+", default=[], metavar="CSV_FILE",
+                        help="per-connection data of routing runs to join the maps with")
+    parser.add_argument("-rtol", default=convert_lookahead_map.DEFAULT_RTOL, type=float,
+                        help="relative tolerance for cells to be considered different")
+    parser.add_argument("-distance-bucket", default=5, type=int, metavar="WIDTH",
+                        help="width of the buckets of Manhattan distance")
+    parser.add_argument("-dx-column", default=DEFAULT_DX_COLUMN, type=str)
+    parser.add_argument("-dy-column", default=DEFAULT_DY_COLUMN, type=str)
+    parser.add_argument("-delay-column", default=DEFAULT_DELAY_COLUMN, type=str,
+                        help="column of the routed delay of each connection (in seconds)")
+    parser.add_argument("-chan-column", default=DEFAULT_CHAN_COLUMN, type=str)
+    parser.add_argument("-seg-column", default=DEFAULT_SEG_COLUMN, type=str)
+    return parser
+
+def analyze_lookahead_maps_main(arg_list, prog=None):
+    args = command_parser(prog).parse_args(arg_list)
+
+    names = [get_map_name(map_file) for map_file in args.maps]
+    maps = [convert_lookahead_map.load_map(map_file) for map_file in args.maps]
+    for name, lookahead_map in zip(names, maps):
+        num_segs, num_chans, num_dxs, num_dys = lookahead_map.get_shape()
+        print(f"{name}: {num_segs} segment types, {num_chans} channels, {num_dxs} x {num_dys} deltas")
+    print("")
+
+    for name, lookahead_map in zip(names[1:], maps[1:]):
+        diff_maps(names[0], maps[0], name, lookahead_map, args.rtol, args.distance_bucket)
+
+    for csv_file in args.connections:
+        print(f"Connections of {connection_data.get_circuit_name(csv_file)}:")
+        connections = load_connections(csv_file, args.dx_column, args.dy_column, args.delay_column,
+                                       args.chan_column, args.seg_column)
+        if all(key in connections for key in ["dx", "dy", "delay"]):
+            print_estimate_errors(names, maps, connections)
+        elif "distance" in connections:
+            print_effort_by_distance(names, maps, connections, args.distance_bucket)
+        else:
+            print(f"ERROR: {csv_file} has neither the {args.dx_column}, {args.dy_column}, and "
+                  f"{args.delay_column} columns nor the {DISTANCE_COLUMN} column.")
+
+if __name__ == "__main__":
+    analyze_lookahead_maps_main(sys.argv[1:])
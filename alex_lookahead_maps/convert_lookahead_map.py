@@ -0,0 +1,416 @@
+#!/usr/bin/python3
+
+# Converts the text lookahead maps provided by Alex Poupakis into the formats
+# which can be loaded without parsing them.
+#
+# A text map is parsed into dense float32 arrays of the delay and congestion of
+# every entry, indexed by [seg, chan, dx, dy], and checked against its
+# "INFO: Total:" header (every entry of every segment type and channel must be
+# given exactly once). The map is then written as:
+#   <map>.capnp  a map router lookahead which VPR reads with
+#                --read_router_lookahead (in the same layout as the maps in
+#                may_18_maps/ and may_22_maps/)
+#   <map>.npy    the raw arrays, shaped [2 (delay, congestion), seg, chan, dx, dy],
+#                which can be memory-mapped with np.load(mmap_mode="r")
+#
+# Converted maps are cached by the hash of the text map's content (in
+# .map_cache/), so loading a map which has been seen before takes no parsing.
+#
+# The capnp files are encoded by hand (there is no capnp dependency): the root
+# VprMapLookahead struct points to a Matrix of VprMapCostEntry, whose dims are
+# [1, 1, chan, seg, dx, dy] (the dims of t_wire_cost_map) and whose data is a
+# list of Entry structs, each pointing to the (delay, congestion) of an entry.
+
+import os
+import re
+import sys
+import json
+import struct
+import shutil
+import pathlib
+import argparse
+import tempfile
+
+import numpy as np
+
+# The result cache's hashing and atomic writes are shared with the testing
+# scripts.
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()) + "/../testing")
+import result_cache
+
+SCRIPT_DIR = str(pathlib.Path(__file__).parent.resolve())
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, ".map_cache")
+
+# Version of the layout of the cached maps.
+CACHE_VERSION = 1
+
+# Relative tolerance used when comparing maps. The text maps hold 6 significant
+# digits.
+DEFAULT_RTOL = 1e-5
+
+TOTAL_PATTERN = re.compile(r"INFO: Total: SegmentTypes (\d+), Channels (\d+), Delta_xs (\d+), Delta_ys (\d+)")
+CHANNEL_WIDTH_PATTERN = re.compile(r"INFO: ChannelWidth (\d+)")
+SEG_TYPE_PATTERN = re.compile(r"SegTypeId (\d+) \((.*)\) Chan (\d+)")
+
+class LookaheadMapError(Exception):
+    pass
+
+# A lookahead map: the delay and congestion of every entry, indexed by
+# [seg, chan, dx, dy].
+class LookaheadMap:
+    def __init__(self, delay, congestion, channel_width=None, segment_names=None):
+        self.delay = delay
+        self.congestion = congestion
+        self.channel_width = channel_width
+        self.segment_names = segment_names
+
+    def get_shape(self):
+        return self.delay.shape
+
+# Parse a text lookahead map, checking it against its "INFO: Total:" header.
+# Raises a LookaheadMapError if the map does not match its header.
+def parse_text_map(map_file):
+    with open(map_file, 'r') as f:
+        lines = f.read().splitlines()
+
+    shape = None
+    channel_width = None
+    segment_names = dict()
+    # (seg, chan) -> lines of the entries of the block
+    blocks = dict()
+    block = None
+    for line_number, line in enumerate(lines, start=1):
+        if line.strip() == "":
+            continue
+        if line.startswith("INFO: Total:"):
+            match = TOTAL_PATTERN.match(line)
+            if not match:
+                raise LookaheadMapError(f"{map_file}:{line_number}: Could not parse the header: {line}")
+            shape = tuple(int(value) for value in match.groups())
+        elif line.startswith("INFO: "):
+            match = CHANNEL_WIDTH_PATTERN.match(line)
+            if match:
+                channel_width = int(match.group(1))
+        elif line.startswith("SegTypeId"):
+            match = SEG_TYPE_PATTERN.match(line)
+            if not match:
+                raise LookaheadMapError(f"{map_file}:{line_number}: Could not parse the segment type: {line}")
+            seg_index, chan_index = int(match.group(1)), int(match.group(3))
+            segment_names[seg_index] = match.group(2)
+            block = blocks.setdefault((seg_index, chan_index), [])
+        else:
+            if block is None:
+                raise LookaheadMapError(f"{map_file}:{line_number}: Entry before any SegTypeId line")
+            block.append(line)
+
+    if shape is None:
+        raise LookaheadMapError(f"{map_file}: No \"INFO: Total:\" header")
+    num_segs, num_chans, num_dxs, num_dys = shape
+    delay = np.full(shape, np.nan, dtype=np.float32)
+    congestion = np.full(shape, np.nan, dtype=np.float32)
+    for (seg_index, chan_index), block in blocks.items():
+        if seg_index >= num_segs or chan_index >= num_chans:
+            raise LookaheadMapError(f"{map_file}: SegTypeId {seg_index} Chan {chan_index} is outside of the "
+                                    f"{num_segs} segment types and {num_chans} channels of the header")
+        # Each entry is "dx, dy : delay, congestion".
+        try:
+            values = np.array(" ".join(block).replace(",", " ").replace(":", " ").split(), dtype=np.float64)
+            values = values.reshape(-1, 4)
+        except ValueError:
+            raise LookaheadMapError(f"{map_file}: Could not parse the entries of SegTypeId {seg_index} Chan {chan_index}")
+        dx = values[:, 0].astype(np.int64)
+        dy = values[:, 1].astype(np.int64)
+        if dx.min() < 0 or dy.min() < 0 or dx.max() >= num_dxs or dy.max() >= num_dys:
+            raise LookaheadMapError(f"{map_file}: An entry of SegTypeId {seg_index} Chan {chan_index} is outside of "
+                                    f"the {num_dxs} x {num_dys} deltas of the header")
+        flat = dx * num_dys + dy
+        if len(np.unique(flat)) != len(flat):
+            raise LookaheadMapError(f"{map_file}: SegTypeId {seg_index} Chan {chan_index} has duplicate entries")
+        delay[seg_index, chan_index].flat[flat] = values[:, 2]
+        congestion[seg_index, chan_index].flat[flat] = values[:, 3]
+
+    missing = np.argwhere(np.isnan(delay))
+    if len(missing) != 0:
+        seg_index, chan_index, dx, dy = missing[0]
+        raise LookaheadMapError(f"{map_file}: {len(missing)} entries are missing (such as SegTypeId {seg_index} "
+                                f"Chan {chan_index} entry {dx}, {dy})")
+
+    return LookaheadMap(delay, congestion, channel_width,
+                        [segment_names.get(seg_index, "") for seg_index in range(num_segs)])
+
+# Helper method to make a capnp pointer word.
+def struct_pointer(offset, data_words, pointer_words):
+    return ((offset & 0x3fffffff) << 2) | (data_words << 32) | (pointer_words << 48)
+
+def list_pointer(offset, element_size, count):
+    return 1 | ((offset & 0x3fffffff) << 2) | (element_size << 32) | (count << 35)
+
+# capnp list element sizes.
+LIST_EIGHT_BYTES = 5
+LIST_COMPOSITE = 7
+
+# Encode a lookahead map as a single segment capnp message.
+def encode_capnp(lookahead_map):
+    num_segs, num_chans, num_dxs, num_dys = lookahead_map.get_shape()
+    dims = [1, 1, num_chans, num_segs, num_dxs, num_dys]
+    # The entries are in the order of the dims (row-major).
+    delay = np.ascontiguousarray(lookahead_map.delay.transpose(1, 0, 2, 3)).ravel()
+    congestion = np.ascontiguousarray(lookahead_map.congestion.transpose(1, 0, 2, 3)).ravel()
+    num_entries = len(delay)
+
+    # Words of the segment:
+    #   0            root pointer -> VprMapLookahead (0 data words, 1 pointer)
+    #   1            costMap -> Matrix (0 data words, 2 pointers)
+    #   2, 3         dims -> List(Int64), data -> List(Entry)
+    #   4 - 9        the dims
+    #   10           tag of the data list (Entry has 0 data words, 1 pointer)
+    #   11 - ...     the Entry structs, each pointing to its value
+    #   11 + N - ... the values (1 data word: delay, congestion)
+    entries_start = 11
+    values_start = entries_start + num_entries
+    words = np.zeros(values_start + num_entries, dtype=np.uint64)
+    words[0] = struct_pointer(0, 0, 1)
+    words[1] = struct_pointer(0, 0, 2)
+    words[2] = list_pointer(4 - 3, LIST_EIGHT_BYTES, len(dims))
+    words[3] = list_pointer(10 - 4, LIST_COMPOSITE, num_entries)
+    words[4:10] = np.array(dims, dtype=np.int64).view(np.uint64)
+    words[10] = struct_pointer(num_entries, 0, 1)
+    # Every Entry is num_entries - 1 words before its value.
+    words[entries_start:values_start] = struct_pointer(num_entries - 1, 1, 0)
+    values = np.empty(num_entries, dtype=[("delay", "<f4"), ("congestion", "<f4")])
+    values["delay"] = delay
+    values["congestion"] = congestion
+    words[values_start:] = values.view(np.uint64)
+
+    # The segment table: the number of segments - 1, then the size of each
+    # segment in words (padded to a whole word).
+    header = struct.pack("<II", 0, len(words))
+    return header + words.astype("<u8").tobytes()
+
+# Reader of capnp messages, following the pointers of the message (including
+# far pointers between segments).
+class CapnpReader:
+    def __init__(self, data):
+        num_segments = struct.unpack_from("<I", data, 0)[0] + 1
+        sizes = struct.unpack_from(f"<{num_segments}I", data, 4)
+        offset = 4 + 4 * num_segments
+        offset += offset % 8
+        self.segments = []
+        for size in sizes:
+            self.segments.append(np.frombuffer(data, dtype="<u8", count=size, offset=offset))
+            offset += size * 8
+
+    # Follow the pointer at the given word, returning (segment, word the
+    # pointer's target starts at, the pointer word describing the target).
+    def follow(self, segment, position):
+        pointer = int(self.segments[segment][position])
+        kind = pointer & 3
+        if kind != 2:
+            return segment, position + 1 + self._offset(pointer), pointer
+        # Far pointer: the landing pad is in another segment.
+        pad_segment = pointer >> 32
+        pad_position = (pointer >> 3) & 0x1fffffff
+        if (pointer >> 2) & 1 == 0:
+            return self.follow(pad_segment, pad_position)
+        # Double far: the pad is a far pointer to the target, and a tag
+        # describing it.
+        far = int(self.segments[pad_segment][pad_position])
+        tag = int(self.segments[pad_segment][pad_position + 1])
+        return far >> 32, (far >> 3) & 0x1fffffff, tag
+
+    @staticmethod
+    def _offset(pointer):
+        offset = (pointer >> 2) & 0x3fffffff
+        return offset - (1 << 30) if offset & (1 << 29) else offset
+
+    # Get (segment, start of the data, data words, pointer words) of the struct
+    # the pointer at the given word points to.
+    def read_struct(self, segment, position):
+        segment, start, pointer = self.follow(segment, position)
+        if pointer & 3 != 0:
+            raise LookaheadMapError("Expected a struct pointer")
+        return segment, start, (pointer >> 32) & 0xffff, pointer >> 48
+
+    # Get (segment, start of the elements, element size, count) of the list the
+    # pointer at the given word points to.
+    def read_list(self, segment, position):
+        segment, start, pointer = self.follow(segment, position)
+        if pointer & 3 != 1:
+            raise LookaheadMapError("Expected a list pointer")
+        return segment, start, (pointer >> 32) & 7, pointer >> 35
+
+# Decode a lookahead map from a capnp message (such as the maps in may_18_maps/).
+def decode_capnp(data):
+    reader = CapnpReader(data)
+    segment, root, root_data, root_pointers = reader.read_struct(0, 0)
+    # VprMapLookahead.costMap
+    segment, matrix, matrix_data, matrix_pointers = reader.read_struct(segment, root + root_data)
+    if matrix_pointers < 2:
+        raise LookaheadMapError("The cost map has no data")
+    dims_segment, dims_start, element_size, num_dims = reader.read_list(segment, matrix + matrix_data)
+    if element_size != LIST_EIGHT_BYTES:
+        raise LookaheadMapError("The dims of the cost map are not a List(Int64)")
+    dims = reader.segments[dims_segment][dims_start:dims_start + num_dims].view(np.int64).tolist()
+    if len(dims) != 6:
+        raise LookaheadMapError(f"The cost map has {len(dims)} dims, not 6")
+
+    data_segment, data_start, element_size, _ = reader.read_list(segment, matrix + matrix_data + 1)
+    if element_size != LIST_COMPOSITE:
+        raise LookaheadMapError("The data of the cost map is not a list of structs")
+    tag = int(reader.segments[data_segment][data_start])
+    num_entries = (tag >> 2) & 0x3fffffff
+    entry_data, entry_pointers = (tag >> 32) & 0xffff, tag >> 48
+    if num_entries != int(np.prod(dims)):
+        raise LookaheadMapError(f"The cost map has {num_entries} entries, but its dims are {dims}")
+    entry_size = entry_data + entry_pointers
+    delay = np.empty(num_entries, dtype=np.float32)
+    congestion = np.empty(num_entries, dtype=np.float32)
+    for index in range(num_entries):
+        value_segment, value_start, _, _ = reader.read_struct(data_segment, data_start + 1 + index * entry_size + entry_data)
+        delay[index], congestion[index] = reader.segments[value_segment][value_start:value_start + 1].view("<f4")
+    _, _, num_chans, num_segs, num_dxs, num_dys = dims
+    shape = (num_chans, num_segs, num_dxs, num_dys)
+    return LookaheadMap(np.ascontiguousarray(delay.reshape(shape).transpose(1, 0, 2, 3)),
+                        np.ascontiguousarray(congestion.reshape(shape).transpose(1, 0, 2, 3)))
+
+def read_capnp(capnp_file):
+    with open(capnp_file, 'rb') as f:
+        return decode_capnp(f.read())
+
+def write_capnp(lookahead_map, capnp_file):
+    with open(capnp_file, 'wb') as f:
+        f.write(encode_capnp(lookahead_map))
+
+# Write the raw arrays of a map, shaped [2 (delay, congestion), seg, chan, dx, dy].
+def write_npy(lookahead_map, npy_file):
+    np.save(npy_file, np.stack([lookahead_map.delay, lookahead_map.congestion]))
+
+# Load the raw arrays of a map, memory-mapped.
+def read_npy(npy_file):
+    arrays = np.load(npy_file, mmap_mode="r")
+    return LookaheadMap(arrays[0], arrays[1])
+
+# Convert a text map into its cached capnp and raw arrays, unless it already
+# has been. Returns the cache directory of the map.
+def convert_cached(map_file, cache_dir=DEFAULT_CACHE_DIR):
+    map_hash = result_cache.hash_file(map_file)
+    map_cache_dir = os.path.join(cache_dir, map_hash)
+    meta_file = os.path.join(map_cache_dir, "meta.json")
+    if os.path.isfile(meta_file):
+        with open(meta_file, 'r') as f:
+            if json.load(f).get("version") == CACHE_VERSION:
+                return map_cache_dir
+
+    lookahead_map = parse_text_map(map_file)
+    # Build the cache in a temporary directory and rename it into place, so a
+    # reader never sees a half-written map.
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_")
+    try:
+        write_capnp(lookahead_map, os.path.join(temp_dir, "map.capnp"))
+        write_npy(lookahead_map, os.path.join(temp_dir, "map.npy"))
+        result_cache.write_json_atomic(os.path.join(temp_dir, "meta.json"), {
+            "version": CACHE_VERSION,
+            "source": os.path.abspath(map_file),
+            "shape": list(lookahead_map.get_shape()),
+            "channel_width": lookahead_map.channel_width,
+            "segment_names": lookahead_map.segment_names,
+        })
+        if os.path.isdir(map_cache_dir):
+            shutil.rmtree(map_cache_dir)
+        os.rename(temp_dir, map_cache_dir)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return map_cache_dir
+
+# Load a lookahead map (a text map, through its cache, or a capnp or npy file).
+def load_map(map_file, cache_dir=DEFAULT_CACHE_DIR):
+    if map_file.endswith(".capnp"):
+        return read_capnp(map_file)
+    if map_file.endswith(".npy"):
+        return read_npy(map_file)
+    return read_npy(os.path.join(convert_cached(map_file, cache_dir), "map.npy"))
+
+# Compare two maps, returning the number of entries whose delay and whose
+# congestion differ (beyond the relative tolerance), and the largest relative
+# difference of each, as a dictionary of field -> (number, difference).
+def compare_maps(map_a, map_b, rtol=DEFAULT_RTOL):
+    if map_a.get_shape() != map_b.get_shape():
+        raise LookaheadMapError(f"The maps have different shapes: {map_a.get_shape()} and {map_b.get_shape()}")
+    differences = dict()
+    for field in ["delay", "congestion"]:
+        a = np.asarray(getattr(map_a, field), dtype=np.float64)
+        b = np.asarray(getattr(map_b, field), dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative_difference = np.where(a == b, 0.0, np.abs(a - b) / np.maximum(np.abs(a), np.abs(b)))
+        differences[field] = (int((relative_difference > rtol).sum()), float(relative_difference.max()))
+    return differences
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Converts text lookahead maps into capnp (for VPR) and raw arrays (for analysis).",
+    )
+    parser.add_argument("maps", nargs="+", help="text lookahead maps")
+    parser.add_argument("-output-dir", default=None, type=str,
+                        help="directory the <map>.capnp and <map>.npy files are written to (default: next to the maps)")
+    parser.add_argument("-cache-dir", default=DEFAULT_CACHE_DIR, type=str)
+    parser.add_argument("-check", default=None, type=str, metavar="CAPNP_DIR",
+                        help="compare each map with the capnp map of the same name in this directory")
+    parser.add_argument("-rtol", default=DEFAULT_RTOL, type=float,
+                        help="relative tolerance of the comparison with -check")
+    return parser
+
+def convert_lookahead_map_main(arg_list, prog=None):
+    args = command_parser(prog).parse_args(arg_list)
+
+    num_errors = 0
+    for map_file in args.maps:
+        name, _ = os.path.splitext(os.path.basename(map_file))
+        output_dir = args.output_dir if args.output_dir is not None else os.path.dirname(os.path.abspath(map_file))
+        try:
+            map_cache_dir = convert_cached(map_file, args.cache_dir)
+        except LookaheadMapError as error:
+            print("ERROR:", error)
+            num_errors += 1
+            continue
+        os.makedirs(output_dir, exist_ok=True)
+        for extension in [".capnp", ".npy"]:
+            shutil.copyfile(os.path.join(map_cache_dir, "map" + extension), os.path.join(output_dir, name + extension))
+        with open(os.path.join(map_cache_dir, "meta.json"), 'r') as f:
+            meta = json.load(f)
+        print(f"{map_file}: {meta['shape'][0]} segment types, {meta['shape'][1]} channels, "
+              f"{meta['shape'][2]} x {meta['shape'][3]} deltas -> {os.path.join(output_dir, name)}.{{capnp,npy}}")
+
+        if args.check is None:
+            continue
+        # Compare with every capnp map whose name starts with the name of the
+        # text map (such as lookahead_map_vtr_small_80_fixed.capnp).
+        lookahead_map = load_map(map_file, args.cache_dir)
+        capnp_files = sorted(os.path.join(args.check, f) for f in os.listdir(args.check)
+                             if f.startswith(name) and f.endswith(".capnp"))
+        if len(capnp_files) == 0:
+            print(f"    No capnp map for {name} in {args.check}")
+        for capnp_file in capnp_files:
+            try:
+                differences = compare_maps(lookahead_map, read_capnp(capnp_file), args.rtol)
+            except LookaheadMapError as error:
+                print(f"    {os.path.basename(capnp_file)}: ERROR: {error}")
+                num_errors += 1
+                continue
+            statuses = []
+            for field, (num_different, max_relative_difference) in differences.items():
+                if num_different == 0:
+                    statuses.append(f"{field} matches")
+                else:
+                    statuses.append(f"{field} differs in {num_different} entries "
+                                    f"(max relative difference {max_relative_difference:.3g})")
+            print(f"    {os.path.basename(capnp_file)}: " + ", ".join(statuses))
+
+    if num_errors != 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    convert_lookahead_map_main(sys.argv[1:])
@@ -0,0 +1,371 @@
+#!/usr/bin/python3
+
+# Sweeps router lookahead maps over circuits, routing every circuit with every
+# map at the channel width the map was generated for.
+#
+# Each map is matched to its device and channel width by its file name (for
+# example, lookahead_map_vtr_small_80_fixed.capnp is the map of vtr_small at a
+# channel width of 80). Every (map, channel width) point gets its own runNNN
+# directory of the reference test suite of its device, and every circuit of
+# every point is handed to one scheduler, in the same way as run_matrix.py.
+#
+# The VPR options of each point are taken from the script_params of
+# <device>/config/config.txt (next to this script), without the options of
+# run_vtr_flow.py (the ones with a single dash) and without the channel width
+# and lookahead map, which are set by the sweep. Text maps are converted to
+# capnp maps (through the cache of convert_lookahead_map.py) first.
+#
+# The circuits of each device default to the circuit_list_add entries of its
+# config (see -circuits).
+#
+# The status, routing runtime, heap pops, CPD and WL of every circuit are
+# printed as one table, with the geomean of every map, and written to the
+# -output CSV. Circuits which failed to route or timed out are left out of
+# every geomean of their map, so the geomeans of a map are over the same
+# circuits.
+#
+# Example:
+#   ./sweep_lookahead_maps.py ../may_18_maps/*.capnp ../lookahead_map_vtr_small_*.txt \
+#       -tests-reference-dir-base ~/tests -cores 12 -T 4
+
+import os
+import re
+import csv
+import sys
+import math
+import shlex
+import pathlib
+import argparse
+
+SCRIPT_DIR = str(pathlib.Path(__file__).parent.resolve())
+
+sys.path.insert(0, SCRIPT_DIR + "/../../testing")
+import run_test
+import run_manifest
+import scheduler
+
+sys.path.insert(0, SCRIPT_DIR + "/..")
+import convert_lookahead_map
+
+DEFAULT_CHAN_WIDTHS = [80, 160]
+
+CIRCUIT_LIST_PATTERN = re.compile(r"^circuit_list_add=(\S+)")
+
+# Options of the config which are set by the sweep for each point.
+SWEEP_VPR_OPTIONS = ["--route_chan_width", "--read_router_lookahead"]
+
+MAP_NAME_PATTERN = re.compile(r"lookahead_map_(.+?)_(\d+)(?:_|\.|$)")
+
+# Columns of the combined table.
+TABLE_COLUMNS = ["map", "device", "chan_width", "circuit", "status", "runtime", "heap_pops", "cpd", "wl"]
+
+# Columns of the combined table which are averaged over the circuits of a map.
+METRIC_COLUMNS = ["runtime", "heap_pops", "cpd", "wl"]
+
+# The status of a circuit of a point.
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Routes circuits with every given router lookahead map, at the channel width of the map."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    parser.add_argument("map_files", nargs="+")
+    parser.add_argument("-chan-widths", default=DEFAULT_CHAN_WIDTHS, type=int, nargs="+")
+    # The circuits to route (by default, the circuits of each device's config).
+    parser.add_argument("-circuits", default=None, type=str, nargs="+")
+
+    # The reference test suite of each device. Defaults to the device name.
+    parser.add_argument(
+        "-suite",
+        default=[],
+        type=str,
+        action="append",
+        metavar="DEVICE=SUITE",
+    )
+
+    # The options passed through to run_test.py for every point.
+    parser.add_argument("-j", default=1, type=int, metavar="NUM_PROC")
+    parser.add_argument("-cores", default=0, type=int, metavar="NUM_CORES")
+    parser.add_argument("-T", default=0, type=int, metavar="NUM_THREAD")
+    parser.add_argument("-Q", default=0, type=int, metavar="NUM_QUEUES")
+    parser.add_argument("-vtr_dir", default=None, type=str, metavar="VTR_DIR")
+    parser.add_argument("-tests-reference-dir-base", default=None, type=str, metavar="TESTS_REFERENCE_DIR_BASE")
+    parser.add_argument("-extra-vpr-args", default="", type=str, metavar="EXTRA_VPR_ARGS")
+    parser.add_argument("-timeout", default=0, type=float, metavar="TIMEOUT")
+    parser.add_argument("-results-db", default=None, type=str, metavar="RESULTS_DB")
+    parser.add_argument("-cache", action='store_true')
+
+    parser.add_argument("-map-cache-dir", default=convert_lookahead_map.DEFAULT_CACHE_DIR, type=str)
+    parser.add_argument("-output", default="lookahead_sweep.csv", type=str,
+                        help="CSV file to write the combined table to")
+    parser.add_argument("-dry-run", action='store_true',
+                        help="print the points of the sweep without running them")
+
+    return parser
+
+# Helper method to get the name of a map (its file name without extension) and
+# the device and channel width it was generated for (None if the file name does
+# not say).
+def get_map_info(map_file):
+    map_name = os.path.splitext(os.path.basename(map_file))[0]
+    match = MAP_NAME_PATTERN.search(os.path.basename(map_file))
+    if match is None:
+        return map_name, None, None
+    return map_name, match.group(1), int(match.group(2))
+
+# Helper method to get the VPR options of the script_params of a config, without
+# the options of run_vtr_flow.py and the options set by the sweep.
+def get_config_vpr_args(config_file):
+    params = []
+    with open(config_file, 'r') as f:
+        for line in f:
+            if line.startswith("script_params="):
+                params += shlex.split(line.split("=", 1)[1])
+    vpr_args = []
+    i = 0
+    while i < len(params):
+        option = params[i]
+        i += 1
+        has_value = i < len(params) and not params[i].startswith("-")
+        if option.startswith("--") and option not in SWEEP_VPR_OPTIONS:
+            vpr_args.append(option)
+            if has_value:
+                vpr_args.append(params[i])
+        if has_value:
+            i += 1
+    return vpr_args
+
+# Helper method to get the circuits of a config (the circuit_list_add entries,
+# without their extension).
+def get_config_circuits(config_file):
+    circuits = []
+    with open(config_file, 'r') as f:
+        for line in f:
+            match = CIRCUIT_LIST_PATTERN.match(line.strip())
+            if match is not None:
+                circuits.append(os.path.splitext(match.group(1))[0])
+    return circuits
+
+# Helper method to get the number of threads VPR is run with by the VPR options.
+def get_num_threads(vpr_args):
+    if "--multi_queue_num_threads" in vpr_args:
+        return int(vpr_args[vpr_args.index("--multi_queue_num_threads") + 1])
+    return 1
+
+# Helper method to get the capnp map VPR reads for a map file.
+def get_vpr_map_file(map_file, map_cache_dir):
+    if map_file.endswith(".capnp"):
+        return os.path.abspath(map_file)
+    return os.path.abspath(os.path.join(convert_lookahead_map.convert_cached(map_file, map_cache_dir), "map.capnp"))
+
+# Get the points of the sweep: every map with every channel width it matches.
+# Returns a list of (map file, map name, device, channel width).
+def get_sweep_points(map_files, chan_widths):
+    points = []
+    for map_file in map_files:
+        map_name, device, map_chan_width = get_map_info(map_file)
+        if device is None:
+            print(f"WARNING: Cannot tell the device and channel width of {map_file} from its name. Skipping it.")
+            continue
+        if map_chan_width not in chan_widths:
+            print(f"WARNING: {map_file} is for a channel width of {map_chan_width}, which is not swept. Skipping it.")
+            continue
+        points.append((map_file, map_name, device, map_chan_width))
+    return points
+
+# Helper method to get the arguments of run_test.py for a point of the sweep.
+def get_run_test_arg_list(args, suite, device, chan_width, vpr_map_file):
+    arg_list = [suite, "-j", str(args.j), "-cores", str(args.cores), "-T", str(args.T), "-Q", str(args.Q),
+                "-timeout", str(args.timeout)]
+    if args.vtr_dir is not None:
+        arg_list += ["-vtr_dir", args.vtr_dir]
+    if args.tests_reference_dir_base is not None:
+        arg_list += ["-tests-reference-dir-base", args.tests_reference_dir_base]
+    if args.results_db is not None:
+        arg_list += ["-results-db", args.results_db]
+    if args.cache:
+        arg_list.append("-cache")
+    extra_vpr_args = f"--device {device} --route_chan_width {chan_width} --read_router_lookahead {vpr_map_file}"
+    if args.extra_vpr_args != "":
+        extra_vpr_args += " " + args.extra_vpr_args
+    return arg_list + ["-extra-vpr-args", extra_vpr_args]
+
+# Helper method to write the config of a point into its run directory: the VPR
+# options of the device's config, and the other files (such as min_w.txt) of
+# the test suite's config.
+def write_point_config(test_run, vpr_args):
+    config_dir = test_run.run_dir + "/config"
+    os.makedirs(config_dir, exist_ok=True)
+    for file_name in os.listdir(test_run.config_dir):
+        if file_name != "config.txt":
+            with open(test_run.config_dir + "/" + file_name, 'r') as f_in, \
+                    open(config_dir + "/" + file_name, 'w') as f_out:
+                f_out.write(f_in.read())
+    with open(config_dir + "/config.txt", 'w') as f:
+        print("# Written by sweep_lookahead_maps.py", file=f)
+        print("script_params=" + " ".join(vpr_args), file=f)
+    test_run.config_dir = config_dir
+
+# Helper method to get the geomean of the positive values.
+def geomean(values):
+    values = [value for value in values if value is not None and value > 0]
+    if len(values) == 0:
+        return None
+    return math.exp(sum(math.log(value) for value in values) / len(values))
+
+# Helper method to get the status of a routed circuit. A circuit which did not
+# report every metric is counted as failed.
+def get_status(run_data):
+    if run_data.timed_out:
+        return STATUS_TIMEOUT
+    if run_data.return_code != 0 or any(getattr(run_data, column) is None for column in METRIC_COLUMNS):
+        return STATUS_FAILED
+    return STATUS_OK
+
+# Get the rows of the combined table for the circuits of a point, with a
+# geomean row. Only the circuits which routed are in the geomeans; the status
+# of the geomean row is the number of them.
+def get_point_rows(map_name, device, chan_width, circuits, circuit_run_data):
+    rows = []
+    for circuit in circuits:
+        run_data = circuit_run_data[circuit]
+        rows.append({
+            "map": map_name,
+            "device": device,
+            "chan_width": chan_width,
+            "circuit": os.path.splitext(circuit)[0],
+            "status": get_status(run_data),
+            "runtime": run_data.runtime,
+            "heap_pops": run_data.heap_pops,
+            "cpd": run_data.cpd,
+            "wl": run_data.wl,
+        })
+    routed_rows = [row for row in rows if row["status"] == STATUS_OK]
+    geomean_row = {"map": map_name, "device": device, "chan_width": chan_width, "circuit": "geomean",
+                   "status": f"{len(routed_rows)}/{len(rows)} {STATUS_OK}"}
+    for column in METRIC_COLUMNS:
+        geomean_row[column] = geomean([row[column] for row in routed_rows])
+    return rows + [geomean_row]
+
+# Print the combined table of every point.
+def print_table(rows, file=None):
+    def format_value(value):
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return str(value)
+    table = [TABLE_COLUMNS] + [[format_value(row[column]) for column in TABLE_COLUMNS] for row in rows]
+    widths = [max(len(table_row[i]) for table_row in table) for i in range(len(TABLE_COLUMNS))]
+    for position, table_row in enumerate(table):
+        if position > 1 and table[position - 1][3] == "geomean":
+            print("", file=file)
+        print("  ".join(value.ljust(width) for value, width in zip(table_row, widths)), file=file)
+
+def sweep_lookahead_maps_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    suites = dict()
+    for suite in args.suite:
+        device, _, suite_name = suite.partition("=")
+        suites[device] = suite_name
+
+    points = get_sweep_points(args.map_files, args.chan_widths)
+    if len(points) == 0:
+        print("ERROR: None of the maps match a swept channel width.")
+        return
+
+    # The circuits of each device.
+    device_circuits = dict()
+    for map_file, map_name, device, chan_width in points:
+        config_file = SCRIPT_DIR + "/" + device + "/config/config.txt"
+        if not os.path.isfile(config_file):
+            print(f"ERROR: There is no config for the device {device}: {config_file}")
+            return
+        device_circuits[device] = args.circuits if args.circuits is not None else get_config_circuits(config_file)
+        num_threads = args.T if args.T != 0 else get_num_threads(get_config_vpr_args(config_file))
+        if args.cores != 0 and not scheduler.check_core_budget(args.cores, num_threads):
+            return
+
+    if args.dry_run:
+        for map_file, map_name, device, chan_width in points:
+            print(f"{suites.get(device, device)}: {map_name} (W = {chan_width})")
+            for circuit in device_circuits[device]:
+                print(f"\t{circuit}")
+        return
+
+    # Set up the run directory of every point and gather all of their jobs into
+    # one queue.
+    runs = []
+    jobs = []
+    manifest_recorders = dict()
+    for map_file, map_name, device, chan_width in points:
+        vpr_args = get_config_vpr_args(SCRIPT_DIR + "/" + device + "/config/config.txt")
+
+        run_test_arg_list = get_run_test_arg_list(args, suites.get(device, device), device, chan_width,
+                                                  get_vpr_map_file(map_file, args.map_cache_dir))
+        run_args = run_test.command_parser().parse_args(run_test_arg_list)
+        test_run = run_test.setup_test_run(run_args.tests_reference_dir_base, run_args.test_name)
+        if test_run is None:
+            print(f"Invalid test: {run_args.test_name}")
+            return
+        circuits = [circuit for circuit in test_run.circuits
+                    if os.path.splitext(circuit)[0] in device_circuits[device]]
+        missing = set(device_circuits[device]) - set(os.path.splitext(circuit)[0] for circuit in circuits)
+        if len(missing) != 0:
+            print(f"WARNING: {run_args.test_name} does not have the circuits: {', '.join(sorted(missing))}")
+        label = f"{map_name}_W{chan_width}"
+        print(f"{test_run.arch_dir}: {label}")
+        run_test.write_run_info(test_run, run_args, run_test_arg_list, label)
+        write_point_config(test_run, vpr_args)
+
+        manifest = run_manifest.RunManifest(test_run.run_dir)
+        manifest.add_circuits(circuits)
+        manifest.save()
+        run_jobs = run_test.build_circuit_jobs(test_run, run_args, f"{run_args.test_name}/{label}/", circuits)
+        if run_args.T == 0:
+            # The config sets the number of threads.
+            for job in run_jobs:
+                job.num_threads = get_num_threads(vpr_args)
+        runs.append((test_run, run_args, map_name, device, chan_width, circuits, len(jobs), len(jobs) + len(run_jobs)))
+        for job in run_jobs:
+            manifest_recorders[job.name] = run_test.get_manifest_recorder(manifest, run_args)
+        jobs += run_jobs
+
+    history = scheduler.RuntimeHistory(SCRIPT_DIR + "/sweep_runtime_history.json")
+    def record(job, run_data):
+        manifest_recorders[job.name](job, run_data)
+    # Every point has the same scheduling options (those of the sweep).
+    shared_args = runs[0][1]
+    results = run_test.run_circuit_jobs(jobs, shared_args, history, record)
+
+    run_test.evict_result_cache(shared_args)
+
+    # Write out the results of each point, and the combined table.
+    rows = []
+    for test_run, run_args, map_name, device, chan_width, circuits, first_job, last_job in runs:
+        circuit_run_data = run_test.collect_run_data(results[first_job:last_job])
+        with open(test_run.run_dir + "/summary.txt", "w") as f:
+            run_test.print_run_summary(circuits, circuit_run_data, file=f)
+        run_test.store_run_results(test_run, run_args, circuit_run_data)
+        rows += get_point_rows(map_name, device, chan_width, circuits, circuit_run_data)
+
+    print("")
+    print_table(rows)
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print("")
+    print("Wrote the table to", args.output)
+
+if __name__ == "__main__":
+    sweep_lookahead_maps_main(sys.argv[1:])
@@ -0,0 +1,676 @@
+#!/usr/bin/python3
+
+# Generates routing-resource-graph-shaped workloads for the A* SSSP benchmark.
+#
+# The random geometric graph of the benchmark has a very different structure
+# from the RR graphs VPR routes on, so this writes graphs which look like them
+# as CSR graph files which the benchmark memory-maps (./benchmark <file.csr>):
+#   grid    synthesizes an island-style FPGA: a W x H grid of tiles with
+#           unidirectional channels of the given width, wires of the given
+#           segment lengths (staggered along the channel), subset or Wilton
+#           switch blocks (Fs = 3), and SOURCE -> OPIN -> wires -> IPIN -> SINK
+#           pins connected by Fc_out and Fc_in
+#   import  reads an RR graph written by VPR with --write_rr_graph <file>.xml
+#   info    prints the shape of a CSR graph file, and with -check compares its
+#           heuristic with the exact cost to the destination
+#
+# The cost of an edge is the delay (in ps) of the node it enters. The heuristic
+# of a node is looked up in a cost table by the distance in x and y from the
+# node to the destination, like VPR's map router lookahead. With
+# -lookahead-map, the tables are the delays of a lookahead map (see
+# alex_lookahead_maps; text, capnp or npy), one per segment type and channel
+# type; without it, they are a Manhattan distance bound.
+#
+# The layout of the CSR graph files is described in src/graph.hpp.
+#
+# Examples:
+#   ./rr_graph_workload.py grid -grid 30 30 -chan-width 160 -segments 4:1 \
+#       -lookahead-map ../../alex_lookahead_maps/lookahead_map_vtr_small_160.txt -o vtr_small_160.csr
+#   ./rr_graph_workload.py import or1200_rr_graph.xml -o or1200.csr
+#   ./rr_graph_workload.py info vtr_small_160.csr -check
+
+import os
+import sys
+import struct
+import pathlib
+import argparse
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+SCRIPT_DIR = str(pathlib.Path(__file__).parent.resolve())
+
+sys.path.insert(0, SCRIPT_DIR + "/../../alex_lookahead_maps")
+import convert_lookahead_map
+
+# Layout of the CSR graph files (csr_header in src/graph.hpp).
+CSR_MAGIC = b"RRCSR\0\0\0"
+CSR_VERSION = 1
+CSR_ALIGNMENT = 64
+CSR_HEADER_FORMAT = "<8sIIQQIIIII12x"
+CSR_HEADER_SIZE = struct.calcsize(CSR_HEADER_FORMAT)
+
+# Node types, in the order of VPR.
+SOURCE, SINK, IPIN, OPIN, CHANX, CHANY = range(6)
+NODE_TYPE_NAMES = ["SOURCE", "SINK", "IPIN", "OPIN", "CHANX", "CHANY"]
+
+# Directions in which the wires travel through the switch blocks.
+RIGHT, LEFT, UP, DOWN = range(4)
+OPPOSITE = {RIGHT: LEFT, LEFT: RIGHT, UP: DOWN, DOWN: UP}
+LEFT_TURN = {RIGHT: UP, UP: LEFT, LEFT: DOWN, DOWN: RIGHT}
+
+SWITCH_BLOCKS = ["subset", "wilton"]
+
+# Lookahead map entries larger than this (in seconds) were never filled in.
+INVALID_MAP_DELAY = 1e-3
+
+class WorkloadError(Exception):
+    pass
+
+# A graph in CSR form, with the position and cost table of each node for the
+# heuristic.
+class CsrGraph:
+    def __init__(self, offsets, targets, weights, node_x, node_y, node_table, cost_tables, src, dst):
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.node_x = node_x
+        self.node_y = node_y
+        self.node_table = node_table
+        self.cost_tables = cost_tables
+        self.src = src
+        self.dst = dst
+
+    def get_num_nodes(self):
+        return len(self.offsets) - 1
+
+    def get_num_edges(self):
+        return len(self.targets)
+
+    # The heuristic of every node (or of the given nodes) towards the
+    # destination.
+    def get_heuristic(self, nodes=None):
+        if nodes is None:
+            nodes = np.arange(self.get_num_nodes())
+        _, table_dx, table_dy = self.cost_tables.shape
+        dx = np.minimum(np.abs(self.node_x[nodes].astype(np.int64) - int(self.node_x[self.dst])), table_dx - 1)
+        dy = np.minimum(np.abs(self.node_y[nodes].astype(np.int64) - int(self.node_y[self.dst])), table_dy - 1)
+        return self.cost_tables[self.node_table[nodes], dx, dy]
+
+# Helper method to build the CSR arrays from a list of edges, keeping the edges
+# of each node in the order they are given.
+def build_csr(num_nodes, src_nodes, dst_nodes, weights):
+    order = np.argsort(src_nodes, kind="stable")
+    offsets = np.zeros(num_nodes + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum(np.bincount(src_nodes, minlength=num_nodes))
+    return offsets, dst_nodes[order].astype(np.uint32), weights[order].astype(np.float32)
+
+# Write a graph as a CSR graph file.
+def write_csr(graph, csr_file):
+    num_tables, table_dx, table_dy = graph.cost_tables.shape
+    arrays = [
+        graph.offsets.astype("<u8"),
+        graph.targets.astype("<u4"),
+        graph.weights.astype("<f4"),
+        graph.node_x.astype("<u2"),
+        graph.node_y.astype("<u2"),
+        graph.node_table.astype("<u2"),
+        graph.cost_tables.astype("<f4"),
+    ]
+    temp_file = csr_file + ".tmp"
+    with open(temp_file, "wb") as f:
+        f.write(struct.pack(CSR_HEADER_FORMAT, CSR_MAGIC, CSR_VERSION, 0, graph.get_num_nodes(),
+                            graph.get_num_edges(), num_tables, table_dx, table_dy, graph.src, graph.dst))
+        for array in arrays:
+            f.write(b"\0" * (-f.tell() % CSR_ALIGNMENT))
+            array.tofile(f)
+    os.replace(temp_file, csr_file)
+
+# Read (memory-map) a CSR graph file.
+def read_csr(csr_file):
+    with open(csr_file, "rb") as f:
+        header = f.read(CSR_HEADER_SIZE)
+    if len(header) != CSR_HEADER_SIZE:
+        raise WorkloadError(f"{csr_file} is not a CSR graph file")
+    magic, version, _, num_nodes, num_edges, num_tables, table_dx, table_dy, src, dst = \
+        struct.unpack(CSR_HEADER_FORMAT, header)
+    if magic != CSR_MAGIC or version != CSR_VERSION:
+        raise WorkloadError(f"{csr_file} is not a CSR graph file (of version {CSR_VERSION})")
+    data = np.memmap(csr_file, dtype=np.uint8, mode="r")
+    offset = CSR_HEADER_SIZE
+    arrays = []
+    for dtype, count in [("<u8", num_nodes + 1), ("<u4", num_edges), ("<f4", num_edges), ("<u2", num_nodes),
+                         ("<u2", num_nodes), ("<u2", num_nodes), ("<f4", num_tables * table_dx * table_dy)]:
+        offset += -offset % CSR_ALIGNMENT
+        size = count * np.dtype(dtype).itemsize
+        if offset + size > len(data):
+            raise WorkloadError(f"{csr_file} is truncated")
+        arrays.append(data[offset:offset + size].view(dtype))
+        offset += size
+    offsets, targets, weights, node_x, node_y, node_table, cost_tables = arrays
+    return CsrGraph(offsets, targets, weights, node_x, node_y, node_table,
+                    cost_tables.reshape(num_tables, table_dx, table_dy), src, dst)
+
+# Get the nodes reachable from src (breadth first, a level at a time).
+def get_reachable(offsets, targets, src):
+    offsets = np.asarray(offsets, dtype=np.int64)
+    reached = np.zeros(len(offsets) - 1, dtype=bool)
+    reached[src] = True
+    frontier = np.array([src], dtype=np.int64)
+    while len(frontier) != 0:
+        starts = offsets[frontier]
+        lengths = offsets[frontier + 1] - starts
+        # The indices of the edges of every node of the frontier.
+        edge_indices = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + \
+            np.repeat(starts, lengths)
+        next_nodes = np.unique(targets[edge_indices].astype(np.int64))
+        frontier = next_nodes[~reached[next_nodes]]
+        reached[frontier] = True
+    return reached
+
+# Get the cost tables of a lookahead map, in ps, indexed by [seg * num_chans +
+# chan, dx, dy]. Entries which were never filled in take the smallest delay of
+# the entries which are at least as far in x and y, so the tables stay a lower
+# bound where the map is.
+def get_map_cost_tables(map_file, scale):
+    delay = np.array(convert_lookahead_map.load_map(map_file).delay, dtype=np.float64)
+    num_segs, num_chans, num_dxs, num_dys = delay.shape
+    delay = delay.reshape(num_segs * num_chans, num_dxs, num_dys)
+    delay[~np.isfinite(delay) | (delay < 0) | (delay > INVALID_MAP_DELAY)] = np.inf
+    filled = np.minimum.accumulate(np.minimum.accumulate(delay[:, ::-1, ::-1], axis=1), axis=2)[:, ::-1, ::-1]
+    valid = np.isfinite(filled)
+    if not valid.any():
+        raise WorkloadError(f"{map_file} has no valid entries")
+    filled[~valid] = filled[valid].max()
+    return filled * 1e12 * scale, num_segs, num_chans
+
+# Helper method to get the cost tables of the nodes other than wires: the
+# smallest cost of any wire (for SOURCE and OPIN nodes), and zero (for IPIN and
+# SINK nodes, which only lead to their own SINK).
+def add_pin_cost_tables(wire_tables):
+    return np.concatenate([wire_tables, wire_tables.min(axis=0)[None], np.zeros_like(wire_tables[:1])])
+
+# Get the cost tables and the table of each node. Wires (of the given segment
+# types and chan 0 for CHANX, 1 for CHANY) use the table of their segment type
+# and channel type in the map. Without a map, they use a Manhattan distance
+# bound of min_tile_cost per tile plus the cost of the final IPIN, where the
+# distance along the wire is less the reach of its segment type (a wire can
+# leave to an IPIN anywhere along its span) and the distance across it is less
+# one (a channel runs between two rows or columns of tiles).
+def get_cost_tables(node_types, node_segments, lookahead_map, heuristic_scale, grid_size, min_tile_cost, ipin_cost,
+                    segment_reach):
+    is_wire = (node_types == CHANX) | (node_types == CHANY)
+    node_table = np.zeros(len(node_types), dtype=np.uint16)
+    if lookahead_map is not None:
+        wire_tables, num_segs, num_chans = get_map_cost_tables(lookahead_map, heuristic_scale)
+    else:
+        num_segs, num_chans = len(segment_reach), 2
+        dx = np.arange(grid_size[0] + 2)[:, None]
+        dy = np.arange(grid_size[1] + 2)[None, :]
+        wire_tables = []
+        for reach in segment_reach:
+            wire_tables.append(np.maximum(dx - reach, 0) + np.maximum(dy - 1, 0))
+            wire_tables.append(np.maximum(dx - 1, 0) + np.maximum(dy - reach, 0))
+        wire_tables = (np.array(wire_tables, dtype=np.float64) * min_tile_cost + ipin_cost) * heuristic_scale
+    chans = np.minimum((node_types == CHANY).astype(np.int64), num_chans - 1)
+    node_table[is_wire] = (np.minimum(node_segments, num_segs - 1) * num_chans + chans)[is_wire]
+    cost_tables = add_pin_cost_tables(wire_tables)
+    num_wire_tables = len(wire_tables)
+    node_table[(node_types == SOURCE) | (node_types == OPIN)] = num_wire_tables
+    node_table[(node_types == IPIN) | (node_types == SINK)] = num_wire_tables + 1
+    return cost_tables.astype(np.float32), node_table
+
+# Helper method to parse a segment spec, such as "4:0.8", into its length and
+# frequency.
+def parse_segment(segment):
+    length, _, frequency = segment.partition(":")
+    return int(length), float(frequency) if frequency != "" else 1.0
+
+# Helper method to assign the tracks of a channel to the segment types in
+# proportion to their frequencies, in pairs (one track in each direction).
+def get_track_segments(chan_width, segments):
+    if chan_width % 2 != 0:
+        raise WorkloadError("The channel width must be even (the channels are unidirectional)")
+    frequencies = np.array([frequency for _, frequency in segments])
+    pairs = np.floor(frequencies / frequencies.sum() * (chan_width // 2)).astype(np.int64)
+    pairs[np.argmax(frequencies)] += chan_width // 2 - pairs.sum()
+    return np.repeat(np.arange(len(segments)), 2 * pairs)
+
+# The wires of a synthesized grid, as arrays with one value per wire.
+class Wires:
+    def __init__(self, chan, index, track, segment, lo, hi, direction):
+        self.chan = chan            # 0 for CHANX, 1 for CHANY
+        self.index = index          # y of a CHANX channel, x of a CHANY channel
+        self.track = track
+        self.segment = segment
+        self.lo = lo                # first and last tile spanned
+        self.hi = hi
+        self.direction = direction  # +1 for INC, -1 for DEC
+
+    def __len__(self):
+        return len(self.chan)
+
+    # The position at which each wire is driven (its first tile).
+    def get_drive_pos(self):
+        return np.where(self.direction > 0, self.lo, self.hi)
+
+    # The direction each wire travels in.
+    def get_travel(self):
+        inc = self.direction > 0
+        return np.where(self.chan == 0, np.where(inc, RIGHT, LEFT), np.where(inc, UP, DOWN))
+
+    # The switch blocks at which each wire is driven and at which it ends (as
+    # keys x * (H + 1) + y of the switch block at the top right of tile x, y).
+    def get_switch_blocks(self, height):
+        inc = self.direction > 0
+        start_pos = np.where(inc, self.lo - 1, self.hi)
+        end_pos = np.where(inc, self.hi, self.lo - 1)
+        is_x = self.chan == 0
+        start = np.where(is_x, start_pos * (height + 1) + self.index, self.index * (height + 1) + start_pos)
+        end = np.where(is_x, end_pos * (height + 1) + self.index, self.index * (height + 1) + end_pos)
+        return start, end
+
+# Create the wires of every channel. The wires of a track are staggered along
+# the channel by the track, so wires of the same length do not all start at the
+# same tile.
+def create_wires(width, height, chan_width, segments):
+    track_segments = get_track_segments(chan_width, segments)
+    columns = {name: [] for name in ["chan", "index", "track", "segment", "lo", "hi", "direction"]}
+    for chan, num_channels, length in [(0, height + 1, width), (1, width + 1, height)]:
+        for track in range(chan_width):
+            segment = track_segments[track]
+            wire_length = segments[segment][0]
+            stagger = (track // 2) % wire_length
+            positions = np.arange(1, length + 1)
+            starts = positions[((positions - 1 - stagger) % wire_length == 0) | (positions == 1)]
+            ends = np.append(starts[1:] - 1, length)
+            num_wires = len(starts)
+            columns["chan"].append(np.full(num_wires * num_channels, chan))
+            columns["index"].append(np.repeat(np.arange(num_channels), num_wires))
+            columns["track"].append(np.full(num_wires * num_channels, track))
+            columns["segment"].append(np.full(num_wires * num_channels, segment))
+            columns["lo"].append(np.tile(starts, num_channels))
+            columns["hi"].append(np.tile(ends, num_channels))
+            columns["direction"].append(np.full(num_wires * num_channels, 1 if track % 2 == 0 else -1))
+    return Wires(**{name: np.concatenate(values).astype(np.int64) for name, values in columns.items()})
+
+# Helper method to sort wires into groups by key (and by track within a
+# group). Returns the sorted wire indices, the rank of each of them in its
+# group, and the first position and size of the group of every key.
+def group_wires(wire_indices, keys, tracks, num_keys):
+    order = np.lexsort((tracks, keys))
+    sorted_indices = wire_indices[order]
+    sorted_keys = keys[order]
+    counts = np.bincount(sorted_keys, minlength=num_keys)
+    starts = np.cumsum(counts) - counts
+    ranks = np.arange(len(sorted_keys)) - starts[sorted_keys]
+    return sorted_indices, sorted_keys, ranks, starts, counts
+
+# Get the switch block edges between the wires (Fs = 3): the wires which end at
+# a switch block drive the wires which start there going straight on, and
+# turning left and right. A subset switch block connects the i-th of the
+# incoming wires to the same position of the outgoing wires in each
+# direction; a Wilton switch block rotates the position by one on turns.
+def get_switch_block_edges(wires, width, height, switch_block):
+    num_keys = (width + 1) * (height + 1)
+    start_keys, end_keys = wires.get_switch_blocks(height)
+    travel = wires.get_travel()
+    all_wires = np.arange(len(wires))
+    incoming = dict()
+    outgoing = dict()
+    for direction in [RIGHT, LEFT, UP, DOWN]:
+        mask = travel == direction
+        incoming[direction] = group_wires(all_wires[mask], end_keys[mask], wires.track[mask], num_keys)
+        outgoing[direction] = group_wires(all_wires[mask], start_keys[mask], wires.track[mask], num_keys)
+
+    src_nodes = []
+    dst_nodes = []
+    for in_direction in [RIGHT, LEFT, UP, DOWN]:
+        in_wires, in_keys, in_ranks, _, in_counts = incoming[in_direction]
+        for out_direction in [RIGHT, LEFT, UP, DOWN]:
+            if out_direction == OPPOSITE[in_direction]:
+                continue
+            shift = 0
+            if switch_block == "wilton":
+                shift = 1 if out_direction == LEFT_TURN[in_direction] else (0 if out_direction == in_direction else -1)
+            out_wires, _, _, out_starts, out_counts = outgoing[out_direction]
+            num_out = out_counts[in_keys]
+            connected = num_out > 0
+            position = (in_ranks[connected] * num_out[connected] // in_counts[in_keys[connected]] + shift) % \
+                num_out[connected]
+            src_nodes.append(in_wires[connected])
+            dst_nodes.append(out_wires[out_starts[in_keys[connected]] + position])
+    return np.concatenate(src_nodes), np.concatenate(dst_nodes)
+
+# Helper method to pick a fraction fc of the candidates for each of a tile's
+# pins on one side, spreading the pins over the candidates.
+def pick_fc(candidates, pins, fc):
+    if len(candidates) == 0 or len(pins) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    num_picked = max(1, int(round(fc * len(candidates))))
+    starts = (np.arange(len(pins)) * num_picked)[:, None]
+    picked = candidates[(starts + np.arange(num_picked)[None, :]) % len(candidates)]
+    return np.repeat(pins, num_picked), picked.ravel()
+
+# Synthesize an island-style FPGA routing graph.
+def generate_grid(args):
+    width, height = args.grid
+    segments = [parse_segment(segment) for segment in args.segments]
+    wires = create_wires(width, height, args.chan_width, segments)
+
+    # The pins of every tile come first (SOURCE, SINK, OPINs, IPINs), then the
+    # wires.
+    pins_per_tile = 2 + args.num_opins + args.num_ipins
+    num_tiles = width * height
+    num_pin_nodes = num_tiles * pins_per_tile
+    num_nodes = num_pin_nodes + len(wires)
+    tile_x = np.repeat(np.arange(1, width + 1), height)
+    tile_y = np.tile(np.arange(1, height + 1), width)
+    pin_types = np.array([SOURCE, SINK] + [OPIN] * args.num_opins + [IPIN] * args.num_ipins)
+    node_types = np.concatenate([np.tile(pin_types, num_tiles), np.where(wires.chan == 0, CHANX, CHANY)])
+    node_segments = np.concatenate([np.zeros(num_pin_nodes, dtype=np.int64), wires.segment])
+
+    # The heuristic positions: the tile of a pin, and the end of a wire (where
+    # it can next switch).
+    wire_end = np.where(wires.direction > 0, wires.hi, wires.lo)
+    node_x = np.concatenate([np.repeat(tile_x, pins_per_tile), np.where(wires.chan == 0, wire_end, wires.index)])
+    node_y = np.concatenate([np.repeat(tile_y, pins_per_tile), np.where(wires.chan == 0, wires.index, wire_end)])
+
+    # The delay of entering each node.
+    wire_lengths = wires.hi - wires.lo + 1
+    node_delay = np.zeros(num_nodes)
+    node_delay[num_pin_nodes:] = args.switch_delay + wire_lengths * args.wire_delay
+    node_delay[node_types == IPIN] = args.ipin_delay
+
+    src_nodes = []
+    dst_nodes = []
+    sb_src, sb_dst = get_switch_block_edges(wires, width, height, args.switch_block)
+    src_nodes.append(sb_src + num_pin_nodes)
+    dst_nodes.append(sb_dst + num_pin_nodes)
+
+    # The wires of each channel, for the connections of the pins.
+    wire_ids = np.arange(len(wires))
+    channel_keys = wires.chan * (max(width, height) + 1) + wires.index
+    channel_order = np.lexsort((wires.track, channel_keys))
+    channel_bounds = np.searchsorted(channel_keys[channel_order], np.arange(2 * (max(width, height) + 1) + 1))
+    drive_pos = wires.get_drive_pos()
+    def get_channel(chan, index):
+        key = chan * (max(width, height) + 1) + index
+        return channel_order[channel_bounds[key]:channel_bounds[key + 1]]
+
+    opin_sides = np.arange(args.num_opins) % 4
+    ipin_sides = np.arange(args.num_ipins) % 4
+    for tile in range(num_tiles):
+        x, y = tile_x[tile], tile_y[tile]
+        base = tile * pins_per_tile
+        opins = base + 2 + np.arange(args.num_opins)
+        ipins = base + 2 + args.num_opins + np.arange(args.num_ipins)
+        # SOURCE -> OPINs and IPINs -> SINK.
+        src_nodes += [np.full(args.num_opins, base), ipins]
+        dst_nodes += [opins, np.full(args.num_ipins, base + 1)]
+        # The sides of the tile: top, right, bottom, left.
+        for side, (chan, index, pos) in enumerate([(0, y, x), (1, x, y), (0, y - 1, x), (1, x - 1, y)]):
+            channel = get_channel(chan, index)
+            # OPINs drive the wires which start next to the tile.
+            driven = wire_ids[channel[drive_pos[channel] == pos]]
+            pins, picked = pick_fc(driven, opins[opin_sides == side], args.fc_out)
+            src_nodes.append(pins)
+            dst_nodes.append(picked + num_pin_nodes)
+            # IPINs are driven by the wires which pass the tile.
+            passing = wire_ids[channel[(wires.lo[channel] <= pos) & (pos <= wires.hi[channel])]]
+            pins, picked = pick_fc(passing, ipins[ipin_sides == side], args.fc_in)
+            src_nodes.append(picked + num_pin_nodes)
+            dst_nodes.append(pins)
+
+    src_nodes = np.concatenate(src_nodes).astype(np.int64)
+    dst_nodes = np.concatenate(dst_nodes).astype(np.int64)
+    offsets, targets, weights = build_csr(num_nodes, src_nodes, dst_nodes, node_delay[dst_nodes])
+
+    min_tile_cost = min((args.switch_delay + length * args.wire_delay) / length for length, _ in segments)
+    cost_tables, node_table = get_cost_tables(node_types, node_segments, args.lookahead_map, args.heuristic_scale,
+                                              (width, height), min_tile_cost, args.ipin_delay,
+                                              [length - 1 for length, _ in segments])
+
+    src_x, src_y = args.src_tile if args.src_tile is not None else (1, 1)
+    dst_x, dst_y = args.dst_tile if args.dst_tile is not None else (width, height)
+    for x, y in [(src_x, src_y), (dst_x, dst_y)]:
+        if not (1 <= x <= width and 1 <= y <= height):
+            raise WorkloadError(f"The tile {x}, {y} is outside of the {width} x {height} grid")
+    src = ((src_x - 1) * height + (src_y - 1)) * pins_per_tile
+    dst = ((dst_x - 1) * height + (dst_y - 1)) * pins_per_tile + 1
+    return CsrGraph(offsets, targets, weights, node_x, node_y, node_table, cost_tables, src, dst), node_types
+
+# Read an RR graph written by VPR (--write_rr_graph <file>.xml). Returns the
+# graph (with the source and destination to be chosen) and the type of each
+# node.
+def import_rr_graph(args):
+    switch_delays = dict()
+    node_ids = []
+    node_types = []
+    node_x = []
+    node_y = []
+    node_segments = []
+    node_spans = []
+    node_r = []
+    node_c = []
+    edge_src = []
+    edge_dst = []
+    edge_switch = []
+    type_ids = {name: type_id for type_id, name in enumerate(NODE_TYPE_NAMES)}
+
+    for _, element in ET.iterparse(args.rr_graph_file, events=("end",)):
+        tag = element.tag
+        if tag == "edge":
+            edge_src.append(int(element.get("src_node")))
+            edge_dst.append(int(element.get("sink_node")))
+            edge_switch.append(int(element.get("switch_id")))
+        elif tag == "node":
+            node_type = type_ids[element.get("type")]
+            loc = element.find("loc")
+            timing = element.find("timing")
+            segment = element.find("segment")
+            # The heuristic position of a wire is the end it travels to.
+            decreasing = element.get("direction") == "DEC_DIR"
+            node_ids.append(int(element.get("id")))
+            node_types.append(node_type)
+            node_x.append(int(loc.get("xlow" if decreasing else "xhigh")))
+            node_y.append(int(loc.get("ylow" if decreasing else "yhigh")))
+            node_segments.append(int(segment.get("segment_id")) if segment is not None else 0)
+            node_spans.append(int(loc.get("xhigh")) - int(loc.get("xlow")) + int(loc.get("yhigh")) -
+                              int(loc.get("ylow")) + 1)
+            node_r.append(float(timing.get("R", 0.0)) if timing is not None else 0.0)
+            node_c.append(float(timing.get("C", 0.0)) if timing is not None else 0.0)
+        elif tag == "switch":
+            timing = element.find("timing")
+            switch_delays[int(element.get("id"))] = (float(timing.get("Tdel", 0.0)), float(timing.get("R", 0.0))) \
+                if timing is not None else (0.0, 0.0)
+        else:
+            continue
+        element.clear()
+
+    if len(node_ids) == 0:
+        raise WorkloadError(f"{args.rr_graph_file} has no rr_nodes")
+    num_nodes = max(node_ids) + 1
+    def by_id(values, dtype):
+        array = np.zeros(num_nodes, dtype=dtype)
+        array[node_ids] = values
+        return array
+    types = by_id(node_types, np.int64)
+    segments = by_id(node_segments, np.int64)
+    spans = by_id(node_spans, np.int64)
+    r = by_id(node_r, np.float64)
+    c = by_id(node_c, np.float64)
+    edge_src = np.array(edge_src, dtype=np.int64)
+    edge_dst = np.array(edge_dst, dtype=np.int64)
+    switch_ids = np.array(edge_switch, dtype=np.int64)
+    num_switches = max(switch_delays) + 1 if len(switch_delays) != 0 else 1
+    switch_tdel = np.zeros(num_switches)
+    switch_r = np.zeros(num_switches)
+    for switch_id, (tdel, switch_resistance) in switch_delays.items():
+        switch_tdel[switch_id] = tdel
+        switch_r[switch_id] = switch_resistance
+
+    # The delay of an edge is that of its switch driving the node it enters
+    # (Elmore: Tdel + (R_switch + R_node / 2) * C_node), in ps.
+    delay = (switch_tdel[switch_ids] + (switch_r[switch_ids] + 0.5 * r[edge_dst]) * c[edge_dst]) * 1e12
+    offsets, targets, weights = build_csr(num_nodes, edge_src, edge_dst, delay)
+
+    x = by_id(node_x, np.int64)
+    y = by_id(node_y, np.int64)
+    is_wire = (types == CHANX) | (types == CHANY)
+    # Without a map, the Manhattan bound takes the cheapest delay per tile of
+    # entering any wire, and the longest wire of each segment type.
+    min_tile_cost = 0.0
+    wire_edges = is_wire[edge_dst]
+    if wire_edges.any():
+        min_tile_cost = float((delay[wire_edges] / spans[edge_dst[wire_edges]]).min())
+    segment_reach = np.zeros(int(segments.max()) + 1, dtype=np.int64)
+    np.maximum.at(segment_reach, segments[is_wire], spans[is_wire] - 1)
+    cost_tables, node_table = get_cost_tables(types, segments, args.lookahead_map, args.heuristic_scale,
+                                              (int(x.max()), int(y.max())), min_tile_cost, 0.0, segment_reach)
+    graph = CsrGraph(offsets, targets, weights, x.astype(np.uint16), y.astype(np.uint16), node_table,
+                     cost_tables, 0, 0)
+    return graph, types
+
+# Choose the source and destination of a graph: the given nodes, or the SOURCE
+# closest to the lower left corner and the SINK reachable from it which is
+# furthest away.
+def choose_src_dst(graph, node_types, src=None, dst=None):
+    x = graph.node_x.astype(np.int64)
+    y = graph.node_y.astype(np.int64)
+    if src is None:
+        sources = np.flatnonzero(node_types == SOURCE)
+        if len(sources) == 0:
+            raise WorkloadError("The graph has no SOURCE nodes")
+        src = int(sources[np.argmin(x[sources] + y[sources])])
+    reachable = get_reachable(graph.offsets, graph.targets, src)
+    if dst is None:
+        sinks = np.flatnonzero((node_types == SINK) & reachable)
+        if len(sinks) == 0:
+            raise WorkloadError(f"No SINK can be reached from node {src}")
+        dst = int(sinks[np.argmax(np.abs(x[sinks] - x[src]) + np.abs(y[sinks] - y[src]))])
+    elif not reachable[dst]:
+        raise WorkloadError(f"Node {dst} cannot be reached from node {src}")
+    graph.src = src
+    graph.dst = dst
+
+# Print the shape of a graph: the number of nodes and edges, and the
+# distributions of the fanout and the edge costs.
+def print_graph_info(graph, node_types=None):
+    offsets = np.asarray(graph.offsets, dtype=np.int64)
+    fanout = np.diff(offsets)
+    weights = np.asarray(graph.weights)
+    print(f"Nodes: {graph.get_num_nodes()}  Edges: {graph.get_num_edges()}  "
+          f"Cost tables: {' x '.join(str(size) for size in graph.cost_tables.shape)}")
+    if node_types is not None:
+        print("Node types: " + "  ".join(f"{name} {np.count_nonzero(node_types == type_id)}"
+                                         for type_id, name in enumerate(NODE_TYPE_NAMES)))
+    percentiles = [50, 90, 99, 100]
+    print("Fanout: mean {:.2f}  ".format(fanout.mean()) +
+          "  ".join(f"P{p} {value:g}" for p, value in zip(percentiles, np.percentile(fanout, percentiles))))
+    if len(weights) != 0:
+        print("Edge cost (ps): " +
+              "  ".join(f"P{p} {value:.1f}" for p, value in zip(percentiles, np.percentile(weights, percentiles))))
+    print(f"Route from node {graph.src} ({graph.node_x[graph.src]}, {graph.node_y[graph.src]}) to node "
+          f"{graph.dst} ({graph.node_x[graph.dst]}, {graph.node_y[graph.dst]}), "
+          f"heuristic {float(graph.get_heuristic(np.array([graph.src]))[0]):.1f} ps")
+
+# Compare the heuristic of every node which can reach the destination with the
+# exact cost to the destination. An overestimate makes the A* search return a
+# longer path (and the implementations of the benchmark may then disagree).
+def check_heuristic(graph):
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+
+    num_nodes = graph.get_num_nodes()
+    # Zero-cost edges are nudged so they are not dropped as missing edges.
+    matrix = csr_matrix((np.asarray(graph.weights, dtype=np.float64) + 1e-9, np.asarray(graph.targets),
+                         np.asarray(graph.offsets, dtype=np.int64)), shape=(num_nodes, num_nodes))
+    cost_to_dst = dijkstra(matrix.T.tocsr(), directed=True, indices=graph.dst)
+    reaching = np.isfinite(cost_to_dst)
+    heuristic = graph.get_heuristic()
+    print(f"Cost of the shortest path: {cost_to_dst[graph.src]:.1f} ps")
+    print(f"Nodes which can reach the destination: {np.count_nonzero(reaching)}")
+    # Nodes a few zero-cost edges from the destination have no meaningful
+    # ratio.
+    compared = reaching & (cost_to_dst > 1e-3)
+    ratio = heuristic[compared] / cost_to_dst[compared]
+    if len(ratio) != 0:
+        print(f"Heuristic / exact cost: mean {ratio.mean():.3f}  " +
+              "  ".join(f"P{p} {value:.3f}" for p, value in zip([10, 50, 90], np.percentile(ratio, [10, 50, 90]))))
+        print(f"Overestimated: {np.count_nonzero(ratio > 1.0 + 1e-6) * 100.0 / len(ratio):.2f}% of the nodes")
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Generates RR-graph-shaped CSR graph files for the A* SSSP benchmark."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_output_arguments(subparser):
+        subparser.add_argument("-o", dest="output", required=True, type=str, help="CSR graph file to write")
+        subparser.add_argument("-lookahead-map", default=None, type=str,
+                               help="lookahead map (text, capnp or npy) to take the heuristic from")
+        subparser.add_argument("-heuristic-scale", default=1.0, type=float,
+                               help="factor of the heuristic (like --astar_fac)")
+
+    grid_parser = subparsers.add_parser("grid", help="synthesize an island-style routing graph")
+    grid_parser.add_argument("-grid", default=[30, 30], type=int, nargs=2, metavar=("W", "H"))
+    grid_parser.add_argument("-chan-width", default=160, type=int)
+    grid_parser.add_argument("-segments", default=["4:1"], type=str, nargs="+", metavar="LENGTH[:FREQUENCY]")
+    grid_parser.add_argument("-switch-block", default="wilton", choices=SWITCH_BLOCKS)
+    grid_parser.add_argument("-num-opins", default=20, type=int, help="OPINs per tile")
+    grid_parser.add_argument("-num-ipins", default=40, type=int, help="IPINs per tile")
+    grid_parser.add_argument("-fc-out", default=0.1, type=float)
+    grid_parser.add_argument("-fc-in", default=0.15, type=float)
+    grid_parser.add_argument("-switch-delay", default=20.0, type=float, help="delay of a wire switch (ps)")
+    grid_parser.add_argument("-wire-delay", default=40.0, type=float, help="delay of a wire per tile (ps)")
+    grid_parser.add_argument("-ipin-delay", default=70.0, type=float, help="delay of an IPIN (ps)")
+    grid_parser.add_argument("-src-tile", default=None, type=int, nargs=2, metavar=("X", "Y"))
+    grid_parser.add_argument("-dst-tile", default=None, type=int, nargs=2, metavar=("X", "Y"))
+    add_output_arguments(grid_parser)
+
+    import_parser = subparsers.add_parser("import", help="read an RR graph written by VPR (XML)")
+    import_parser.add_argument("rr_graph_file")
+    import_parser.add_argument("-src-node", default=None, type=int)
+    import_parser.add_argument("-dst-node", default=None, type=int)
+    add_output_arguments(import_parser)
+
+    info_parser = subparsers.add_parser("info", help="print the shape of a CSR graph file")
+    info_parser.add_argument("csr_file")
+    info_parser.add_argument("-check", action='store_true',
+                             help="compare the heuristic with the exact cost to the destination (uses scipy)")
+
+    return parser
+
+def rr_graph_workload_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    try:
+        if args.command == "info":
+            graph = read_csr(args.csr_file)
+            print_graph_info(graph)
+            if args.check:
+                check_heuristic(graph)
+            return 0
+
+        if args.command == "grid":
+            graph, node_types = generate_grid(args)
+            choose_src_dst(graph, node_types, graph.src, graph.dst)
+        else:
+            graph, node_types = import_rr_graph(args)
+            choose_src_dst(graph, node_types, args.src_node, args.dst_node)
+    except (WorkloadError, convert_lookahead_map.LookaheadMapError) as error:
+        print("ERROR:", error)
+        return 1
+    write_csr(graph, args.output)
+    print_graph_info(graph, node_types)
+    print("Wrote", args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(rr_graph_workload_main(sys.argv[1:]))
@@ -0,0 +1,461 @@
+#!/usr/bin/python3
+
+# Builds and runs the A* SSSP priority queue benchmark over a grid of graph
+# sizes (N), implementations and thread counts, and records the results.
+#
+# The benchmark prints one line per implementation and configuration, such as
+#   [ 812.250 ms] MQ (lock) (#T=4, #Q=16):  2917.3
+# with the time averaged over the test runs and the length of the shortest path
+# found. The benchmark is run once per N (one at a time, so the runs do not
+# compete for cores), and every line is parsed into:
+#   results/runNNN/benchmark_N<N>.out  the output of the benchmark
+#   results/runNNN/results.csv         one row per N and configuration, with the
+#                                      speedup over the STL (sequential) queue
+#   results/runNNN/time_vs_n.png,      time and speedup against N for each
+#   results/runNNN/speedup_vs_n.png    priority queue implementation
+# and added to the results database of the testing scripts (see
+# testing/results_store.py) as the suite pq_profiling, with one config per
+# implementation and configuration and one "circuit" per N, so runs can be
+# compared with `results_store.py compare pq_profiling/run003/<config> ...`.
+#
+# The length of the path found by every implementation is checked against the
+# STL queue's (a configuration which finds another length is marked as failed,
+# and left out of the speedups, the summary and the comparison), and with
+# -baseline the times are compared with an earlier run, so the benchmark can be
+# used as a regression test of the multi-queue:
+#   ./run_benchmark.py -N 50000 100000 200000 -threads 1 4 8 -baseline run003
+#
+# With -graphs, the benchmark is also run on graph files written by
+# rr_graph_workload.py (routing resource graph shaped workloads), which are
+# reported by their file name instead of N:
+#   ./run_benchmark.py -N -graphs graphs/grid_30x30.csr graphs/or1200.csr
+
+import os
+import re
+import csv
+import sys
+import time
+import pathlib
+import argparse
+import subprocess
+
+SCRIPT_DIR = str(pathlib.Path(__file__).parent.resolve())
+
+sys.path.insert(0, SCRIPT_DIR + "/../../testing")
+import results_store
+
+SUITE_NAME = "pq_profiling"
+
+# The implementations of the benchmark, by the name it takes on the command
+# line, with the name it prints.
+IMPLEMENTATIONS = {
+    "stl": "STL (sequential)",
+    "tbb": "TBB",
+    "mq_lock": "MQ (lock)",
+    "mq_ttas": "MQ (TTAS)",
+    "mq_um": "MQ (update-min)",
+}
+BASELINE_IMPLEMENTATION = "stl"
+
+DEFAULT_SIZES = [50000, 100000, 200000, 400000]
+DEFAULT_THREADS = [1, 2, 4, 8, 16]
+DEFAULT_QUEUES_PER_THREAD = [2, 4, 8, 16, 32]
+
+# Name of the graph of the results on the random graphs of the benchmark.
+RANDOM_GRAPH = "random"
+
+# Tolerance when checking the path lengths (which are printed with one decimal).
+PATH_LENGTH_TOLERANCE = 0.05
+
+RESULT_LINE_PATTERN = re.compile(r"^\[\s*([0-9.]+) ms\] (.*?)(?: shortest path from \d+ to \d+ is)?:\s+([0-9.]+)\s*$")
+GRAPH_INIT_PATTERN = re.compile(r"^Graph initialization time: \[\s*([0-9.]+) ms\]")
+GRAPH_SIZE_PATTERN = re.compile(r"^Graph\(#V=(\d+), #E=(\d+)\)")
+TBB_PATTERN = re.compile(r"^TBB \((\d+) threads\)$")
+MQ_PATTERN = re.compile(r"^(MQ \(.*\)) \(#T=(\d+), #Q=(\d+)\)$")
+
+# Status of a result: whether the configuration found the shortest path.
+STATUS_OK = "ok"
+STATUS_WRONG_PATH = "wrong_path"
+
+RESULT_COLUMNS = ["graph", "N", "implementation", "T", "Q", "time_ms", "speedup", "path_length", "status"]
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Builds and runs the A* SSSP priority queue benchmark over a grid of graph sizes."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    parser.add_argument("-N", default=None, type=int, nargs="*",
+                        help=f"sizes of the random graphs (default: {DEFAULT_SIZES}, or none with -graphs)")
+    parser.add_argument("-graphs", default=[], type=str, nargs="+", metavar="CSR_FILE",
+                        help="graph files (from rr_graph_workload.py) to also run the benchmark on")
+    parser.add_argument("-implementations", default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS), nargs="+")
+    parser.add_argument("-threads", default=DEFAULT_THREADS, type=int, nargs="+")
+    parser.add_argument("-queues-per-thread", default=DEFAULT_QUEUES_PER_THREAD, type=int, nargs="+")
+    parser.add_argument("-runs", default=8, type=int, help="test runs averaged by the benchmark")
+    parser.add_argument("-build-dir", default=SCRIPT_DIR + "/build", type=str)
+    parser.add_argument("-no-build", action='store_true', help="use the benchmark already in BUILD_DIR")
+    parser.add_argument("-benchmark-exec", default=None, type=str,
+                        help="benchmark executable to run (instead of building it)")
+    parser.add_argument("-results-dir", default=SCRIPT_DIR + "/results", type=str)
+    parser.add_argument("-results-db", default=results_store.get_default_db_file(), type=str,
+                        help="results database to add the run to (empty to not add it)")
+    parser.add_argument("-baseline", default="", type=str, metavar="RUN_NAME",
+                        help="earlier run (in RESULTS_DIR) to compare the times with")
+    parser.add_argument("-regression-threshold", default=0.1, type=float,
+                        help="slowdown over the baseline reported as a regression")
+    parser.add_argument("-no-plots", action='store_true')
+
+    return parser
+
+# Build the benchmark with cmake. Returns the path of the executable.
+def build_benchmark(build_dir):
+    subprocess.run(["cmake", "-S", SCRIPT_DIR, "-B", build_dir, "-DCMAKE_BUILD_TYPE=Release"], check=True)
+    subprocess.run(["cmake", "--build", build_dir, "-j", str(os.cpu_count() or 1)], check=True)
+    return build_dir + "/benchmark"
+
+# Helper method to create the directory (runNNN) of a new run.
+def get_new_run_dir(results_dir):
+    os.makedirs(results_dir, exist_ok=True)
+    run_number = 1
+    for file_name in os.listdir(results_dir):
+        match = re.fullmatch(r"run(\d+)", file_name)
+        if match:
+            run_number = max(run_number, int(match.group(1)) + 1)
+    run_dir = f"{results_dir}/run{run_number:03d}"
+    os.makedirs(run_dir)
+    return run_dir
+
+# Parse the output of the benchmark. Returns the graph initialization time (in
+# ms, None if it is not there), the number of vertices of the graph (None if it
+# is not there) and a list of the results, as dictionaries of the
+# implementation (its command line name), T, Q, time_ms and path_length.
+def parse_benchmark_output(lines):
+    graph_init_ms = None
+    num_vertices = None
+    results = []
+    names = {name: implementation for implementation, name in IMPLEMENTATIONS.items()}
+    for line in lines:
+        match = GRAPH_INIT_PATTERN.match(line)
+        if match:
+            graph_init_ms = float(match.group(1))
+            continue
+        match = GRAPH_SIZE_PATTERN.match(line)
+        if match:
+            num_vertices = int(match.group(1))
+            continue
+        match = RESULT_LINE_PATTERN.match(line)
+        if match is None:
+            continue
+        result = {"time_ms": float(match.group(1)), "path_length": float(match.group(3)), "T": 1, "Q": None}
+        name = match.group(2)
+        tbb_match = TBB_PATTERN.match(name)
+        mq_match = MQ_PATTERN.match(name)
+        if tbb_match:
+            result["implementation"] = "tbb"
+            result["T"] = int(tbb_match.group(1))
+        elif mq_match and mq_match.group(1) in names:
+            result["implementation"] = names[mq_match.group(1)]
+            result["T"] = int(mq_match.group(2))
+            result["Q"] = int(mq_match.group(3))
+        elif name in names:
+            result["implementation"] = names[name]
+        else:
+            print(f"WARNING: Unknown benchmark result: {line.strip()}")
+            continue
+        results.append(result)
+    return graph_init_ms, num_vertices, results
+
+# Helper method to get the name of the configuration of a result, such as
+# "mq_lock T=4 Q=16".
+def get_config_name(result):
+    config = [result["implementation"]]
+    if result["implementation"] != BASELINE_IMPLEMENTATION:
+        config.append(f"T={result['T']}")
+    if result["Q"] is not None:
+        config.append(f"Q={result['Q']}")
+    return " ".join(config)
+
+# Helper method to get the name of the workload of a result: "N=<N>" for the
+# random graphs, and the name of the graph file otherwise.
+def get_workload_name(result):
+    if result["graph"] == RANDOM_GRAPH:
+        return f"N={result['N']}"
+    return result["graph"]
+
+# Run the benchmark on one graph (a size, for a random graph, or a graph file),
+# writing its output into the run directory. Returns the results, with the
+# graph, N, the status and the speedup over the STL queue (None if it was not
+# run or the path is wrong), and whether the benchmark ran correctly (exited
+# cleanly and every implementation found the shortest path).
+def run_benchmark(benchmark_exec, graph, args, run_dir):
+    if isinstance(graph, int):
+        graph_name = RANDOM_GRAPH
+        workload = f"N={graph}"
+        output_file = f"{run_dir}/benchmark_N{graph}.out"
+    else:
+        graph = os.path.abspath(graph)
+        graph_name = pathlib.Path(graph).stem
+        workload = graph_name
+        output_file = f"{run_dir}/benchmark_{graph_name}.out"
+    command = [benchmark_exec, str(graph), str(args.runs), ",".join(args.implementations),
+               ",".join(str(T) for T in args.threads), ",".join(str(Q) for Q in args.queues_per_thread)]
+    print(" ".join(command), flush=True)
+    lines = []
+    with open(output_file, "w") as f:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in process.stdout:
+            f.write(line)
+            lines.append(line)
+            if line.startswith("["):
+                print(f"{workload}: {line.strip()}", flush=True)
+        process.wait()
+    passed = process.returncode == 0
+    if not passed:
+        print(f"ERROR: The benchmark exited with {process.returncode} for {workload} (see {output_file})")
+
+    _, num_vertices, results = parse_benchmark_output(lines)
+    if isinstance(graph, int):
+        num_vertices = graph
+    baseline_ms = None
+    baseline_path_length = None
+    for result in results:
+        if result["implementation"] == BASELINE_IMPLEMENTATION:
+            baseline_ms = result["time_ms"]
+            baseline_path_length = result["path_length"]
+    for result in results:
+        result["graph"] = graph_name
+        result["N"] = num_vertices
+        result["speedup"] = None
+        result["status"] = STATUS_OK
+        if baseline_path_length is not None and \
+                abs(result["path_length"] - baseline_path_length) > PATH_LENGTH_TOLERANCE:
+            passed = False
+            result["status"] = STATUS_WRONG_PATH
+            print(f"ERROR: {get_config_name(result)} found a path of length {result['path_length']} for {workload}, "
+                  f"but the shortest path is {baseline_path_length}.")
+        elif baseline_ms is not None and result["time_ms"] > 0:
+            result["speedup"] = baseline_ms / result["time_ms"]
+    return results, passed
+
+# Write the results of a run to its results.csv.
+def write_results(run_dir, results):
+    with open(run_dir + "/results.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+# Read the results.csv of a run.
+def read_results(run_dir):
+    results = []
+    with open(run_dir + "/results.csv", "r", newline="") as f:
+        for row in csv.DictReader(f):
+            results.append({
+                # Runs from before the graph files have no graph column.
+                "graph": row.get("graph") or RANDOM_GRAPH,
+                "N": int(row["N"]) if row["N"] != "" else None,
+                "implementation": row["implementation"],
+                "T": int(row["T"]),
+                "Q": int(row["Q"]) if row["Q"] != "" else None,
+                "time_ms": float(row["time_ms"]),
+                "speedup": float(row["speedup"]) if row["speedup"] != "" else None,
+                "path_length": float(row["path_length"]),
+                # Runs from before the status column only have correct results.
+                "status": row.get("status") or STATUS_OK,
+            })
+    return results
+
+# Add the results of a run to the results database: one run per configuration,
+# with the time of each N (or graph file) as a circuit. Results with a wrong
+# path get a nonzero return code, so they are not compared.
+def store_results(db_file, run_dir, results):
+    git_hash = subprocess.run(["git", "-C", SCRIPT_DIR, "rev-parse", "HEAD"], capture_output=True,
+                              text=True).stdout.strip() or None
+    configs = dict()
+    for result in results:
+        configs.setdefault(get_config_name(result), []).append(result)
+    store = results_store.ResultsStore(db_file)
+    for config, config_results in configs.items():
+        run_info = {"T": config_results[0]["T"], "Q": config_results[0]["Q"]}
+        circuit_run_data = dict()
+        for result in config_results:
+            circuit_run_data[get_workload_name(result)] = {
+                "runtime": result["time_ms"] / 1000.0,
+                "sssp_runtime": result["time_ms"] / 1000.0,
+                "vpr_revision": git_hash,
+                "return_code": 0 if result["status"] == STATUS_OK else 1,
+            }
+        store.add_run(SUITE_NAME, os.path.basename(run_dir), config, run_info, circuit_run_data)
+    store.close()
+
+# Helper method to get the best (fastest) result of each implementation and
+# thread count on each workload, over the number of queues. Failed results are
+# left out.
+def get_best_results(results):
+    best = dict()
+    for result in results:
+        if result["status"] != STATUS_OK:
+            continue
+        key = (result["implementation"], result["T"], get_workload_name(result))
+        if key not in best or result["time_ms"] < best[key]["time_ms"]:
+            best[key] = result
+    return best
+
+# Print the time of every configuration on every workload (the best number of
+# queues of each thread count), with the speedup over the STL queue.
+def print_summary(results, workloads):
+    best = get_best_results(results)
+    failed = set((result["implementation"], result["T"], get_workload_name(result)) for result in results
+                 if result["status"] != STATUS_OK)
+    series = sorted(set((implementation, T) for implementation, T, _ in list(best) + list(failed)),
+                    key=lambda key: (list(IMPLEMENTATIONS).index(key[0]), key[1]))
+    print("")
+    print("Time in ms (speedup over STL) of the best number of queues:")
+    print("Implementation:\t" + "\t".join(workloads))
+    for implementation, T in series:
+        values = []
+        for workload in workloads:
+            result = best.get((implementation, T, workload))
+            if result is None:
+                values.append("wrong path" if (implementation, T, workload) in failed else "-")
+                continue
+            value = f"{result['time_ms']:.1f}"
+            if result["speedup"] is not None:
+                value += f" ({result['speedup']:.2f}x)"
+            if result["Q"] is not None:
+                value += f" Q={result['Q']}"
+            values.append(value)
+        name = implementation if implementation == BASELINE_IMPLEMENTATION else f"{implementation} T={T}"
+        print(f"{name}:\t" + "\t".join(values))
+
+# Compare the times of a run with a baseline run, for the configurations both
+# have (and found the shortest path in both). Prints the geomean slowdown of each implementation and the
+# configurations slower than the threshold. Returns the number of regressions.
+def compare_with_baseline(results, baseline_results, threshold):
+    baseline = {(get_config_name(result), get_workload_name(result)): result for result in baseline_results}
+    ratios = dict()
+    regressions = []
+    for result in results:
+        base = baseline.get((get_config_name(result), get_workload_name(result)))
+        if base is None or base["time_ms"] <= 0 or result["time_ms"] <= 0:
+            continue
+        if result["status"] != STATUS_OK or base["status"] != STATUS_OK:
+            continue
+        ratio = result["time_ms"] / base["time_ms"]
+        ratios.setdefault(result["implementation"], []).append(ratio)
+        if ratio > 1.0 + threshold:
+            regressions.append((result, base, ratio))
+    print("")
+    print("Time relative to the baseline (geomean over the configurations):")
+    for implementation, implementation_ratios in ratios.items():
+        print(f"{implementation}:\t{results_store.geomean(implementation_ratios):.3f}\t"
+              f"({len(implementation_ratios)} configurations)")
+    for result, base, ratio in regressions:
+        print(f"REGRESSION: {get_config_name(result)} {get_workload_name(result)}: {base['time_ms']:.1f} ms -> "
+              f"{result['time_ms']:.1f} ms ({ratio:.2f}x)")
+    return len(regressions)
+
+# Plot the time and speedup against N of each implementation (one line per
+# thread count, with the best number of queues), on the random graphs.
+def plot_results(results, run_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    best = {(implementation, T, result["N"]): result
+            for (implementation, T, _), result in get_best_results(results).items()
+            if result["graph"] == RANDOM_GRAPH}
+    implementations = [implementation for implementation in IMPLEMENTATIONS
+                       if any(key[0] == implementation for key in best)]
+    for metric, ylabel, file_name in [("time_ms", "Time (ms)", "time_vs_n.png"),
+                                      ("speedup", "Speedup over STL", "speedup_vs_n.png")]:
+        # The speedup of the STL queue over itself is not plotted.
+        plotted = [implementation for implementation in implementations
+                   if metric == "time_ms" or implementation != BASELINE_IMPLEMENTATION]
+        if len(plotted) == 0:
+            continue
+        fig, axes = plt.subplots(1, len(plotted), figsize=(4.5 * len(plotted), 4), squeeze=False)
+        for ax, implementation in zip(axes[0], plotted):
+            for T in sorted(set(key[1] for key in best if key[0] == implementation)):
+                points = sorted((N, result[metric]) for (name, threads, N), result in best.items()
+                                if name == implementation and threads == T and result[metric] is not None)
+                if len(points) == 0:
+                    continue
+                label = "sequential" if implementation == BASELINE_IMPLEMENTATION else f"T={T}"
+                ax.plot([N for N, _ in points], [value for _, value in points], marker="o", label=label)
+            ax.set_title(IMPLEMENTATIONS[implementation])
+            ax.set_xlabel("N")
+            ax.set_ylabel(ylabel)
+            ax.set_xscale("log")
+            if metric == "time_ms":
+                ax.set_yscale("log")
+            ax.grid(True, alpha=0.3)
+            ax.legend(fontsize="small")
+        fig.tight_layout()
+        fig.savefig(run_dir + "/" + file_name, dpi=150)
+        plt.close(fig)
+
+def run_benchmark_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    if args.benchmark_exec is not None:
+        benchmark_exec = os.path.abspath(args.benchmark_exec)
+    elif args.no_build:
+        benchmark_exec = args.build_dir + "/benchmark"
+    else:
+        benchmark_exec = build_benchmark(args.build_dir)
+    if not os.path.isfile(benchmark_exec):
+        print("ERROR: Benchmark not found:", benchmark_exec)
+        return 1
+
+    if args.N is None:
+        args.N = [] if len(args.graphs) != 0 else DEFAULT_SIZES
+    for graph_file in args.graphs:
+        if not os.path.isfile(graph_file):
+            print("ERROR: Graph file not found:", graph_file)
+            return 1
+    workloads = [f"N={N}" for N in args.N] + [pathlib.Path(graph_file).stem for graph_file in args.graphs]
+    if len(workloads) == 0:
+        print("ERROR: No graph sizes or graph files to run the benchmark on")
+        return 1
+    if len(set(workloads)) != len(workloads):
+        print("ERROR: The graph sizes and file names must be unique")
+        return 1
+
+    baseline_results = None
+    if args.baseline != "":
+        baseline_dir = args.results_dir + "/" + args.baseline
+        if not os.path.isfile(baseline_dir + "/results.csv"):
+            print("ERROR: Baseline run not found:", baseline_dir)
+            return 1
+        baseline_results = read_results(baseline_dir)
+
+    run_dir = get_new_run_dir(args.results_dir)
+    print("Run directory:", run_dir)
+    results = []
+    failed = False
+    start_time = time.time()
+    for graph in args.N + args.graphs:
+        graph_results, passed = run_benchmark(benchmark_exec, graph, args, run_dir)
+        results += graph_results
+        failed = failed or not passed
+    print(f"Ran the benchmark in {time.time() - start_time:.1f} s")
+
+    write_results(run_dir, results)
+    if args.results_db != "" and len(results) != 0:
+        store_results(args.results_db, run_dir, results)
+    print_summary(results, workloads)
+    if not args.no_plots and any(result["graph"] == RANDOM_GRAPH for result in results):
+        plot_results(results, run_dir)
+
+    num_regressions = 0
+    if baseline_results is not None:
+        num_regressions = compare_with_baseline(results, baseline_results, args.regression_threshold)
+    return 1 if failed or num_regressions != 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(run_benchmark_main(sys.argv[1:]))
@@ -1,7 +1,56 @@
 #include "graph.hpp"
 #include "sssp.hpp"
 
-const size_t num_test_runs = 8;
+#include <memory>
+#include <set>
+#include <sstream>
+#include <string>
+
+// Usage: benchmark [N [num_test_runs [implementations [threads [queues_per_thread]]]]]
+// N is the number of vertices of the random graph, or a CSR graph file written
+// by rr_graph_workload.py (routed between the vertices chosen by it).
+// The implementations (stl, tbb, mq_lock, mq_ttas, mq_um), thread counts and
+// queues per thread are comma-separated lists; "all" (or leaving them out) runs
+// the default set.
+const size_t default_num_test_runs = 8;
+const std::set<std::string> all_implementations = { "stl", "tbb", "mq_lock", "mq_ttas", "mq_um" };
+const std::vector<size_t> default_threads = { 1, 2, 4, 8, 16 };
+const std::vector<size_t> default_queues_per_thread = { 2, 4, 8, 16, 32 };
+
+inline std::vector<std::string> split_list(const std::string& list) {
+    std::vector<std::string> items;
+    std::stringstream stream(list);
+    std::string item;
+    while (std::getline(stream, item, ',')) {
+        if (!item.empty())
+            items.push_back(item);
+    }
+    return items;
+}
+
+inline std::set<std::string> get_implementations(int argc, char** argv, int arg) {
+    if (argc <= arg || std::string(argv[arg]) == "all")
+        return all_implementations;
+    std::set<std::string> implementations;
+    for (const std::string& implementation : split_list(argv[arg])) {
+        if (all_implementations.count(implementation) == 0) {
+            fprintf(stderr, "Unknown implementation: %s\n", implementation.c_str());
+            exit(1);
+        }
+        implementations.insert(implementation);
+    }
+    return implementations;
+}
+
+inline std::vector<size_t> get_size_list(int argc, char** argv, int arg, const std::vector<size_t>& default_list) {
+    if (argc <= arg || std::string(argv[arg]) == "all")
+        return default_list;
+    std::vector<size_t> sizes;
+    for (const std::string& item : split_list(argv[arg])) {
+        sizes.push_back(std::stoul(item));
+    }
+    return sizes;
+}
 
 inline double test_harness(std::function<sssp*()> factory, size_t num_runs) {
     long long t_accumulated_ms = 0;
@@ -19,14 +68,21 @@ inline double test_harness(std::function<sssp*()> factory, size_t num_runs) {
 }
 
 int main(int argc, char** argv) {
-    const size_t N = (argc == 1) ? 200000 : std::stoi(argv[1]);
-    const unsigned src = 0;
-    const unsigned dst = N - 1;
+    const std::string graph_arg = (argc == 1) ? "200000" : argv[1];
+    const bool is_graph_file = graph_arg.find_first_not_of("0123456789") != std::string::npos;
+    const size_t num_test_runs = (argc <= 2) ? default_num_test_runs : std::stoul(argv[2]);
+    const std::set<std::string> implementations = get_implementations(argc, argv, 3);
+    const std::vector<size_t> threads = get_size_list(argc, argv, 4, default_threads);
+    const std::vector<size_t> queues_per_thread = get_size_list(argc, argv, 5, default_queues_per_thread);
 
     setbuf(stdout, NULL);
 
     auto t_start = std::chrono::system_clock::now();
-    graph g(N);
+    std::unique_ptr<graph> g_ptr(is_graph_file ? new graph(graph_arg.c_str())
+                                               : new graph((size_t)std::stoul(graph_arg)));
+    graph& g = *g_ptr;
+    const unsigned src = g.default_src;
+    const unsigned dst = g.default_dst;
     auto t_graph_init_ms = std::chrono::duration_cast<std::chrono::milliseconds>(
                                std::chrono::system_clock::now() - t_start)
                                .count();
@@ -35,11 +91,13 @@ int main(int argc, char** argv) {
     auto stl = [&] {
         return new stl_sequential_sssp(&g, src, dst);
     };
-    printf("[%6.3f ms] STL (sequential) shortest path from %d to %d is: ",
-           test_harness(stl, num_test_runs),
-           src,
-           dst);
-    g.print_path(src, dst);
+    if (implementations.count("stl")) {
+        printf("[%6.3f ms] STL (sequential) shortest path from %d to %d is: ",
+               test_harness(stl, num_test_runs),
+               src,
+               dst);
+        g.print_path(src, dst);
+    }
 
     auto tbb_test_harness = [&](size_t num_threads) {
         auto tbb = [&] {
@@ -49,8 +107,10 @@ int main(int argc, char** argv) {
         g.print_path(src, dst);
     };
 
-    for (size_t num_threads : { 1, 2, 4, 8, 16 }) {
-        tbb_test_harness(num_threads);
+    if (implementations.count("tbb")) {
+        for (size_t num_threads : threads) {
+            tbb_test_harness(num_threads);
+        }
     }
 
     auto mq_lock_test_harness = [&](size_t num_threads, size_t num_queues) {
@@ -88,16 +148,19 @@ int main(int argc, char** argv) {
 
     std::vector<std::pair<size_t, size_t>> test_vec;
 
-    for (size_t num_threads : { 1, 2, 4, 8, 16 }) {
-        for (size_t num_queues_per_thread : { 2, 4, 8, 16, 32 }) {
+    for (size_t num_threads : threads) {
+        for (size_t num_queues_per_thread : queues_per_thread) {
             test_vec.push_back({ num_threads, num_queues_per_thread * num_threads });
         }
     }
 
     for (auto x : test_vec) {
-        mq_lock_test_harness(x.first, x.second);
-        mq_ttas_test_harness(x.first, x.second);
-        mq_um_test_harness(x.first, x.second);
+        if (implementations.count("mq_lock"))
+            mq_lock_test_harness(x.first, x.second);
+        if (implementations.count("mq_ttas"))
+            mq_ttas_test_harness(x.first, x.second);
+        if (implementations.count("mq_um"))
+            mq_um_test_harness(x.first, x.second);
     }
 
     return 0;
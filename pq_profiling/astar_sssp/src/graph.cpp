@@ -1,5 +1,13 @@
 #include "graph.hpp"
 
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
 // generates random points on 2D plane within a box of maxsize width & height
 inline point generate_random_point(utility::FastRandom& mr) {
     const std::size_t maxsize = 500;
@@ -38,6 +46,16 @@ void graph::trace_back(vertex_id src, vertex_id dst, std::vector<vertex_id>& pat
     }
 }
 
+// Cost of the cheapest edge from u to v.
+static path_cost get_edge_weight(const graph& g, vertex_id u, vertex_id v) {
+    path_cost weight = INF;
+    for (size_t e = g.edge_begin(u); e < g.edge_end(u); ++e) {
+        if (g.targets[e] == v)
+            weight = std::min(weight, g.weights[e]);
+    }
+    return weight;
+}
+
 void graph::print_path(vertex_id src, vertex_id dst) {
     std::vector<vertex_id> path;
     trace_back(src, dst, path);
@@ -47,7 +65,7 @@ void graph::print_path(vertex_id src, vertex_id dst) {
 #endif
     for (std::size_t i = 0; i < path.size(); ++i) {
         if (path[i] != dst) {
-            path_cost seg_length = get_distance(vertices[path[i]], vertices[path[i + 1]]);
+            path_cost seg_length = get_edge_weight(*this, path[i], path[i + 1]);
 #ifdef DEBUG
             printf("%6.1f       ", seg_length);
 #endif
@@ -77,6 +95,7 @@ void graph::init() {
         }
     }
 
+    edge_set edges(num_vertices);
     for (size_t r = 0; r < num_vertices; r += 64) {
         utility::FastRandom my_random(r);
         for (size_t i = r; i < std::min(r + 64, num_vertices); ++i) {
@@ -94,14 +113,103 @@ void graph::init() {
         }
     }
 
-    size_t num_edges = 0;
+    // Flatten the edges into CSR form, with the Euclidean distance as the cost
+    // of each edge.
+    offset_storage.resize(num_vertices + 1);
+    offset_storage[0] = 0;
     for (size_t i = 0; i < num_vertices; ++i) {
-        num_edges += edges[i].size();
+        offset_storage[i + 1] = offset_storage[i] + edges[i].size();
     }
+    num_edges = offset_storage[num_vertices];
+    target_storage.resize(num_edges);
+    weight_storage.resize(num_edges);
+    for (size_t i = 0; i < num_vertices; ++i) {
+        for (size_t j = 0; j < edges[i].size(); ++j) {
+            target_storage[offset_storage[i] + j] = edges[i][j];
+            weight_storage[offset_storage[i] + j] = get_distance(vertices[i], vertices[edges[i][j]]);
+        }
+    }
+    offsets = offset_storage.data();
+    targets = target_storage.data();
+    weights = weight_storage.data();
 
     printf("Graph(#V=%ld, #E=%ld) is initialized\n", num_vertices, num_edges);
 }
 
+// Get the array of type T which starts at offset bytes into the graph file.
+template <typename T>
+static const T* get_csr_array(const char* data, size_t& offset, size_t count) {
+    offset = (offset + CSR_ALIGNMENT - 1) / CSR_ALIGNMENT * CSR_ALIGNMENT;
+    const T* array = reinterpret_cast<const T*>(data + offset);
+    offset += count * sizeof(T);
+    return array;
+}
+
+void graph::load(const char* csr_file) {
+    int fd = open(csr_file, O_RDONLY);
+    struct stat file_stat;
+    if (fd < 0 || fstat(fd, &file_stat) != 0) {
+        fprintf(stderr, "Cannot open the graph file %s\n", csr_file);
+        exit(1);
+    }
+    mapped_size = file_stat.st_size;
+    mapped_data = mmap(nullptr, mapped_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (mapped_data == MAP_FAILED) {
+        fprintf(stderr, "Cannot map the graph file %s\n", csr_file);
+        exit(1);
+    }
+
+    const char* data = static_cast<const char*>(mapped_data);
+    csr_header header;
+    if (mapped_size < sizeof(header)) {
+        fprintf(stderr, "%s is not a graph file\n", csr_file);
+        exit(1);
+    }
+    memcpy(&header, data, sizeof(header));
+    if (memcmp(header.magic, CSR_MAGIC, sizeof(CSR_MAGIC)) != 0 || header.version != CSR_VERSION) {
+        fprintf(stderr, "%s is not a graph file (of version %u)\n", csr_file, CSR_VERSION);
+        exit(1);
+    }
+
+    num_vertices = header.num_vertices;
+    num_edges = header.num_edges;
+    table_dx = header.table_dx;
+    table_dy = header.table_dy;
+    default_src = header.src;
+    default_dst = header.dst;
+    size_t offset = sizeof(header);
+    offsets = get_csr_array<uint64_t>(data, offset, num_vertices + 1);
+    targets = get_csr_array<uint32_t>(data, offset, num_edges);
+    weights = get_csr_array<path_cost>(data, offset, num_edges);
+    node_x = get_csr_array<uint16_t>(data, offset, num_vertices);
+    node_y = get_csr_array<uint16_t>(data, offset, num_vertices);
+    node_table = get_csr_array<uint16_t>(data, offset, num_vertices);
+    cost_tables = get_csr_array<path_cost>(data, offset, (size_t)header.num_tables * table_dx * table_dy);
+    if (offset > mapped_size || header.num_tables == 0 || table_dx == 0 || table_dy == 0) {
+        fprintf(stderr, "The graph file %s is truncated or has no cost tables\n", csr_file);
+        exit(1);
+    }
+    // Read the whole file ahead, so the first test run does not pay for the
+    // page faults.
+    madvise(mapped_data, mapped_size, MADV_WILLNEED);
+
+    printf("Graph(#V=%ld, #E=%ld) is loaded from %s\n", num_vertices, num_edges, csr_file);
+}
+
+void graph::unload() {
+    if (mapped_data != nullptr)
+        munmap(mapped_data, mapped_size);
+}
+
+void graph::allocate() {
+    predecessor = new vertex_id[num_vertices];
+    g_distance = new path_cost[num_vertices];
+    f_distance = new path_cost[num_vertices];
+
+    pre_g_dist = new std::atomic_uint64_t[num_vertices];
+}
+
 void graph::reset() {
     uint64_t packed = pack_predecessor_g_dist(num_vertices, (float)INF);
     for (size_t i = 0; i < num_vertices; ++i) {
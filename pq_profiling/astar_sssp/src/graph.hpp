@@ -30,10 +30,54 @@ inline path_cost get_distance(const point& p1, const point& p2) {
     return sqrt(xdiff * xdiff + ydiff * ydiff);
 }
 
+// Layout of the CSR graph files written by rr_graph_workload.py. The header is
+// followed by the arrays, each starting at a multiple of CSR_ALIGNMENT bytes:
+//   offsets      uint64[num_vertices + 1]  first edge of each vertex
+//   targets      uint32[num_edges]         target vertex of each edge
+//   weights      float32[num_edges]        cost of each edge
+//   node_x       uint16[num_vertices]      x of each vertex (for the heuristic)
+//   node_y       uint16[num_vertices]      y of each vertex
+//   node_table   uint16[num_vertices]      cost table of each vertex
+//   cost_tables  float32[num_tables][table_dx][table_dy]
+// The heuristic of a vertex is the entry of its cost table at the (clamped)
+// distance in x and y to the destination, like the map router lookahead.
+const char CSR_MAGIC[8] = { 'R', 'R', 'C', 'S', 'R', 0, 0, 0 };
+const uint32_t CSR_VERSION = 1;
+const size_t CSR_ALIGNMENT = 64;
+
+struct csr_header {
+    char magic[8];
+    uint32_t version;
+    uint32_t flags;
+    uint64_t num_vertices;
+    uint64_t num_edges;
+    uint32_t num_tables;
+    uint32_t table_dx;
+    uint32_t table_dy;
+    uint32_t src;
+    uint32_t dst;
+    uint32_t reserved[3];
+};
+static_assert(sizeof(csr_header) == 64, "The CSR header must be 64 bytes");
+
 class graph {
 public:
-    point_set vertices; // vertices
-    edge_set edges; // edges
+    point_set vertices; // vertices (of the random graph)
+
+    // Edges in compressed sparse row form: the edges of vertex u are
+    // [offsets[u], offsets[u + 1]).
+    const uint64_t* offsets;
+    const uint32_t* targets;
+    const path_cost* weights;
+
+    // Lookahead of the graphs read from a file (nullptr for the random graph,
+    // whose heuristic is the Euclidean distance).
+    const uint16_t* node_x;
+    const uint16_t* node_y;
+    const uint16_t* node_table;
+    const path_cost* cost_tables;
+    size_t table_dx, table_dy;
+
     vertex_id* predecessor; // for recreating path from src to dst
     path_cost* f_distance; // estimated distances at particular vertex
     path_cost* g_distance; // current shortest distances from src vertex
@@ -41,18 +85,26 @@ public:
     bool use_packed_predecessor_and_g_dist;
     std::atomic_uint64_t* pre_g_dist;
 
+    // A random geometric graph of num_vertices vertices.
     graph(size_t num_vertices) {
         this->num_vertices = num_vertices;
         vertices.resize(num_vertices);
-        edges.resize(num_vertices);
-
-        predecessor = new vertex_id[num_vertices];
-        g_distance = new path_cost[num_vertices];
-        f_distance = new path_cost[num_vertices];
-
-        pre_g_dist = new std::atomic_uint64_t[num_vertices];
+        default_src = 0;
+        default_dst = num_vertices - 1;
+        node_x = node_y = node_table = nullptr;
+        cost_tables = nullptr;
+        table_dx = table_dy = 0;
+        mapped_data = nullptr;
+        mapped_size = 0;
 
         init();
+        allocate();
+    }
+
+    // A graph read (memory-mapped) from a CSR graph file.
+    graph(const char* csr_file) {
+        load(csr_file);
+        allocate();
     }
 
     ~graph() {
@@ -60,6 +112,24 @@ public:
         delete[] f_distance;
         delete[] g_distance;
         delete[] pre_g_dist;
+        unload();
+    }
+
+    size_t edge_begin(vertex_id u) const {
+        return offsets[u];
+    }
+
+    size_t edge_end(vertex_id u) const {
+        return offsets[u + 1];
+    }
+
+    // Estimated cost from v to dst.
+    path_cost heuristic(vertex_id v, vertex_id dst) const {
+        if (cost_tables == nullptr)
+            return get_distance(vertices[v], vertices[dst]);
+        size_t dx = std::min<size_t>(std::abs(int(node_x[v]) - int(node_x[dst])), table_dx - 1);
+        size_t dy = std::min<size_t>(std::abs(int(node_y[v]) - int(node_y[dst])), table_dy - 1);
+        return cost_tables[(node_table[v] * table_dx + dx) * table_dy + dy];
     }
 
     void trace_back(vertex_id src, vertex_id dst, std::vector<vertex_id>& path);
@@ -68,9 +138,27 @@ public:
 
     size_t get_num_vertices();
 
+    // The source and destination to route between (0 and N - 1 for the random
+    // graph, and the ones chosen by the generator for a graph file).
+    vertex_id default_src, default_dst;
+
 protected:
     size_t num_vertices;
+    size_t num_edges;
+
+    // Storage of the edges of the random graph.
+    std::vector<uint64_t> offset_storage;
+    std::vector<uint32_t> target_storage;
+    std::vector<path_cost> weight_storage;
+
+    // Mapping of the graph file.
+    void* mapped_data;
+    size_t mapped_size;
+
     void init();
+    void load(const char* csr_file);
+    void unload();
+    void allocate();
 };
 
 union uint32_float_conv {
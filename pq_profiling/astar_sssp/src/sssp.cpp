@@ -16,14 +16,14 @@ void stl_sequential_sssp::thread_func() {
 
         old_g_u *= dummyCalculation(u);
 
-        for (std::size_t i = 0; i < g->edges[u].size(); ++i) {
-            vertex_id v = g->edges[u][i];
-            path_cost new_g_v = old_g_u + get_distance(g->vertices[u], g->vertices[v]);
+        for (std::size_t e = g->edge_begin(u); e < g->edge_end(u); ++e) {
+            vertex_id v = g->targets[e];
+            path_cost new_g_v = old_g_u + g->weights[e];
 
             if (new_g_v < g->g_distance[v]) {
                 g->predecessor[v] = u;
                 g->g_distance[v] = new_g_v;
-                path_cost new_f_v = new_g_v + get_distance(g->vertices[v], g->vertices[dst]);
+                path_cost new_f_v = new_g_v + g->heuristic(v, dst);
                 g->f_distance[v] = new_f_v;
                 pq.push({ new_f_v, v });
             }
@@ -54,10 +54,10 @@ void mq_parallel_sssp_lock::thread_func() {
         path_cost old_g_u = g->g_distance[u];
         old_g_u *= dummyCalculation(u);
 
-        for (std::size_t i = 0; i < g->edges[u].size(); ++i) {
-            vertex_id v = g->edges[u][i];
-            path_cost new_g_v = old_g_u + get_distance(g->vertices[u], g->vertices[v]);
-            path_cost new_f_v = new_g_v + get_distance(g->vertices[v], g->vertices[dst]);
+        for (std::size_t e = g->edge_begin(u); e < g->edge_end(u); ++e) {
+            vertex_id v = g->targets[e];
+            path_cost new_g_v = old_g_u + g->weights[e];
+            path_cost new_f_v = new_g_v + g->heuristic(v, dst);
             locks[v].lock();
             if (new_g_v < g->g_distance[v]) {
                 g->predecessor[v] = u;
@@ -94,10 +94,10 @@ void mq_parallel_sssp_ttas::thread_func() {
 
         old_g_u *= dummyCalculation(u);
 
-        for (std::size_t i = 0; i < g->edges[u].size(); ++i) {
-            vertex_id v = g->edges[u][i];
-            path_cost new_g_v = old_g_u + get_distance(g->vertices[u], g->vertices[v]);
-            path_cost new_f_v = new_g_v + get_distance(g->vertices[v], g->vertices[dst]);
+        for (std::size_t e = g->edge_begin(u); e < g->edge_end(u); ++e) {
+            vertex_id v = g->targets[e];
+            path_cost new_g_v = old_g_u + g->weights[e];
+            path_cost new_f_v = new_g_v + g->heuristic(v, dst);
             if (new_g_v < g->g_distance[v]) {
                 bool need_push = false;
                 while (std::atomic_flag_test_and_set_explicit(&lock_flags[v],
@@ -134,15 +134,15 @@ void mq_parallel_sssp_update_with_min::thread_func() {
 
         uint64_t old_pack_u = g->pre_g_dist[u].load(std::memory_order_relaxed);
         path_cost old_g_u = get_g_dist_from_pack(old_pack_u);
-        if (f > old_g_u + get_distance(g->vertices[u], g->vertices[dst]))
+        if (f > old_g_u + g->heuristic(u, dst))
             continue; // prune search space
 
         old_g_u *= dummyCalculation(u);
 
-        for (std::size_t i = 0; i < g->edges[u].size(); ++i) {
-            vertex_id v = g->edges[u][i];
-            path_cost new_g_v = old_g_u + get_distance(g->vertices[u], g->vertices[v]);
-            path_cost new_f_v = new_g_v + get_distance(g->vertices[v], g->vertices[dst]);
+        for (std::size_t e = g->edge_begin(u); e < g->edge_end(u); ++e) {
+            vertex_id v = g->targets[e];
+            path_cost new_g_v = old_g_u + g->weights[e];
+            path_cost new_f_v = new_g_v + g->heuristic(v, dst);
 
             uint64_t old_pack_v = g->pre_g_dist[v].load(std::memory_order_relaxed);
             uint64_t new_pack_v = pack_predecessor_g_dist(u, new_g_v);
@@ -177,10 +177,10 @@ void tbb_parallel_sssp::thread_func() {
 
         old_g_u *= dummyCalculation(u);
 
-        for (std::size_t i = 0; i < g->edges[u].size(); ++i) {
-            vertex_id v = g->edges[u][i];
-            path_cost new_g_v = old_g_u + get_distance(g->vertices[u], g->vertices[v]);
-            path_cost new_f_v = new_g_v + get_distance(g->vertices[v], g->vertices[dst]);
+        for (std::size_t e = g->edge_begin(u); e < g->edge_end(u); ++e) {
+            vertex_id v = g->targets[e];
+            path_cost new_g_v = old_g_u + g->weights[e];
+            path_cost new_f_v = new_g_v + g->heuristic(v, dst);
             bool push = false;
             {
                 oneapi::tbb::spin_mutex::scoped_lock l(locks[v]);
@@ -45,8 +45,7 @@ public:
         g = graph_ptr;
         g->reset();
         g->g_distance[src] = 0.0; // src's distance from src is zero
-        g->f_distance[src] =
-            get_distance(g->vertices[src], g->vertices[dst]); // estimate distance from src to dst
+        g->f_distance[src] = g->heuristic(src, dst); // estimate distance from src to dst
         g->pre_g_dist[src] = 0.0; // src's distance from src is zero
         g->use_packed_predecessor_and_g_dist = false;
     }
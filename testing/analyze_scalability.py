@@ -0,0 +1,385 @@
+#!/usr/bin/python3
+
+# Scalability analysis of runs of the router with different thread counts.
+#
+# profile_scalability.sh (or run_matrix.py with profile_scalability.toml) routes
+# a suite once per configuration and thread count, each in its own runNNN
+# directory. This groups the runs by configuration (everything but the thread
+# count) and, for both the total routing time and the SSSP time, computes the
+# speedup S(p) = time(1) / time(p) and parallel efficiency E(p) = S(p) / p of
+# every circuit and of the geomean, where p is the number of threads. The runs
+# are read from run directories, or from the results store with -suite:
+#   ./analyze_scalability.py koios_large/run012 koios_large/run013 ...
+#   ./analyze_scalability.py -suite koios_large -output scalability.csv
+#
+# Three models are fitted to the speedups of each circuit (by least squares):
+#   Amdahl      S(p) = 1 / (f + (1 - f) / p), with f the serial fraction; the
+#               speedup is bounded by 1 / f
+#   Gustafson   S(p) = p - a (p - 1), with a the serial fraction of the scaled
+#               workload
+#   Karp-Flatt  e(p) = (1 / S(p) - 1 / p) / (1 - 1 / p), the serial fraction
+#               measured at each p; if it grows with p, the time is lost to
+#               parallel overhead (synchronization, contention) rather than to
+#               serial work
+# Circuits are flagged if their efficiency drops below -efficiency-threshold,
+# if they slow down when given more threads, or if their Karp-Flatt serial
+# fraction keeps growing. The number of threads worth requesting for each
+# configuration is the largest one measured at which the geomean efficiency is
+# still above the threshold.
+#
+# When a configuration has several runs with the same thread count (such as a
+# rerun), the median time of each circuit is used. If a configuration has no
+# run with one thread, the speedups are relative to its smallest thread count.
+
+import os
+import sys
+import csv
+import json
+import math
+import argparse
+import statistics
+
+import results_store
+
+# The times analysed, by their column in the results, with their name in the
+# summary of run_test.py.
+METRICS = [
+    ("runtime", "Run-time(s)"),
+    ("sssp_runtime", "SSSP-Run-time(s)"),
+]
+
+CSV_COLUMNS = ["suite", "config", "metric", "circuit", "T", "time", "speedup", "efficiency", "karp_flatt"]
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Computes the speedup, efficiency and serial fraction of runs with different thread counts."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    # Run directories (testing/<suite>/runNNN) to analyse.
+    parser.add_argument(
+        "run_dirs",
+        default=[],
+        type=str,
+        nargs="*",
+    )
+
+    # Analyse the runs of a suite in the results store instead.
+    parser.add_argument(
+        "-suite",
+        default=None,
+        type=str,
+    )
+
+    parser.add_argument(
+        "-db",
+        default=results_store.get_default_db_file(),
+        type=str,
+        metavar="DB_FILE",
+    )
+
+    # Efficiency below which a circuit is flagged as no longer scaling.
+    parser.add_argument(
+        "-efficiency-threshold",
+        default=0.5,
+        type=float,
+    )
+
+    # Write the speedup and efficiency of every circuit and thread count to a
+    # CSV file.
+    parser.add_argument(
+        "-output",
+        default="",
+        type=str,
+        metavar="CSV_FILE",
+    )
+
+    return parser
+
+# Helper method to get the name of the configuration of a run without its
+# thread count. Q is usually scaled with T, so it is replaced by the number of
+# queues per thread.
+def get_scaling_config_name(config, T, Q):
+    words = [word for word in config.split(" ") if not word.startswith("T=") and not word.startswith("Q=")]
+    if Q is not None and T and not any(word.startswith("queues_per_thread=") for word in words):
+        words.append(f"Q/T={Q / T:g}")
+    return " ".join(words)
+
+# Helper method to get the thread count of a run. With run_test.py's default of
+# -T 0, the thread count comes from the config, so it is only known if it is
+# also in the extra VPR arguments. Returns None if it is not known.
+def get_thread_count(T, extra_vpr_args):
+    if T:
+        return T
+    vpr_args = (extra_vpr_args or "").split()
+    if "--multi_queue_num_threads" in vpr_args[:-1]:
+        return int(vpr_args[vpr_args.index("--multi_queue_num_threads") + 1])
+    return None
+
+# Helper method to check if a circuit routed in a run (from its run data or its
+# row in the results store).
+def is_routed(run_data_dict):
+    return (not run_data_dict.get("timed_out")) and run_data_dict.get("return_code") in (0, None) and \
+        run_data_dict.get("runtime") is not None
+
+# Read the runs of the given run directories. Returns a list of
+# (suite, config, T, circuit run data) tuples.
+def read_run_dirs(run_dirs):
+    runs = []
+    for run_dir in run_dirs:
+        run_info_file = run_dir + "/run_info.json"
+        if not os.path.isfile(run_info_file):
+            print(f"WARNING: Skipping {run_dir}, which has no run_info.json")
+            continue
+        with open(run_info_file, "r") as f:
+            run_info = json.load(f)
+        T = get_thread_count(run_info.get("T"), run_info.get("extra_vpr_args"))
+        config = get_scaling_config_name(results_store.get_config_name(run_info), T, run_info.get("Q"))
+        runs.append((run_info["test_name"], config, T, results_store.read_run_dir(run_dir)))
+    return runs
+
+# Read the runs of a suite from the results store. Returns a list of
+# (suite, config, T, circuit run data) tuples.
+def read_store_runs(db_file, suite):
+    store = results_store.ResultsStore(db_file)
+    runs = []
+    for run in store.get_runs(suite):
+        T = get_thread_count(run["T"], run["extra_vpr_args"])
+        config = get_scaling_config_name(run["config"], T, run["Q"])
+        runs.append((run["suite"], config, T, store.get_run_results(run["run_id"])))
+    store.close()
+    return runs
+
+# Group the times of the runs by suite and configuration. Returns a dictionary
+# mapping (suite, config) to a dictionary of metric -> circuit -> T -> time
+# (the median over the runs with that thread count).
+def group_runs(runs):
+    samples = dict()
+    for suite, config, T, circuit_run_data in runs:
+        if T is None or T <= 0:
+            print(f"WARNING: Skipping a run of {suite} ({config}) with an unknown thread count (run with -T)")
+            continue
+        config_samples = samples.setdefault((suite, config), dict())
+        for circuit, run_data_dict in circuit_run_data.items():
+            if not is_routed(run_data_dict):
+                continue
+            for metric, _ in METRICS:
+                value = run_data_dict.get(metric)
+                if value is not None and value > 0:
+                    config_samples.setdefault(metric, dict()).setdefault(circuit, dict()) \
+                        .setdefault(T, []).append(value)
+    groups = dict()
+    for key, config_samples in samples.items():
+        groups[key] = {metric: {circuit: {T: statistics.median(values) for T, values in times.items()}
+                                for circuit, times in circuit_times.items()}
+                       for metric, circuit_times in config_samples.items()}
+    return groups
+
+# Helper method to get the Karp-Flatt serial fraction from the speedup with p
+# (relative) threads. Undefined at p = 1.
+def get_karp_flatt(speedup, p):
+    if p <= 1:
+        return None
+    return (1.0 / speedup - 1.0 / p) / (1.0 - 1.0 / p)
+
+# Fit Amdahl's law, S(p) = 1 / (f + (1 - f) / p), to (p, speedup) points. With
+# x = 1 - 1 / p and y = 1 / S - 1 / p this is y = f x, fitted by least
+# squares. Returns the serial fraction f and the RMS error of the speedup, or
+# (None, None) if there are no points with p > 1.
+def fit_amdahl(points):
+    points = [(p, speedup) for p, speedup in points if p > 1]
+    if len(points) == 0:
+        return None, None
+    sum_xy = sum((1.0 - 1.0 / p) * (1.0 / speedup - 1.0 / p) for p, speedup in points)
+    sum_xx = sum((1.0 - 1.0 / p) ** 2 for p, _ in points)
+    f = min(max(sum_xy / sum_xx, 0.0), 1.0)
+    error = math.sqrt(sum((speedup - 1.0 / (f + (1.0 - f) / p)) ** 2 for p, speedup in points) / len(points))
+    return f, error
+
+# Fit Gustafson's law, S(p) = p - a (p - 1), to (p, speedup) points. This is
+# p - S = a (p - 1), fitted by least squares. Returns the serial fraction a and
+# the RMS error of the speedup, or (None, None) if there are no points with
+# p > 1.
+def fit_gustafson(points):
+    points = [(p, speedup) for p, speedup in points if p > 1]
+    if len(points) == 0:
+        return None, None
+    sum_xy = sum((p - 1.0) * (p - speedup) for p, speedup in points)
+    sum_xx = sum((p - 1.0) ** 2 for p, _ in points)
+    a = min(max(sum_xy / sum_xx, 0.0), 1.0)
+    error = math.sqrt(sum((speedup - (p - a * (p - 1.0))) ** 2 for p, speedup in points) / len(points))
+    return a, error
+
+# Analyse the scaling of one circuit (or the geomean) from its time at each
+# thread count. Returns a dictionary with the time, speedup, efficiency and
+# Karp-Flatt serial fraction at each thread count, the model fits, and the
+# flags of where it stops scaling.
+def analyse_times(times, base_T, efficiency_threshold):
+    base_time = times[base_T]
+    analysis = {"time": dict(), "speedup": dict(), "efficiency": dict(), "karp_flatt": dict(), "flags": []}
+    points = []
+    for T in sorted(times):
+        p = T / base_T
+        speedup = base_time / times[T]
+        analysis["time"][T] = times[T]
+        analysis["speedup"][T] = speedup
+        analysis["efficiency"][T] = speedup / p
+        analysis["karp_flatt"][T] = get_karp_flatt(speedup, p)
+        points.append((p, speedup))
+    analysis["amdahl"], analysis["amdahl_error"] = fit_amdahl(points)
+    analysis["gustafson"], analysis["gustafson_error"] = fit_gustafson(points)
+
+    thread_counts = sorted(times)
+    collapse = [T for T in thread_counts if analysis["efficiency"][T] < efficiency_threshold]
+    if len(collapse) != 0:
+        analysis["flags"].append(f"collapse@T={collapse[0]}")
+    for previous_T, T in zip(thread_counts, thread_counts[1:]):
+        if analysis["speedup"][T] < analysis["speedup"][previous_T]:
+            analysis["flags"].append(f"slowdown@T={T}")
+            break
+    # A serial fraction which grows by more than 0.01 at every step (over at
+    # least two steps) is parallel overhead, not serial work.
+    karp_flatt = [analysis["karp_flatt"][T] for T in thread_counts if analysis["karp_flatt"][T] is not None]
+    if len(karp_flatt) >= 3 and all(b - a > 0.01 for a, b in zip(karp_flatt, karp_flatt[1:])):
+        analysis["flags"].append("overhead")
+    good = [T for T in thread_counts if analysis["efficiency"][T] >= efficiency_threshold]
+    analysis["best_T"] = max(good) if len(good) != 0 else base_T
+    return analysis
+
+# Analyse one metric of one configuration. Returns a dictionary mapping each
+# circuit (and "geomean", over the circuits with a time at every thread count)
+# to its analysis, and the thread count the speedups are relative to.
+def analyse_metric(circuit_times, efficiency_threshold):
+    # Times with an unknown thread count (T=0, from the config) cannot be
+    # placed on the thread axis.
+    circuit_times = {circuit: {T: time for T, time in times.items() if T > 0}
+                     for circuit, times in circuit_times.items()}
+    thread_counts = sorted(set(T for times in circuit_times.values() for T in times))
+    base_T = thread_counts[0]
+    analyses = dict()
+    for circuit in sorted(circuit_times):
+        times = circuit_times[circuit]
+        if base_T in times and len(times) > 1:
+            analyses[circuit] = analyse_times(times, base_T, efficiency_threshold)
+    complete = [times for times in circuit_times.values() if all(T in times for T in thread_counts)]
+    if len(complete) != 0 and len(thread_counts) > 1:
+        geomean_times = {T: results_store.geomean([times[T] for times in complete]) for T in thread_counts}
+        analyses["geomean"] = analyse_times(geomean_times, base_T, efficiency_threshold)
+        analyses["geomean"]["num_circuits"] = len(complete)
+    return analyses, base_T
+
+# Print the analysis of one metric of one configuration.
+def print_metric_analysis(metric_name, analyses, base_T, file=None):
+    thread_counts = sorted(set(T for analysis in analyses.values() for T in analysis["time"]))
+    header = "\t".join(f"T={T}" for T in thread_counts)
+    print(f"{metric_name} speedup (efficiency) over T={base_T}:", file=file)
+    print(f"Circuit:\t{header}\tAmdahl-f\tAmdahl-Max-Speedup\tAmdahl-RMS\t"
+          f"Gustafson-a\tGustafson-RMS\tBest-T\tFlags", file=file)
+    for circuit, analysis in analyses.items():
+        values = []
+        for T in thread_counts:
+            if T not in analysis["speedup"]:
+                values.append("-")
+            else:
+                values.append(f"{analysis['speedup'][T]:.2f} ({analysis['efficiency'][T]:.2f})")
+        max_speedup = None
+        if analysis["amdahl"] is not None and analysis["amdahl"] > 0:
+            max_speedup = 1.0 / analysis["amdahl"]
+        name = circuit
+        if circuit == "geomean":
+            name = f"Geomean ({analysis['num_circuits']} circuits)"
+        print(f"{name}:\t" + "\t".join(values) +
+              f"\t{results_store.format_value(analysis['amdahl'])}"
+              f"\t{results_store.format_value(max_speedup, '.1f')}"
+              f"\t{results_store.format_value(analysis['amdahl_error'])}"
+              f"\t{results_store.format_value(analysis['gustafson'])}"
+              f"\t{results_store.format_value(analysis['gustafson_error'])}"
+              f"\t{analysis['best_T']}\t{' '.join(analysis['flags']) or '-'}", file=file)
+    print("Karp-Flatt serial fraction:", file=file)
+    print("Circuit:\t" + "\t".join(f"T={T}" for T in thread_counts[1:]), file=file)
+    for circuit, analysis in analyses.items():
+        name = "Geomean" if circuit == "geomean" else circuit
+        print(f"{name}:\t" + "\t".join(results_store.format_value(analysis["karp_flatt"].get(T))
+                                       for T in thread_counts[1:]), file=file)
+
+# Write the time, speedup, efficiency and Karp-Flatt serial fraction of every
+# circuit, configuration, metric and thread count to a CSV file.
+def write_csv(output_file, results):
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for (suite, config), metric_analyses in results.items():
+            for metric, (analyses, _) in metric_analyses.items():
+                for circuit, analysis in analyses.items():
+                    for T in sorted(analysis["time"]):
+                        writer.writerow({
+                            "suite": suite,
+                            "config": config,
+                            "metric": metric,
+                            "circuit": circuit,
+                            "T": T,
+                            "time": analysis["time"][T],
+                            "speedup": analysis["speedup"][T],
+                            "efficiency": analysis["efficiency"][T],
+                            "karp_flatt": analysis["karp_flatt"][T],
+                        })
+
+def analyze_scalability_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    if (args.suite is None) == (len(args.run_dirs) == 0):
+        print("ERROR: Give either run directories or -suite")
+        return 1
+    if args.suite is not None:
+        runs = read_store_runs(args.db, args.suite)
+    else:
+        runs = read_run_dirs(args.run_dirs)
+
+    results = dict()
+    recommendations = []
+    for (suite, config), metric_times in sorted(group_runs(runs).items()):
+        thread_counts = sorted(set(T for circuit_times in metric_times.values()
+                                   for times in circuit_times.values() for T in times))
+        print(f"=============== {suite}: {config or 'default'} (T={', '.join(map(str, thread_counts))}) "
+              "===============")
+        if len(thread_counts) == 0:
+            print("No routed circuits.")
+            print("")
+            continue
+        if len(thread_counts) < 2:
+            print("Only one thread count, nothing to compare.")
+            print("")
+            continue
+        if thread_counts[0] != 1:
+            print(f"WARNING: No run with one thread, the speedups are relative to T={thread_counts[0]}")
+        results[(suite, config)] = dict()
+        for metric, metric_name in METRICS:
+            if metric not in metric_times:
+                continue
+            analyses, base_T = analyse_metric(metric_times[metric], args.efficiency_threshold)
+            results[(suite, config)][metric] = (analyses, base_T)
+            print_metric_analysis(metric_name, analyses, base_T)
+            print("")
+        metric_analyses = results[(suite, config)]
+        if all(metric in metric_analyses and "geomean" in metric_analyses[metric][0] for metric, _ in METRICS):
+            recommendations.append((suite, config, *(metric_analyses[metric][0]["geomean"] for metric, _ in METRICS)))
+
+    if len(recommendations) != 0:
+        print(f"Threads to request (largest T with a geomean efficiency of at least {args.efficiency_threshold:g}):")
+        print("Suite:\tConfig\tT(Run-time)\tSpeedup\tT(SSSP-Run-time)\tSSSP-Speedup\tAmdahl-f\tSSSP-Amdahl-f")
+        for suite, config, total, sssp in recommendations:
+            print(f"{suite}:\t{config or 'default'}\t{total['best_T']}\t{total['speedup'][total['best_T']]:.2f}\t"
+                  f"{sssp['best_T']}\t{sssp['speedup'][sssp['best_T']]:.2f}\t"
+                  f"{results_store.format_value(total['amdahl'])}\t{results_store.format_value(sssp['amdahl'])}")
+
+    if args.output != "":
+        write_csv(args.output, results)
+        print(f"Wrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(analyze_scalability_main(sys.argv[1:]))
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+
+# Micro-benchmark comparing the original per-line, per-pattern regex parsing
+# of vpr.out against the keyword-prefiltered LogScanner.
+#
+# A synthetic log is generated which mimics the router iteration tables VPR
+# prints, with the metric lines sprinkled throughout.
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+import log_scanner
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Benchmarks the VPR log scanner on a synthetic log."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    # Size of the synthetic log to generate in MiB.
+    parser.add_argument(
+        "-size",
+        default=256,
+        type=int,
+        metavar="SIZE_MB",
+    )
+
+    # Use an existing log file instead of generating one.
+    parser.add_argument(
+        "-log",
+        default="",
+        type=str,
+        metavar="LOG_FILE",
+    )
+
+    parser.add_argument(
+        "-skip-baseline",
+        action='store_true'
+    )
+
+    return parser
+
+# Helper method to write a synthetic VPR log of roughly the given size.
+def generate_synthetic_log(file_path, size_mb):
+    target_size = size_mb * 1024 * 1024
+    rng = random.Random(0)
+    written = 0
+    iteration = 0
+    with open(file_path, 'w') as f:
+        while written < target_size:
+            iteration += 1
+            lines = []
+            for _ in range(1000):
+                lines.append(f"{iteration:4d} {rng.uniform(0, 10):6.1f} {rng.uniform(0, 100):7.1f} "
+                             f"{rng.randint(0, 100000):4d} {rng.randint(0, 10**8):8d} "
+                             f"{rng.randint(0, 10000):7d} {rng.randint(0, 10000):7d} "
+                             f"{rng.randint(0, 10000):8d} ( 0.011%) {rng.randint(0, 10**7):9d} ( 3.1%) "
+                             f"{rng.uniform(0, 20):8.3f} {-rng.uniform(0, 1000):10.2f} {-rng.uniform(0, 20):10.3f} N/A\n")
+            lines.append(f"Time spent computing SSSP: {rng.uniform(0, 10):.6f} seconds\n")
+            lines.append(f"Serial number (magic cookie) for the routing is: {rng.randint(-2**62, 2**62)}\n")
+            lines.append(f"Critical path: {rng.uniform(0, 20):.5f} ns\n")
+            lines.append(f"Total wirelength: {rng.randint(0, 10**7)}, average net length: 12.5\n")
+            lines.append(f"total_heap_pushes: {rng.randint(0, 10**9)} total_heap_pops: {rng.randint(0, 10**9)}\n")
+            lines.append(f"Routing took {rng.uniform(0, 1000):.2f} seconds (max_rss {rng.uniform(0, 10000):.1f} MiB, delta_rss +0.0 MiB)\n")
+            text = "".join(lines)
+            f.write(text)
+            written += len(text)
+
+# The metrics parsed by the original run_test.py.
+BENCH_METRICS = ["routing_time", "sssp_time", "cpd", "wl", "min_chan_width", "magic_cookie", "heap_push_pop"]
+
+# The original parsing loop from run_test.py, kept here as the baseline.
+def baseline_scan(file_path):
+    patterns = [log_scanner.METRIC_PATTERNS[metric] for metric in BENCH_METRICS]
+    num_matches = 0
+    with open(file_path, 'r') as f:
+        for line in f:
+            for pattern in patterns:
+                if re.search(pattern, line):
+                    num_matches += 1
+    return num_matches
+
+def scanner_scan(file_path):
+    num_matches = 0
+    for _ in log_scanner.scan_file(file_path, BENCH_METRICS):
+        num_matches += 1
+    return num_matches
+
+def bench_log_scanner_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    temp_dir = None
+    log_file = args.log
+    if log_file == "":
+        temp_dir = tempfile.TemporaryDirectory()
+        log_file = temp_dir.name + "/vpr.out"
+        print(f"Generating a {args.size} MiB synthetic log...")
+        generate_synthetic_log(log_file, args.size)
+    size_mb = os.path.getsize(log_file) / (1024 * 1024)
+
+    start = time.perf_counter()
+    scanner_matches = scanner_scan(log_file)
+    scanner_time = time.perf_counter() - start
+    print(f"LogScanner:\t{scanner_time:.3f} s\t{size_mb / scanner_time:.1f} MiB/s\t{scanner_matches} matches")
+
+    if not args.skip_baseline:
+        start = time.perf_counter()
+        baseline_matches = baseline_scan(log_file)
+        baseline_time = time.perf_counter() - start
+        print(f"Baseline:\t{baseline_time:.3f} s\t{size_mb / baseline_time:.1f} MiB/s\t{baseline_matches} matches")
+        print(f"Speedup:\t{baseline_time / scanner_time:.2f}x")
+        if baseline_matches != scanner_matches:
+            print("ERROR: LogScanner and baseline found a different number of matches!")
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+if __name__ == "__main__":
+    bench_log_scanner_main(sys.argv[1:])
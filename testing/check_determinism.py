@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+
+# Checks that routing is deterministic, and finds where it is not.
+#
+# Every circuit of a test suite is routed K times (optionally with a different
+# number of threads each time), and the digests of every router iteration are
+# compared against the first trial. If the trials differ, the first router
+# iteration where they diverge is reported, which narrows down where (and with
+# which settings, such as post_target_prune_offset) the router stopped being
+# deterministic.
+#
+# For example, to route every circuit with 1, 2, 4 and 8 threads:
+#   ./check_determinism.py mcnc -k 4 -thread-counts 1 2 4 8 -j 4
+#
+# The options of run_test.py are also accepted.
+
+import sys
+import copy
+
+import result_cache
+import run_test
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = run_test.command_parser(prog)
+    parser.description = "Routes each circuit of a test suite several times and checks they match."
+
+    # Number of times each circuit is routed.
+    parser.add_argument(
+        "-k",
+        default=2,
+        type=int,
+        metavar="NUM_TRIALS",
+    )
+
+    # Number of threads of each trial (cycled through if there are fewer than
+    # K). By default, every trial uses -T.
+    parser.add_argument(
+        "-thread-counts",
+        default=[],
+        type=int,
+        nargs="+",
+        metavar="T",
+    )
+
+    return parser
+
+# Find the first router iteration where two trials diverge. Returns None if the
+# trials are identical, otherwise a description of where they diverge.
+def find_divergence(reference, run_data):
+    if reference.total_magic_cookie == run_data.total_magic_cookie:
+        return None
+    reference_digests = reference.iteration_digests or []
+    digests = run_data.iteration_digests or []
+    for reference_digest, digest in zip(reference_digests, digests):
+        if reference_digest != digest:
+            attempt, iteration, _ = digest
+            return f"attempt {attempt}, iteration {iteration}"
+    if len(reference_digests) != len(digests):
+        shorter = min(reference_digests, digests, key=len)
+        if len(shorter) == 0:
+            return "iteration 1"
+        attempt, iteration, _ = shorter[-1]
+        return f"after attempt {attempt}, iteration {iteration} (different number of iterations)"
+    return "final QoR (CPD, wirelength or magic cookie)"
+
+def check_determinism_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+    if args.cache:
+        print("WARNING: The result cache is not used when checking determinism.")
+        args.cache = False
+    if not run_test.check_coordinator_args(args) or not run_test.check_core_budget(args):
+        return False
+
+    test_run = run_test.setup_test_run(args.tests_reference_dir_base, args.test_name)
+    if test_run is None:
+        print("Invalid test")
+        return False
+    print(test_run.arch_dir)
+    run_test.write_run_info(test_run, args, arg_list, "determinism")
+
+    # Each trial is routed in its own directory (trialNNN) of each circuit.
+    thread_counts = args.thread_counts if len(args.thread_counts) != 0 else [args.T]
+    jobs = []
+    trial_threads = []
+    for trial in range(1, args.k + 1):
+        trial_args = copy.copy(args)
+        trial_args.T = thread_counts[(trial - 1) % len(thread_counts)]
+        trial_threads.append(trial_args.T)
+        jobs += run_test.build_circuit_jobs(test_run, trial_args, f"trial{trial:03d}/",
+                                            working_dir_name=f"trial{trial:03d}")
+
+    results = run_test.run_circuit_jobs(jobs, args)
+
+    # Compare the trials of every circuit against the first trial.
+    num_circuits = len(test_run.circuits)
+    report = dict()
+    all_deterministic = True
+    print("*" * 30)
+    print("*   Determinism Information  *")
+    print("*" * 30)
+    print("Circuit:\tDeterministic\tTotal-Magic-Cookie\tFirst-Divergence")
+    for circuit_index, circuit in enumerate(test_run.circuits):
+        trials = [results[trial * num_circuits + circuit_index] for trial in range(args.k)]
+        reference = trials[0]
+        divergences = []
+        for trial, run_data in enumerate(trials[1:], start=2):
+            if run_data.timed_out or run_data.return_code != 0:
+                divergences.append((trial, "did not finish routing"))
+                continue
+            divergence = find_divergence(reference, run_data)
+            if divergence is not None:
+                divergences.append((trial, divergence))
+        if reference.timed_out or reference.return_code != 0:
+            divergences.insert(0, (1, "did not finish routing"))
+
+        report[circuit] = {
+            "total_magic_cookies": [run_data.total_magic_cookie for run_data in trials],
+            "thread_counts": trial_threads,
+            "divergences": [{"trial": trial, "divergence": divergence} for trial, divergence in divergences],
+        }
+        if len(divergences) == 0:
+            print(f"{circuit}:\tyes\t{reference.total_magic_cookie}\t-")
+            continue
+        all_deterministic = False
+        trial, divergence = divergences[0]
+        print(f"{circuit}:\tno\t{reference.total_magic_cookie}\t"
+              f"trial {trial} (T={trial_threads[trial - 1]}) vs trial 1 (T={trial_threads[0]}): {divergence}")
+
+    result_cache.write_json_atomic(test_run.run_dir + "/determinism.json", report)
+    if all_deterministic:
+        print(f"All {num_circuits} circuits routed identically in {args.k} trials.")
+    else:
+        print("WARNING: Routing is not deterministic! See determinism.json for every divergence.")
+    return all_deterministic
+
+if __name__ == "__main__":
+    if not check_determinism_main(sys.argv[1:]):
+        sys.exit(1)
@@ -0,0 +1,570 @@
+#!/usr/bin/python3
+
+# Distribution of VPR route jobs to workers on other hosts.
+#
+# With -coordinator HOST:PORT, run_test.py (and run_matrix.py, and the
+# repeated trials and determinism checks) does not route the circuits itself.
+# It serves its job queue on that address instead, longest job first, and this
+# script runs the workers which route them:
+#
+#   ./run_test.py koios_large -T4 -Q16 -coordinator 0.0.0.0:5123
+#   ./job_server.py coordinator-host:5123 -j 3       (on each worker host)
+#
+# Each worker pulls one job at a time, routes it in a scratch directory (with
+# the config files of the run sent by the coordinator), then streams the files
+# of the working directory (vpr.out, vpr_err.out, telemetry, ...) back in chunks
+# followed by the parsed results, which the coordinator writes into the run
+# directory as if the circuit had been routed locally. While a job is running,
+# its worker sends a heartbeat every few seconds. A job whose worker
+# disconnects, or sends nothing for -heartbeat-timeout seconds, is put back at
+# the front of the queue for the next worker; after -max-attempts attempts it is
+# recorded as failed (and can be retried with -resume).
+#
+# The input files of the suites (tests-reference-dir-base) and VTR are not
+# sent, so they must be on every worker host: on a shared file system, or at
+# another path given with -path-map OLD=NEW (and -vtr_dir). The result cache is
+# not used by the workers.
+#
+# Everything can be tested on one machine with -local-workers N, which starts N
+# worker processes connected to the coordinator on localhost:
+#   ./run_test.py mcnc -coordinator localhost:0 -local-workers 4
+#
+# Messages are pickled over multiprocessing.connection and authenticated with
+# -authkey or ROUTE_JOBS_AUTHKEY (the same on the coordinator and the workers).
+# Anyone with the key can run code on the coordinator and the workers, so the
+# coordinator only serves on a non-loopback address with a key given to it; on
+# loopback it makes a random key if none is given.
+
+import os
+import sys
+import time
+import queue
+import shutil
+import socket
+import secrets
+import ipaddress
+import argparse
+import tempfile
+import threading
+import traceback
+import subprocess
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+
+import run_test
+import scheduler
+
+SCRIPT_PATH = os.path.abspath(__file__)
+
+AUTHKEY_ENV_VAR = run_test.AUTHKEY_ENV_VAR
+
+# Size of the chunks the files of a job are sent back in.
+FILE_CHUNK_SIZE = 1 << 20
+
+# Time a worker waits before asking again when every job left is running.
+WAIT_INTERVAL = 1.0
+
+# Positions of the paths in the args of run_test.run_vpr_route which are
+# changed to run a job on a worker.
+REFERENCE_DIR_ARG = 0
+WORKING_DIR_ARG = 1
+CIRCUIT_NAME_ARG = 2
+VTR_DIR_ARG = 4
+CONFIG_FILE_ARG = 5
+CACHE_DIR_ARG = 9
+
+# Helper method to split a HOST:PORT address.
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    if host == "" or not port.isdigit():
+        raise ValueError(f"Invalid address {address} (expected HOST:PORT)")
+    return host, int(port)
+
+# Helper method to check if a host name refers to a loopback address.
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+# Get the key the coordinator on the given address authenticates its workers
+# with. Without a key, a random one is made on loopback addresses, and serving
+# on any other address is refused.
+def get_coordinator_authkey(address, authkey):
+    if authkey != "":
+        return authkey
+    host, _ = parse_address(address)
+    if not is_loopback(host):
+        raise ValueError(f"Refusing to serve jobs on {address} without an authkey (give -authkey or set {AUTHKEY_ENV_VAR})")
+    authkey = secrets.token_hex(16)
+    print(f"Workers must use -authkey {authkey}")
+    return authkey
+
+# Helper method to read the files of a config directory, which are sent to the
+# workers with each job.
+def read_config_files(config_dir):
+    config_files = dict()
+    for file_name in sorted(os.listdir(config_dir)):
+        file_path = config_dir + "/" + file_name
+        if os.path.isfile(file_path):
+            with open(file_path, "rb") as f:
+                config_files[file_name] = f.read()
+    return config_files
+
+# A worker connected to the coordinator, and when it was last heard from.
+class WorkerConnection:
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.last_seen = time.time()
+
+# A job which is running on a worker.
+class Assignment:
+    def __init__(self, worker):
+        self.worker = worker
+        self.start = time.time()
+
+# Serves a list of route jobs to the workers which connect to it, re-queueing
+# the jobs of workers which are lost.
+class Coordinator:
+    def __init__(self, jobs, address, authkey, history=None, heartbeat_timeout=60.0, max_attempts=3):
+        self.jobs = jobs
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        predictions = scheduler.predict_runtimes(jobs, history)
+        self.pending = sorted(range(len(jobs)), key=lambda i: predictions[i], reverse=True)
+        self.assigned = dict()
+        self.attempts = [0] * len(jobs)
+        self.num_done = 0
+        self.done = [False] * len(jobs)
+        self.workers = []
+        self.config_files = dict()
+        # (index, run data, start, end) of every finished job, handled by the
+        # thread running the coordinator.
+        self.finished = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.authkey = authkey.encode()
+        self.listener = Listener(parse_address(address), authkey=self.authkey)
+        self.address = self.listener.address
+
+    # Accept workers until the coordinator is closed, serving each on its own
+    # thread.
+    def accept_workers(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                if self.closed:
+                    return
+                print(f"WARNING: Rejected a worker: {e}")
+                continue
+            if self.closed:
+                connection.close()
+                return
+            threading.Thread(target=self.serve_worker, args=(connection,), daemon=True).start()
+
+    def serve_worker(self, connection):
+        worker = None
+        try:
+            _, name = connection.recv()
+            worker = WorkerConnection(connection, name)
+            with self.lock:
+                self.workers.append(worker)
+            print(f"Worker {name} connected", flush=True)
+            connection.send(("welcome", self.heartbeat_timeout / 4.0))
+            while True:
+                message = connection.recv()
+                kind = message[0]
+                with self.lock:
+                    worker.last_seen = time.time()
+                    if kind == "request":
+                        reply = self.get_next_job(worker)
+                    elif kind == "file":
+                        self.write_file_chunk(worker, *message[1:])
+                        continue
+                    elif kind == "result":
+                        self.finish_job(worker, message[1], run_test.RunData.from_dict(message[2]))
+                        continue
+                    elif kind == "error":
+                        print(f"WARNING: {self.jobs[message[1]].name} failed on {worker.name}:\n{message[2]}")
+                        if self.is_assigned(worker, message[1]):
+                            del self.assigned[message[1]]
+                            self.requeue(message[1])
+                        continue
+                    else:
+                        # Heartbeat
+                        continue
+                connection.send(reply)
+                if reply[0] == "done":
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            if worker is not None:
+                self.drop_worker(worker, "disconnected")
+
+    # Helper method to check if a job is still assigned to a worker (it may
+    # have been re-queued if the worker was lost).
+    def is_assigned(self, worker, index):
+        assignment = self.assigned.get(index)
+        return assignment is not None and assignment.worker is worker
+
+    # Get the message answering a worker's request for a job. Must be called
+    # with the lock held.
+    def get_next_job(self, worker):
+        if self.num_done == len(self.jobs):
+            return ("done",)
+        if len(self.pending) == 0:
+            return ("wait", WAIT_INTERVAL)
+        index = self.pending.pop(0)
+        self.attempts[index] += 1
+        self.assigned[index] = Assignment(worker)
+        job = self.jobs[index]
+        config_dir = os.path.dirname(job.args[CONFIG_FILE_ARG])
+        if config_dir not in self.config_files:
+            self.config_files[config_dir] = read_config_files(config_dir)
+        attempt = f" (attempt {self.attempts[index]})" if self.attempts[index] > 1 else ""
+        print(f"Sending {job.name} to {worker.name}{attempt}", flush=True)
+        return ("job", index, job.name, job.args, self.config_files[config_dir])
+
+    # Write a chunk of one of the files of a job into its working directory.
+    # Must be called with the lock held.
+    def write_file_chunk(self, worker, index, relative_path, data, first_chunk):
+        if not self.is_assigned(worker, index):
+            return
+        relative_path = os.path.normpath(relative_path)
+        if os.path.isabs(relative_path) or relative_path.startswith(".."):
+            print(f"WARNING: Ignoring the file {relative_path} of {self.jobs[index].name} from {worker.name}")
+            return
+        file_path = self.jobs[index].args[WORKING_DIR_ARG] + "/" + relative_path
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb" if first_chunk else "ab") as f:
+            f.write(data)
+
+    # Record the results of a job. Results of jobs which were re-queued after
+    # the worker was thought lost are dropped. Must be called with the lock
+    # held.
+    def finish_job(self, worker, index, run_data):
+        if not self.is_assigned(worker, index):
+            return
+        assignment = self.assigned.pop(index)
+        self.done[index] = True
+        self.num_done += 1
+        self.finished.put((index, run_data, assignment.start, time.time()))
+
+    # Put a job back at the front of the queue, or record it as failed if it
+    # has been attempted too many times. Must be called with the lock held.
+    def requeue(self, index):
+        if self.attempts[index] < self.max_attempts:
+            self.pending.insert(0, index)
+            return
+        print(f"ERROR: Giving up on {self.jobs[index].name} after {self.attempts[index]} attempts")
+        run_data = run_test.RunData(self.jobs[index].args[CIRCUIT_NAME_ARG])
+        run_data.return_code = -1
+        self.done[index] = True
+        self.num_done += 1
+        now = time.time()
+        self.finished.put((index, run_data, now, now))
+
+    # Re-queue the jobs of a worker which is lost.
+    def drop_worker(self, worker, reason):
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+            for index, assignment in list(self.assigned.items()):
+                if assignment.worker is worker:
+                    print(f"WARNING: Worker {worker.name} {reason}, re-queueing {self.jobs[index].name}")
+                    del self.assigned[index]
+                    self.requeue(index)
+
+    # Re-queue the jobs of the workers which have not sent a heartbeat in time.
+    def check_heartbeats(self):
+        now = time.time()
+        with self.lock:
+            lost = set(assignment.worker for assignment in self.assigned.values()
+                       if now - assignment.worker.last_seen > self.heartbeat_timeout)
+        for worker in lost:
+            self.drop_worker(worker, f"sent no heartbeat for {now - worker.last_seen:.0f} s")
+
+    def get_num_workers(self):
+        with self.lock:
+            return len(self.workers)
+
+    def close(self):
+        self.closed = True
+        # Wake up the thread accepting workers.
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            pass
+        self.listener.close()
+
+# Helper method to start a worker process on this machine. The key is passed in
+# the environment so it does not show up in the process list.
+def start_local_worker(host, port, authkey):
+    env = dict(os.environ)
+    env[AUTHKEY_ENV_VAR] = authkey
+    return subprocess.Popen([sys.executable, SCRIPT_PATH, f"{host}:{port}"], env=env)
+
+# Run the jobs (of run_test.run_vpr_route) on the workers which connect to the
+# given address, with num_local_workers of them started on this machine.
+# The arguments and results are the same as scheduler.run_longest_first.
+def run_distributed(jobs, address, authkey="", history=None, get_runtime=None, on_result=None,
+                    num_local_workers=0, heartbeat_timeout=60.0, max_attempts=3):
+    authkey = get_coordinator_authkey(address, authkey)
+    coordinator = Coordinator(jobs, address, authkey, history, heartbeat_timeout, max_attempts)
+    host, port = coordinator.address
+    print(f"Serving {len(jobs)} jobs on {host}:{port}", flush=True)
+    threading.Thread(target=coordinator.accept_workers, daemon=True).start()
+    local_host = "localhost" if host in ("0.0.0.0", "") else host
+    local_workers = [start_local_worker(local_host, port, authkey) for _ in range(num_local_workers)]
+
+    results = [None] * len(jobs)
+    run_start = time.time()
+    num_finished = 0
+    try:
+        while num_finished != len(jobs):
+            coordinator.check_heartbeats()
+            try:
+                index, result, start, end = coordinator.finished.get(timeout=1.0)
+            except queue.Empty:
+                if len(local_workers) != 0 and all(worker.poll() is not None for worker in local_workers) and \
+                        coordinator.get_num_workers() == 0:
+                    raise RuntimeError("Every local worker exited before the jobs were done")
+                continue
+            num_finished += 1
+            results[index] = result
+            scheduler.record_runtime(history, jobs[index], result, start, end, get_runtime)
+            if on_result is not None:
+                on_result(jobs[index], result)
+        # Give the workers waiting for a job the chance to hear that the jobs
+        # are done before the coordinator goes away.
+        deadline = time.time() + 2 * WAIT_INTERVAL
+        while coordinator.get_num_workers() != 0 and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        coordinator.close()
+        for worker in local_workers:
+            try:
+                worker.wait(timeout=10.0)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                worker.wait()
+
+    if history is not None:
+        history.save()
+    print(f"Actual makespan: {time.time() - run_start:.2f} s")
+
+    return results
+
+# Helper method to get the args of a job to run it in a scratch directory of a
+# worker.
+def localize_job_args(thread_args, job_dir, config_files, vtr_dir, path_map):
+    thread_args = list(thread_args)
+    for position in [REFERENCE_DIR_ARG, VTR_DIR_ARG]:
+        for old, new in path_map:
+            if thread_args[position].startswith(old):
+                thread_args[position] = new + thread_args[position][len(old):]
+                break
+    if vtr_dir != "":
+        thread_args[VTR_DIR_ARG] = vtr_dir
+    config_dir = job_dir + "/config"
+    os.makedirs(config_dir)
+    for file_name, data in config_files.items():
+        with open(config_dir + "/" + os.path.basename(file_name), "wb") as f:
+            f.write(data)
+    thread_args[CONFIG_FILE_ARG] = config_dir + "/" + os.path.basename(thread_args[CONFIG_FILE_ARG])
+    thread_args[WORKING_DIR_ARG] = job_dir + "/common"
+    os.makedirs(thread_args[WORKING_DIR_ARG])
+    thread_args[CACHE_DIR_ARG] = ""
+    return thread_args
+
+# Send every file of a job's working directory back to the coordinator.
+def send_files(send, index, working_dir):
+    for dir_path, _, file_names in os.walk(working_dir):
+        for file_name in sorted(file_names):
+            file_path = dir_path + "/" + file_name
+            relative_path = os.path.relpath(file_path, working_dir)
+            with open(file_path, "rb") as f:
+                first_chunk = True
+                while True:
+                    data = f.read(FILE_CHUNK_SIZE)
+                    if not data and not first_chunk:
+                        break
+                    send(("file", index, relative_path, data, first_chunk))
+                    first_chunk = False
+
+# Connect to the coordinator and route its jobs until there are none left.
+# Returns False if the coordinator could not be reached.
+def run_worker(address, authkey, vtr_dir="", path_map=(), scratch_dir=None, connect_timeout=60.0):
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    deadline = time.time() + connect_timeout
+    while True:
+        try:
+            connection = Client(parse_address(address), authkey=authkey.encode())
+            break
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                print(f"ERROR: Could not connect to the coordinator at {address}")
+                return False
+            time.sleep(WAIT_INTERVAL)
+        except multiprocessing.AuthenticationError:
+            print(f"ERROR: The coordinator at {address} rejected the authkey")
+            return False
+
+    # The heartbeats are sent from another thread while a job is running.
+    send_lock = threading.Lock()
+    def send(message):
+        with send_lock:
+            connection.send(message)
+
+    scratch_dir = os.path.abspath(scratch_dir or tempfile.gettempdir())
+    try:
+        send(("hello", name))
+        _, heartbeat_interval = connection.recv()
+        while True:
+            send(("request",))
+            reply = connection.recv()
+            if reply[0] == "done":
+                break
+            if reply[0] == "wait":
+                time.sleep(reply[1])
+                continue
+            _, index, job_name, thread_args, config_files = reply
+
+            stop_heartbeats = threading.Event()
+            def send_heartbeats():
+                while not stop_heartbeats.wait(heartbeat_interval):
+                    send(("heartbeat", index))
+            heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
+            heartbeat_thread.start()
+
+            job_dir = tempfile.mkdtemp(prefix="route_job_", dir=scratch_dir)
+            try:
+                local_args = localize_job_args(thread_args, job_dir, config_files, vtr_dir, path_map)
+                run_data = run_test.run_vpr_route(local_args)
+            except Exception:
+                run_data = None
+                error = traceback.format_exc()
+            finally:
+                stop_heartbeats.set()
+                heartbeat_thread.join()
+            os.chdir(scratch_dir)
+
+            if run_data is None:
+                send(("error", index, error))
+            else:
+                send_files(send, index, local_args[WORKING_DIR_ARG])
+                send(("result", index, run_data.to_dict()))
+            shutil.rmtree(job_dir, ignore_errors=True)
+    except (EOFError, OSError):
+        print(f"Worker {name} lost the coordinator")
+    finally:
+        connection.close()
+    return True
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Runs workers which route the jobs of a run_test.py -coordinator."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    # HOST:PORT of the coordinator.
+    parser.add_argument("address")
+
+    # Number of jobs to route at once.
+    parser.add_argument(
+        "-j",
+        default=1,
+        type=int,
+        metavar="NUM_PROC",
+    )
+
+    # Key of the coordinator (by default, ROUTE_JOBS_AUTHKEY).
+    parser.add_argument(
+        "-authkey",
+        default=os.environ.get(AUTHKEY_ENV_VAR, ""),
+        type=str,
+    )
+
+    # VTR directory of this host (by default, the coordinator's).
+    parser.add_argument(
+        "-vtr_dir",
+        default="",
+        type=str,
+        metavar="VTR_DIR",
+    )
+
+    # Map paths of the coordinator to paths of this host, such as
+    # /home/me/tests=/scratch/tests. May be given several times.
+    parser.add_argument(
+        "-path-map",
+        default=[],
+        type=str,
+        action="append",
+        metavar="OLD=NEW",
+    )
+
+    # Directory the jobs are routed in (the system temporary directory by
+    # default).
+    parser.add_argument(
+        "-scratch-dir",
+        default=None,
+        type=str,
+    )
+
+    # Seconds to keep trying to reach the coordinator.
+    parser.add_argument(
+        "-connect-timeout",
+        default=60.0,
+        type=float,
+        metavar="SECONDS",
+    )
+
+    # Keep serving coordinators (such as every round of -repeat) instead of
+    # exiting when one is done.
+    parser.add_argument(
+        "-persist",
+        action='store_true'
+    )
+
+    return parser
+
+def job_server_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    path_map = []
+    for mapping in args.path_map:
+        old, separator, new = mapping.partition("=")
+        if separator == "":
+            print(f"ERROR: Invalid path map {mapping} (expected OLD=NEW)")
+            return 1
+        path_map.append((old, new))
+    parse_address(args.address)
+    if args.authkey == "":
+        print(f"ERROR: No authkey given (use -authkey or set {AUTHKEY_ENV_VAR})")
+        return 1
+
+    worker_args = (args.address, args.authkey, args.vtr_dir, path_map, args.scratch_dir, args.connect_timeout)
+    while True:
+        if args.j == 1:
+            connected = run_worker(*worker_args)
+        else:
+            workers = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.j)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            connected = True
+        if not args.persist:
+            return 0 if connected else 1
+        time.sleep(WAIT_INTERVAL)
+
+if __name__ == "__main__":
+    sys.exit(job_server_main(sys.argv[1:]))
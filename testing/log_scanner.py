@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+# Fast scanner for VPR log files.
+#
+# Instead of running one re.search per metric on every line of vpr.out, the log
+# is read in large blocks and each block is searched for a literal keyword of
+# every metric using str.find (which runs at memory speed). The metric's regex
+# is only run on the few lines which contain its keyword, so the per-line Python
+# overhead disappears. This matters for the multi-hundred MB logs produced by
+# Titan and koios_large runs.
+
+import re
+
+# The metrics that can be extracted from a VPR log, and the pattern used to
+# extract them. Every capture group of a pattern becomes one value of the
+# metric (converted using the type in METRIC_TYPES).
+METRIC_PATTERNS = {
+    "routing_time": r"Routing took (\d+\.\d+) seconds.*max_rss (\d+\.\d+) MiB",
+    "sssp_time": r"Time spent computing SSSP: (\d+\.\d+) seconds",
+    "cpd": r"Critical path: (\d+\.\d+) ns",
+    "wl": r"Total wirelength: (\d+), average net length",
+    "min_chan_width": r"Best routing used a channel width factor of (\d+).",
+    "magic_cookie": r"Serial number \(magic cookie\) for the routing is: (-?\d+)",
+    "heap_push_pop": r"total_heap_pushes: (\d+) total_heap_pops: (\d+)",
+    # The VTR revision VPR was built from (for example, v8.0.0-11031-g0ebf8e6f2).
+    "vpr_revision": r"^\s*Revision: (\S+)",
+    # One row of the router iteration table:
+    # Iter, Time, pres fac, BBs Updt, Heap push, ..., Overused RR Nodes, Wirelength, ...
+    # The row after the time column is kept as-is.
+    "route_iter": r"^\s*(\d+)\s+(\d+\.\d+)\s+(\S+\s+\d+\s+(\S+)\s.*%\).*)$",
+}
+
+METRIC_TYPES = {
+    "routing_time": (float, float),
+    "sssp_time": (float,),
+    "cpd": (float,),
+    "wl": (int,),
+    "min_chan_width": (int,),
+    "magic_cookie": (int,),
+    "heap_push_pop": (int, int),
+    "vpr_revision": (str,),
+    "route_iter": (int, float, str, lambda value: int(float(value))),
+}
+
+# A literal string which every line matching the metric's pattern contains.
+# Used to cheaply find candidate lines before running any regex.
+METRIC_KEYWORDS = {
+    "routing_time": "Routing took ",
+    "sssp_time": "Time spent computing SSSP: ",
+    "cpd": "Critical path: ",
+    "wl": "Total wirelength: ",
+    "min_chan_width": "Best routing used a channel width factor of ",
+    "magic_cookie": "Serial number (magic cookie) for the routing is: ",
+    "heap_push_pop": "total_heap_pushes: ",
+    "vpr_revision": "Revision: ",
+    "route_iter": "%)",
+}
+
+# Default size of the blocks read from a log file.
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+class LogScanner:
+    def __init__(self, metrics=None):
+        if metrics is None:
+            metrics = list(METRIC_PATTERNS.keys())
+        self.metrics = list(metrics)
+        self.patterns = {metric: re.compile(METRIC_PATTERNS[metric], re.MULTILINE) for metric in self.metrics}
+
+        # Partial line left over from the last call to feed.
+        self.remainder = ""
+
+    # Scan a block of text made of complete lines, yielding a (metric, values)
+    # tuple for every metric found, in the order they appear in the text.
+    def scan(self, text):
+        found = []
+        for metric in self.metrics:
+            keyword = METRIC_KEYWORDS[metric]
+            pattern = self.patterns[metric]
+            types = METRIC_TYPES[metric]
+            pos = text.find(keyword)
+            while pos != -1:
+                # Only run the regex on the line containing the keyword.
+                line_start = text.rfind("\n", 0, pos) + 1
+                line_end = text.find("\n", pos)
+                if line_end == -1:
+                    line_end = len(text)
+                match = pattern.search(text, line_start, line_end)
+                if match:
+                    values = tuple(convert(value) for convert, value in zip(types, match.groups()))
+                    found.append((line_start, metric, values))
+                pos = text.find(keyword, line_end)
+        # Report the metrics in the order they appear in the log.
+        found.sort(key=lambda x: x[0])
+        for _, metric, values in found:
+            yield metric, values
+
+    # Feed an arbitrary piece of the log (for example, a block read from a
+    # pipe). Only complete lines are scanned; any trailing partial line is
+    # held back until the next call to feed or to flush.
+    def feed(self, text):
+        text = self.remainder + text
+        last_newline = text.rfind("\n")
+        if last_newline == -1:
+            self.remainder = text
+            return
+        self.remainder = text[last_newline + 1:]
+        yield from self.scan(text[:last_newline + 1])
+
+    # Scan whatever partial line is left over from feed.
+    def flush(self):
+        text = self.remainder
+        self.remainder = ""
+        yield from self.scan(text)
+
+    # Scan an iterable of lines (for example, an open file).
+    def scan_lines(self, lines):
+        for line in lines:
+            yield from self.scan(line)
+
+    # Stream a log file from disk in large blocks.
+    def scan_file(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        with open(file_path, 'r', errors='replace') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield from self.feed(chunk)
+        yield from self.flush()
+
+# Helper method to scan a VPR log file with the default set of metrics.
+def scan_file(file_path, metrics=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    return LogScanner(metrics).scan_file(file_path, chunk_size)
+
+# Helper method to collect every value of every metric in a log file into
+# a dictionary of lists, keyed by metric name.
+def collect_metrics(file_path, metrics=None):
+    scanner = LogScanner(metrics)
+    collected = {metric: [] for metric in scanner.metrics}
+    for metric, values in scanner.scan_file(file_path):
+        collected[metric].append(values)
+    return collected
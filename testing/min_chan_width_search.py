@@ -0,0 +1,429 @@
+#!/usr/bin/python3
+
+# Parallel, speculative search for the minimum channel width of circuits.
+#
+# VPR finds the minimum channel width with a binary search, routing at one
+# channel width at a time. Instead, this routes each circuit at several fixed
+# channel widths at once (with --route_chan_width), splitting the bracket
+# [largest unroutable W, smallest routable W] across the available cores, like
+# a k-ary search. Routability is assumed to be monotonic in W, so as soon as an
+# attempt finishes, the attempts it makes pointless are killed:
+#   routed at W      every attempt at a larger W is killed
+#   unroutable at W  every attempt at a smaller W is killed
+# and the freed cores split the largest gap left in the bracket. Until a
+# channel width has routed, the search starts at the circuit's current value in
+# min_w.txt (or -initial-w) and doubles it after each failure, up to -max-w.
+# The search of a circuit ends when the smallest routable W is within -w-step of
+# the largest unroutable W. The circuits of a suite are searched at the same
+# time, sharing the cores.
+#
+# The minimum channel widths found are written to the min_w.txt of the suite's
+# config directory (used by -run-at-min-chan-width and --1.3W):
+#   ./min_chan_width_search.py mcnc_min_search -cores 12
+#
+# Every attempt is routed in its own directory (min_w_search/W<W>) of the
+# circuit, and min_w_search.json in the run directory records every attempt.
+# An attempt which times out (-timeout) counts as unroutable. The options of
+# run_test.py are also accepted.
+
+import os
+import re
+import sys
+import math
+import time
+import signal
+import subprocess
+
+import result_cache
+import run_test
+import scheduler
+
+SUCCESS_PATTERN = re.compile(r"Circuit successfully routed with a channel width factor of (\d+)\.")
+FAILURE_PATTERN = re.compile(r"Circuit is unroutable with a channel width factor of (\d+)\.")
+
+# The outcome of a route attempt at one channel width.
+ROUTED = "routed"
+UNROUTABLE = "unroutable"
+TIMED_OUT = "timeout"
+KILLED = "killed"
+ERROR = "error"
+
+# Time between checks of the running attempts.
+POLL_INTERVAL = 0.1
+
+MIN_W_FILE_NAME = "min_w.txt"
+SEARCH_FILE_NAME = "min_w_search.json"
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = run_test.command_parser(prog)
+    parser.description = "Searches for the minimum channel width of each circuit with parallel route attempts."
+
+    # Channel width of the first attempt of circuits without a min_w.txt entry.
+    parser.add_argument(
+        "-initial-w",
+        default=100,
+        type=int,
+        metavar="W",
+    )
+
+    # Largest channel width tried before a circuit is reported as unroutable.
+    parser.add_argument(
+        "-max-w",
+        default=1000,
+        type=int,
+        metavar="W",
+    )
+
+    # Granularity of the channel widths tried (unidirectional architectures
+    # need even channel widths).
+    parser.add_argument(
+        "-w-step",
+        default=2,
+        type=int,
+        metavar="STEP",
+    )
+
+    # Only search these circuits (by default, every circuit of the suite).
+    parser.add_argument(
+        "-circuits",
+        default=[],
+        type=str,
+        nargs="+",
+    )
+
+    # Only report the minimum channel widths, without rewriting min_w.txt.
+    parser.add_argument(
+        "-no-write",
+        action='store_true'
+    )
+
+    return parser
+
+# Helper method to remove the channel width from a list of VPR arguments.
+def remove_chan_width_args(vpr_args):
+    stripped = []
+    skip = False
+    for arg in vpr_args:
+        if skip:
+            skip = False
+        elif arg == "--route_chan_width":
+            skip = True
+        else:
+            stripped.append(arg)
+    return stripped
+
+# Helper method to get the outcome of a finished route attempt from its log.
+def get_attempt_outcome(vpr_out_file, chan_width):
+    with open(vpr_out_file, "r", errors="replace") as f:
+        for line in f:
+            if "channel width factor" not in line:
+                continue
+            match = SUCCESS_PATTERN.search(line)
+            if match and int(match.group(1)) == chan_width:
+                return ROUTED
+            match = FAILURE_PATTERN.search(line)
+            if match and int(match.group(1)) == chan_width:
+                return UNROUTABLE
+    return ERROR
+
+# A route attempt of a circuit at one channel width.
+class Attempt:
+    def __init__(self, chan_width, process, cores, working_dir):
+        self.chan_width = chan_width
+        self.process = process
+        self.cores = cores
+        self.working_dir = working_dir
+        self.start = time.time()
+        self.end = None
+        self.outcome = None
+
+    def kill(self):
+        # VPR is the leader of its own process group (with perf, if any).
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+
+    def to_dict(self):
+        return {
+            "chan_width": self.chan_width,
+            "outcome": self.outcome,
+            "start": self.start,
+            "runtime": None if self.end is None else self.end - self.start,
+        }
+
+# The state of the search for the minimum channel width of one circuit.
+class MinChanWidthSearch:
+    def __init__(self, circuit, initial_w, max_w, step):
+        self.circuit = circuit
+        self.step = step
+        self.initial_w = self.align_up(initial_w)
+        self.max_w = step * (max_w // step)
+        self.routed = set()
+        self.unroutable = set()
+        # Channel width -> attempt of the running attempts.
+        self.running = dict()
+        self.attempts = []
+        self.error = None
+        self.start = time.time()
+        self.end = None
+
+    def align_up(self, chan_width):
+        return self.step * math.ceil(chan_width / self.step)
+
+    # The smallest channel width which routed (None if none has), and the
+    # largest one below it which did not (0 if none has failed).
+    def get_bracket(self):
+        upper = min(self.routed) if len(self.routed) != 0 else None
+        lower = max([w for w in self.unroutable if upper is None or w < upper], default=0)
+        return lower, upper
+
+    # Helper method to check if the bracket is as small as it can get.
+    def is_resolved(self):
+        lower, upper = self.get_bracket()
+        if upper is None:
+            return lower >= self.max_w
+        return upper - lower <= self.step
+
+    def is_done(self):
+        return len(self.running) == 0 and (self.error is not None or self.is_resolved())
+
+    # The minimum channel width found, or None if there is none.
+    def get_min_chan_width(self):
+        if self.error is not None:
+            return None
+        return self.get_bracket()[1]
+
+    # Get the next channel width to try, or None if another attempt would not
+    # help.
+    def get_next_chan_width(self):
+        if self.error is not None or self.is_resolved():
+            return None
+        lower, upper = self.get_bracket()
+        if upper is None:
+            if len(self.running) == 0:
+                # Nothing has routed yet, so probe above the bracket.
+                if lower < self.initial_w:
+                    return self.initial_w
+                return min(self.align_up(2 * lower), self.max_w)
+            # Speculate that the largest running attempt will route.
+            upper = max(self.running)
+        points = sorted(set([lower, upper] + [w for w in self.running if lower < w < upper]))
+        best_gap = 0
+        best_chan_width = None
+        for a, b in zip(points, points[1:]):
+            if b - a <= self.step or b - a <= best_gap:
+                continue
+            chan_width = self.step * round((a + b) / 2.0 / self.step)
+            chan_width = min(max(chan_width, a + self.step), b - self.step)
+            best_gap = b - a
+            best_chan_width = chan_width
+        return best_chan_width
+
+    # Record the outcome of an attempt. Returns the attempts which can no
+    # longer change the result, to be killed.
+    def record(self, attempt):
+        del self.running[attempt.chan_width]
+        if attempt.outcome == ROUTED:
+            self.routed.add(attempt.chan_width)
+        elif attempt.outcome in (UNROUTABLE, TIMED_OUT):
+            self.unroutable.add(attempt.chan_width)
+        else:
+            self.error = f"VPR failed at W={attempt.chan_width} (see {attempt.working_dir})"
+            return list(self.running.values())
+        lower, upper = self.get_bracket()
+        return [running for chan_width, running in self.running.items()
+                if chan_width <= lower or (upper is not None and chan_width >= upper)]
+
+# Start a route attempt of a circuit at one channel width on the given cores.
+def start_attempt(test_run, args, search, chan_width, cores):
+    working_dir = f"{test_run.arch_dir}/{search.circuit}/min_w_search/W{chan_width}"
+    os.makedirs(working_dir, exist_ok=True)
+    reference_dir = test_run.reference_dir + "/" + search.circuit + "/common"
+    config_args = run_test.get_vpr_args_from_config(test_run.config_dir + "/config.txt", search.circuit,
+                                                    special_params=False)
+    extra_vpr_args = run_test.get_extra_vpr_args(args, search.circuit, test_run.config_dir)
+    extra_vpr_args = remove_chan_width_args(extra_vpr_args) + [
+        "--route_chan_width", str(chan_width),
+        "--thread_affinity", ",".join(str(core) for core in cores),
+    ]
+    vpr_command = run_test.get_vpr_route_command(reference_dir, search.circuit, test_run.arch, args.vtr_dir,
+                                                 remove_chan_width_args(config_args), extra_vpr_args)
+    with open(working_dir + "/vpr.out", "w") as out_file, open(working_dir + "/vpr_err.out", "w") as err_file:
+        process = subprocess.Popen(vpr_command, cwd=working_dir, stdout=out_file, stderr=err_file,
+                                   start_new_session=True)
+    attempt = Attempt(chan_width, process, cores, working_dir)
+    search.running[chan_width] = attempt
+    search.attempts.append(attempt)
+    print(f"{search.circuit}: trying W={chan_width} (bracket {search.get_bracket()})", flush=True)
+    return attempt
+
+# Search for the minimum channel width of every circuit, running as many route
+# attempts at once as fit in the core budget.
+def run_searches(test_run, args, searches, core_budget):
+    num_threads = max(args.T, 1)
+    free_cores = list(core_budget)
+    while not all(search.is_done() for search in searches):
+        # Fill the free cores, giving them to the circuits with the fewest
+        # running attempts first.
+        while len(free_cores) >= num_threads:
+            started = False
+            for search in sorted(searches, key=lambda search: len(search.running)):
+                chan_width = search.get_next_chan_width()
+                if chan_width is None:
+                    continue
+                cores = scheduler.allocate_cores(free_cores, num_threads)
+                for core in cores:
+                    free_cores.remove(core)
+                start_attempt(test_run, args, search, chan_width, cores)
+                started = True
+                break
+            if not started:
+                break
+
+        time.sleep(POLL_INTERVAL)
+        now = time.time()
+        for search in searches:
+            for attempt in list(search.running.values()):
+                if attempt.chan_width not in search.running:
+                    # Killed by an earlier attempt of this round.
+                    continue
+                if attempt.process.poll() is None:
+                    if args.timeout == 0.0 or now - attempt.start < args.timeout:
+                        continue
+                    attempt.kill()
+                    attempt.outcome = TIMED_OUT
+                else:
+                    attempt.outcome = get_attempt_outcome(attempt.working_dir + "/vpr.out", attempt.chan_width)
+                attempt.end = time.time()
+                free_cores.extend(attempt.cores)
+                print(f"{search.circuit}: W={attempt.chan_width} {attempt.outcome} "
+                      f"in {attempt.end - attempt.start:.1f} s", flush=True)
+                for losing_attempt in search.record(attempt):
+                    losing_attempt.kill()
+                    losing_attempt.outcome = KILLED
+                    losing_attempt.end = time.time()
+                    del search.running[losing_attempt.chan_width]
+                    free_cores.extend(losing_attempt.cores)
+                    print(f"{search.circuit}: killed W={losing_attempt.chan_width}", flush=True)
+                if search.is_done() and search.end is None:
+                    search.end = time.time()
+                    if search.error is not None:
+                        print(f"ERROR: {search.circuit}: {search.error}")
+                    else:
+                        print(f"{search.circuit}: minimum channel width is {search.get_min_chan_width()}", flush=True)
+
+# Helper method to read the minimum channel widths of a min_w.txt file, as a
+# list of [circuit, W] entries in the order of the file.
+def read_min_w_file(min_w_file):
+    entries = []
+    if os.path.isfile(min_w_file):
+        with open(min_w_file, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 2:
+                    entries.append([fields[0], fields[1]])
+    return entries
+
+# Rewrite the min_w.txt file with the minimum channel widths found, keeping the
+# entries of the other circuits.
+def write_min_w_file(min_w_file, min_chan_widths):
+    entries = read_min_w_file(min_w_file)
+    for circuit, chan_width in min_chan_widths.items():
+        entry = next((entry for entry in entries if entry[0] == circuit), None)
+        if entry is None:
+            entries.append([circuit, str(chan_width)])
+        else:
+            entry[1] = str(chan_width)
+    temp_file = min_w_file + ".tmp"
+    with open(temp_file, "w") as f:
+        for circuit, chan_width in entries:
+            f.write(f"{circuit} {chan_width}\n")
+    os.replace(temp_file, min_w_file)
+
+# Print the minimum channel width found for every circuit, with the number of
+# attempts and how long the search took.
+def print_search_summary(searches, old_min_chan_widths, file=None):
+    print("Circuit:\tOld-W\tMin-W\tAttempts\tKilled\tWall-time(s)\tAttempt-time(s)", file=file)
+    for search in searches:
+        min_chan_width = search.get_min_chan_width()
+        num_killed = sum(1 for attempt in search.attempts if attempt.outcome == KILLED)
+        attempt_time = sum(attempt.end - attempt.start for attempt in search.attempts if attempt.end is not None)
+        wall_time = (search.end or time.time()) - search.start
+        old = old_min_chan_widths.get(search.circuit)
+        print(f"{search.circuit}:\t{old if old is not None else '-'}\t"
+              f"{min_chan_width if min_chan_width is not None else '-'}\t{len(search.attempts)}\t{num_killed}\t"
+              f"{wall_time:.1f}\t{attempt_time:.1f}", file=file)
+
+def min_chan_width_search_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+    # The channel width is set by the search, and every attempt is pinned to
+    # the cores it is given.
+    args.run_at_min_chan_width = False
+    args.thread_affinity = ""
+
+    if args.w_step <= 0 or args.initial_w <= 0 or args.max_w < args.initial_w:
+        print("ERROR: Invalid channel width range")
+        return 1
+
+    num_cores = args.cores if args.cores != 0 else len(os.sched_getaffinity(0))
+    if not scheduler.check_core_budget(num_cores, max(args.T, 1)):
+        return 1
+
+    test_run = run_test.setup_test_run(args.tests_reference_dir_base, args.test_name)
+    if test_run is None:
+        print("Invalid test")
+        return 1
+    circuits = test_run.circuits
+    if len(args.circuits) != 0:
+        unknown = [circuit for circuit in args.circuits if circuit not in test_run.circuits]
+        if len(unknown) != 0:
+            print(f"ERROR: Unknown circuits: {' '.join(unknown)}")
+            return 1
+        circuits = args.circuits
+    print(test_run.arch_dir)
+    run_test.write_run_info(test_run, args, arg_list, "min_chan_width_search")
+
+    core_budget = scheduler.get_core_budget(num_cores)
+
+    min_w_file = test_run.config_dir + "/" + MIN_W_FILE_NAME
+    old_min_chan_widths = {circuit: int(chan_width) for circuit, chan_width in read_min_w_file(min_w_file)}
+    searches = [MinChanWidthSearch(circuit, old_min_chan_widths.get(circuit, args.initial_w), args.max_w,
+                                   args.w_step) for circuit in circuits]
+
+    start_time = time.time()
+    try:
+        run_searches(test_run, args, searches, core_budget)
+    finally:
+        # Do not leave attempts running if the search is interrupted.
+        for search in searches:
+            for attempt in search.running.values():
+                attempt.kill()
+    print(f"Searched in {time.time() - start_time:.1f} s")
+
+    result_cache.write_json_atomic(test_run.run_dir + "/" + SEARCH_FILE_NAME, {
+        search.circuit: {
+            "min_chan_width": search.get_min_chan_width(),
+            "error": search.error,
+            "attempts": [attempt.to_dict() for attempt in search.attempts],
+        } for search in searches
+    })
+    print_search_summary(searches, old_min_chan_widths)
+    with open(test_run.run_dir + "/summary.txt", "w") as f:
+        print_search_summary(searches, old_min_chan_widths, file=f)
+
+    min_chan_widths = {search.circuit: search.get_min_chan_width() for search in searches
+                       if search.get_min_chan_width() is not None}
+    failed = [search.circuit for search in searches if search.get_min_chan_width() is None]
+    if len(failed) != 0:
+        print(f"WARNING: No minimum channel width found for: {' '.join(failed)}")
+    if not args.no_write and len(min_chan_widths) != 0:
+        write_min_w_file(min_w_file, min_chan_widths)
+        print(f"Wrote {min_w_file}")
+    return 1 if len(failed) != 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(min_chan_width_search_main(sys.argv[1:]))
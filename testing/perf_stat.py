@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+# Helpers to count hardware events of VPR runs with Linux perf.
+#
+# Each run of VPR is wrapped in `perf stat -x,`, which writes the counts of the
+# chosen events (summed over all of VPR's threads) to a CSV file once VPR
+# exits. Hardware counters are not available everywhere (such as in most VMs,
+# or with a restrictive kernel.perf_event_paranoid), so the events are probed
+# before a run and the ones which are not supported are dropped, leaving the
+# software counters.
+
+import os
+import shutil
+import tempfile
+from subprocess import run, PIPE, DEVNULL
+
+# Hardware events, for the memory and branch behaviour of the router.
+HARDWARE_EVENTS = [
+    "cycles",
+    "instructions",
+    "cache-references",
+    "cache-misses",
+    "branches",
+    "branch-misses",
+    "L1-dcache-load-misses",
+    "LLC-loads",
+    "LLC-load-misses",
+]
+
+# Software events, which are available wherever perf is.
+SOFTWARE_EVENTS = [
+    "task-clock",
+    "context-switches",
+    "cpu-migrations",
+    "page-faults",
+]
+
+DEFAULT_EVENTS = HARDWARE_EVENTS + SOFTWARE_EVENTS
+
+PERF_STAT_FILE_NAME = "perf_stat.csv"
+
+# Helper method to get the perf command's path, or None if it is not installed.
+def find_perf():
+    return shutil.which("perf")
+
+# Helper method to get the plain name of an event reported by perf, such as
+# "cycles" for "cycles:u" or "cpu_core/cycles/" (on hybrid CPUs).
+def normalize_event_name(event):
+    if event.endswith("/") and event.count("/") == 2:
+        event = event.split("/")[1]
+    return event.split(":")[0]
+
+# Parse the output of `perf stat -x,` into a dictionary of event -> count.
+# Events which were not supported or not counted are left out.
+def parse_perf_stat(perf_stat_file):
+    counters = dict()
+    if not os.path.isfile(perf_stat_file):
+        return counters
+    with open(perf_stat_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            # value,unit,event,run time,percent of run time counted,...
+            fields = line.split(",")
+            if len(fields) < 3:
+                continue
+            try:
+                value = float(fields[0])
+            except ValueError:
+                # <not supported> or <not counted>
+                continue
+            event = normalize_event_name(fields[2])
+            counters[event] = counters.get(event, 0.0) + value
+    return counters
+
+# Get the perf stat command to prepend to a command, which counts the given
+# events and writes them to out_file.
+def get_perf_command(perf_exec, events, out_file):
+    return [perf_exec, "stat", "-x,", "-o", out_file, "-e", ",".join(events), "--"]
+
+# The supported events found by probe_events, keyed by the events asked for.
+probed_events = dict()
+
+# Find which of the given events can be counted on this machine, by counting
+# them for a trivial command. Returns the supported events, keeping their
+# order; if none of the hardware events can be counted, only the software
+# events are returned. Returns an empty list if perf cannot be run at all.
+def probe_events(perf_exec, events):
+    key = (perf_exec, tuple(events))
+    if key in probed_events:
+        return probed_events[key]
+    supported = []
+    software_events = [event for event in events if event in SOFTWARE_EVENTS] or SOFTWARE_EVENTS
+    with tempfile.TemporaryDirectory() as probe_dir:
+        probe_file = probe_dir + "/" + PERF_STAT_FILE_NAME
+        for candidate_events in [events, software_events]:
+            result = run(get_perf_command(perf_exec, candidate_events, probe_file) + ["true"], stdout=DEVNULL, stderr=PIPE)
+            if result.returncode != 0:
+                continue
+            counters = parse_perf_stat(probe_file)
+            supported = [event for event in candidate_events if event in counters]
+            if len(supported) != 0:
+                break
+    probed_events[key] = supported
+    return supported
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+# Samples the resource usage of a running process from /proc.
+#
+# A thread polls /proc/<pid>/stat and status, and the stat and status of every
+# thread (/proc/<pid>/task/<tid>/), at a set interval, and appends each sample
+# to two CSV files:
+#   telemetry.csv          time_s, rss_mib, hwm_rss_mib, cpu_s, num_threads
+#   telemetry_threads.csv  time_s, tid, cpu_s, voluntary_ctxt_switches,
+#                          nonvoluntary_ctxt_switches
+# where cpu_s is the user + system CPU time used so far. Dividing the change in
+# CPU time by the change in time_s gives the effective parallelism over time.
+
+import os
+import time
+import threading
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+PROCESS_COLUMNS = ["time_s", "rss_mib", "hwm_rss_mib", "cpu_s", "num_threads"]
+THREAD_COLUMNS = ["time_s", "tid", "cpu_s", "voluntary_ctxt_switches", "nonvoluntary_ctxt_switches"]
+
+# Helper method to read the CPU time (in seconds), number of threads, and RSS
+# (in MiB) from a /proc/.../stat file.
+def read_stat(stat_file):
+    with open(stat_file, 'r') as f:
+        text = f.read()
+    # The command name (field 2) may contain spaces, so split after it. The
+    # fields after it start at field 3 (state).
+    fields = text[text.rfind(")") + 2:].split()
+    cpu_time = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    num_threads = int(fields[17])
+    rss = int(fields[21]) * PAGE_SIZE / (1024 * 1024)
+    return cpu_time, num_threads, rss
+
+# Helper method to read the given fields from a /proc/.../status file.
+def read_status(status_file, keys):
+    values = dict()
+    with open(status_file, 'r') as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in keys:
+                values[key] = int(value.split()[0])
+    return values
+
+# Helper method to get the pid of the first child of a process, or None.
+def get_child_pid(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", 'r') as f:
+            children = f.read().split()
+    except OSError:
+        return None
+    if len(children) == 0:
+        return None
+    return int(children[0])
+
+# If follow_child is set, the first child of the process is sampled instead
+# (for when the process is a wrapper, such as perf stat).
+class ProcSampler:
+    def __init__(self, pid, out_dir, interval, follow_child=False):
+        self.pid = None if follow_child else pid
+        self.parent_pid = pid
+        self.interval = interval
+        self.process_file = open(out_dir + "/telemetry.csv", "w")
+        self.thread_file = open(out_dir + "/telemetry_threads.csv", "w")
+        print(",".join(PROCESS_COLUMNS), file=self.process_file)
+        print(",".join(THREAD_COLUMNS), file=self.thread_file)
+        self.peak_rss = None
+        # (time_s, cpu_s) of the first and last samples of the process.
+        self.first_sample = None
+        self.last_sample = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.start_time = None
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.thread.start()
+
+    # Stop sampling. Returns the peak RSS seen (in MiB), or None if the
+    # process could not be sampled.
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.process_file.close()
+        self.thread_file.close()
+        return self.peak_rss
+
+    # Get the average parallelism (CPU time over wall time) of the process over
+    # the window it was sampled in, or None if it was not sampled for long
+    # enough to have a window.
+    def get_avg_parallelism(self):
+        if self.first_sample is None or self.last_sample[0] <= self.first_sample[0]:
+            return None
+        return (self.last_sample[1] - self.first_sample[1]) / (self.last_sample[0] - self.first_sample[0])
+
+    def run(self):
+        while self.sample():
+            if self.stop_event.wait(self.interval):
+                break
+
+    # Take one sample. Returns False once the process has exited.
+    def sample(self):
+        if self.pid is None:
+            # Wait for the wrapper to start its child.
+            self.pid = get_child_pid(self.parent_pid)
+            if self.pid is None:
+                return os.path.isdir(f"/proc/{self.parent_pid}")
+        proc_dir = f"/proc/{self.pid}"
+        sample_time = time.monotonic() - self.start_time
+        try:
+            cpu_time, num_threads, rss = read_stat(proc_dir + "/stat")
+            hwm_rss = read_status(proc_dir + "/status", ["VmHWM"]).get("VmHWM", 0) / 1024
+            tids = os.listdir(proc_dir + "/task")
+        except (OSError, ValueError, IndexError):
+            return False
+        # Zombie processes have no memory left to report.
+        if hwm_rss != 0:
+            self.peak_rss = max(self.peak_rss or 0.0, hwm_rss)
+        if self.first_sample is None:
+            self.first_sample = (sample_time, cpu_time)
+        self.last_sample = (sample_time, cpu_time)
+        print(f"{sample_time:.3f},{rss:.1f},{hwm_rss:.1f},{cpu_time:.2f},{num_threads}", file=self.process_file)
+        for tid in tids:
+            task_dir = proc_dir + "/task/" + tid
+            try:
+                thread_cpu_time, _, _ = read_stat(task_dir + "/stat")
+                switches = read_status(task_dir + "/status", ["voluntary_ctxt_switches", "nonvoluntary_ctxt_switches"])
+            except (OSError, ValueError, IndexError):
+                # The thread exited while it was being sampled.
+                continue
+            print(f"{sample_time:.3f},{tid},{thread_cpu_time:.2f},{switches.get('voluntary_ctxt_switches', 0)},"
+                  f"{switches.get('nonvoluntary_ctxt_switches', 0)}", file=self.thread_file)
+        return True
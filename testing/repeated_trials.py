@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+
+# Repeated trials of runs, with statistics on their run times.
+#
+# One sample of a routing run time on a busy node is noisy, so with -repeat N
+# every circuit of every configuration is routed up to N times. The trials are
+# run in rounds: each round routes every circuit of every configuration once,
+# with the configurations of each circuit interleaved (in a different random
+# order every round), so thermal and frequency drift hits every configuration
+# equally. After each round, the confidence interval of the geomean run time of
+# every configuration is computed, and the trials stop early once all of them
+# are tight enough.
+#
+# The confidence intervals are computed by bootstrapping the trials of each
+# circuit, and configurations are compared with a permutation test on the log
+# run times (trials are shuffled between the two configurations within each
+# circuit), so no assumptions are made about the distribution of run times.
+
+import math
+import random
+
+import result_cache
+import run_test
+
+# Number of resamples used for the bootstrap confidence intervals and of
+# shuffles used for the permutation tests.
+NUM_RESAMPLES = 2000
+
+# Helper method to get the median of a list of values.
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+# Helper method to get the median absolute deviation of a list of values.
+def median_absolute_deviation(values):
+    center = median(values)
+    return median([abs(value - center) for value in values])
+
+# Helper method to get the given percentile (0.0 to 1.0) of a sorted list.
+def percentile(sorted_values, fraction):
+    position = fraction * (len(sorted_values) - 1)
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+# Compute the geomean of the run times of a configuration (the geomean over the
+# circuits of the geomean of each circuit's trials) and its bootstrap
+# confidence interval. samples holds the list of run times of each circuit.
+# Returns (geomean, lower bound, upper bound).
+def geomean_confidence_interval(samples, confidence, rng):
+    log_samples = [[math.log(value) for value in values] for values in samples if len(values) != 0]
+    if len(log_samples) == 0:
+        return None, None, None
+    estimate = sum(sum(logs) / len(logs) for logs in log_samples) / len(log_samples)
+    estimates = []
+    for _ in range(NUM_RESAMPLES):
+        total = 0.0
+        for logs in log_samples:
+            total += sum(rng.choices(logs, k=len(logs))) / len(logs)
+        estimates.append(total / len(log_samples))
+    estimates.sort()
+    alpha = 1.0 - confidence
+    return (math.exp(estimate),
+            math.exp(percentile(estimates, alpha / 2.0)),
+            math.exp(percentile(estimates, 1.0 - alpha / 2.0)))
+
+# Compare the run times of configuration B against configuration A over the
+# circuits both have trials for. Returns the geomean speedup of B over A, its
+# bootstrap confidence interval, and the two-sided p-value of a permutation
+# test of the null hypothesis that both configurations have the same run times.
+def compare_configurations(samples_a, samples_b, confidence, rng):
+    pairs = []
+    for circuit, values_a in samples_a.items():
+        values_b = samples_b.get(circuit, [])
+        if len(values_a) != 0 and len(values_b) != 0:
+            pairs.append(([math.log(value) for value in values_a], [math.log(value) for value in values_b]))
+    if len(pairs) == 0:
+        return None, None, None, None
+
+    # The statistic is the mean over the circuits of the difference in mean
+    # log run time, which is the log of the geomean speedup.
+    def statistic(pairs):
+        return sum(sum(logs_a) / len(logs_a) - sum(logs_b) / len(logs_b) for logs_a, logs_b in pairs) / len(pairs)
+
+    observed = statistic(pairs)
+
+    estimates = []
+    for _ in range(NUM_RESAMPLES):
+        estimates.append(statistic([(rng.choices(logs_a, k=len(logs_a)), rng.choices(logs_b, k=len(logs_b)))
+                                    for logs_a, logs_b in pairs]))
+    estimates.sort()
+    alpha = 1.0 - confidence
+
+    num_extreme = 0
+    for _ in range(NUM_RESAMPLES):
+        shuffled_pairs = []
+        for logs_a, logs_b in pairs:
+            pooled = logs_a + logs_b
+            rng.shuffle(pooled)
+            shuffled_pairs.append((pooled[:len(logs_a)], pooled[len(logs_a):]))
+        if abs(statistic(shuffled_pairs)) >= abs(observed) - 1e-12:
+            num_extreme += 1
+    p_value = (num_extreme + 1) / (NUM_RESAMPLES + 1)
+
+    return (math.exp(observed),
+            math.exp(percentile(estimates, alpha / 2.0)),
+            math.exp(percentile(estimates, 1.0 - alpha / 2.0)),
+            p_value)
+
+# Helper method to check if a trial routed successfully, so its run time can be
+# used as a sample.
+def is_valid_trial(run_data):
+    return (not run_data.timed_out) and run_data.return_code == 0 and run_data.runtime is not None and run_data.runtime > 0
+
+# Helper method to get the jobs of one round of trials, with the
+# configurations of each circuit interleaved in a random order.
+def get_round_jobs(runs, trial, rng):
+    run_jobs = []
+    for run_index, (test_run, run_args, label) in enumerate(runs):
+        jobs = run_test.build_circuit_jobs(test_run, run_args, f"{run_args.test_name}/{label}/",
+                                           working_dir_name=f"trial{trial:03d}")
+        run_jobs.append([(run_index, job) for job in jobs])
+    order = list(range(len(runs)))
+    round_jobs = []
+    for position in range(max(len(jobs) for jobs in run_jobs)):
+        rng.shuffle(order)
+        for run_index in order:
+            if position < len(run_jobs[run_index]):
+                round_jobs.append(run_jobs[run_index][position])
+    return round_jobs
+
+# Print the statistics of the trials of one configuration. Returns the geomean
+# confidence interval.
+def print_run_trials(test_run, run_args, label, run_samples, confidence, rng):
+    print("")
+    name = run_args.test_name if label == "" else f"{run_args.test_name}: {label}"
+    print(f"=============== {name} ({test_run.run_dir}) ===============")
+    print("Circuit:\tMedian-Run-time(s)\tMin(s)\tMax(s)\tMAD(%)\tTrials")
+    for circuit in test_run.circuits:
+        runtimes = [run_data.runtime for run_data in run_samples[circuit]]
+        if len(runtimes) == 0:
+            print(f"{circuit}:\t-\t-\t-\t-\t0")
+            continue
+        center = median(runtimes)
+        print(f"{circuit}:\t{center:.3f}\t{min(runtimes):.3f}\t{max(runtimes):.3f}\t"
+              f"{100.0 * median_absolute_deviation(runtimes) / center:.2f}\t{len(runtimes)}")
+    samples = [[run_data.runtime for run_data in run_samples[circuit]] for circuit in test_run.circuits]
+    value, lower, upper = geomean_confidence_interval(samples, confidence, rng)
+    if value is not None:
+        print(f"Geomean run time: {value:.3f} s ({100.0 * confidence:g}% CI [{lower:.3f}, {upper:.3f}])")
+    return value, lower, upper
+
+# Run every configuration (a list of (test run, arguments, label) tuples) for up
+# to args.repeat rounds of trials, stopping early once the confidence interval
+# of every configuration's geomean run time is within +/- args.ci_target of it.
+# Configurations of the same suite are compared against the first one.
+def run_repeated_trials(runs, args):
+    for _, run_args, _ in runs:
+        if run_args.cache:
+            print("WARNING: The result cache is not used for repeated trials.")
+            run_args.cache = False
+
+    rng = random.Random(0)
+    # Run index -> circuit -> run data of each valid trial.
+    samples = [{circuit: [] for circuit in test_run.circuits} for test_run, _, _ in runs]
+    num_trials = 0
+    for trial in range(1, args.repeat + 1):
+        round_jobs = get_round_jobs(runs, trial, random.Random(trial))
+        jobs = [job for _, job in round_jobs]
+        # No history is given, so the scheduler keeps the interleaved order.
+        results = run_test.run_circuit_jobs(jobs, args)
+        for (run_index, _), run_data in zip(round_jobs, results):
+            if is_valid_trial(run_data):
+                samples[run_index][run_data.circuit_name].append(run_data)
+        num_trials = trial
+
+        if trial < args.min_repeat or args.ci_target == 0.0:
+            continue
+        widest = 0.0
+        for run_samples in samples:
+            runtimes = [[run_data.runtime for run_data in trials] for trials in run_samples.values()]
+            value, lower, upper = geomean_confidence_interval(runtimes, args.confidence, rng)
+            if value is None:
+                widest = math.inf
+                break
+            widest = max(widest, (upper - lower) / 2.0 / value)
+        print(f"Trial {trial}: widest geomean CI is +/-{100.0 * widest:.2f}%")
+        if widest <= args.ci_target:
+            print(f"Stopping after {trial} trials: every geomean CI is within +/-{100.0 * args.ci_target:g}%.")
+            break
+
+    # Report the trials of every configuration, and store the trial with the
+    # median run time of each circuit.
+    baselines = dict()
+    for (test_run, run_args, label), run_samples in zip(runs, samples):
+        print_run_trials(test_run, run_args, label, run_samples, args.confidence, rng)
+        result_cache.write_json_atomic(test_run.run_dir + "/trials.json", {
+            circuit: [run_data.to_dict() for run_data in trials] for circuit, trials in run_samples.items()})
+        median_run_data = dict()
+        for circuit in test_run.circuits:
+            trials = sorted(run_samples[circuit], key=lambda run_data: run_data.runtime)
+            if len(trials) != 0:
+                median_run_data[circuit] = trials[(len(trials) - 1) // 2]
+            else:
+                median_run_data[circuit] = run_test.RunData(circuit)
+        run_test.store_run_results(test_run, run_args, median_run_data)
+        baselines.setdefault(run_args.test_name, (label, run_samples))
+
+    # Compare every configuration against the first configuration of its suite.
+    alpha = 1.0 - args.confidence
+    for (test_run, run_args, label), run_samples in zip(runs, samples):
+        base_label, base_samples = baselines[run_args.test_name]
+        if base_samples is run_samples:
+            continue
+        base_runtimes = {circuit: [run_data.runtime for run_data in trials] for circuit, trials in base_samples.items()}
+        runtimes = {circuit: [run_data.runtime for run_data in trials] for circuit, trials in run_samples.items()}
+        speedup, lower, upper, p_value = compare_configurations(base_runtimes, runtimes, args.confidence, rng)
+        if speedup is None:
+            continue
+        verdict = "significant" if p_value < alpha else "not significant"
+        print(f"{run_args.test_name}: {label} vs {base_label}: speedup {speedup:.3f} "
+              f"({100.0 * args.confidence:g}% CI [{lower:.3f}, {upper:.3f}]), p = {p_value:.4f} ({verdict})")
+
+    print(f"Ran {num_trials} of up to {args.repeat} trials.")
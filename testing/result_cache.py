@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+
+# Persistent, content-addressed cache of routing results.
+#
+# A run of VPR is identified by the hash of the VPR executable, the hash of
+# every input file it reads, and the rest of its argument vector. If a run with
+# the same key has been done before, its parsed results and logs are reused
+# instead of launching VPR again. Options which only change where VPR runs
+# (such as the cores its threads are pinned to) are not part of the key.
+#
+# Layout of the cache directory:
+#   file_hashes.json     Memo of file hashes, keyed by path, size, and mtime.
+#   entries/<key>/       One directory per cached run, containing
+#                        run_data.json, vpr.out and vpr_err.out.
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+# Log files which are stored with each cache entry.
+CACHED_LOG_FILES = ["vpr.out", "vpr_err.out"]
+
+HASH_BLOCK_SIZE = 1 << 22
+
+# VPR options (each taking one value) which are left out of the key. The cores
+# given to a run change from run to run, but not its results.
+UNKEYED_OPTIONS = ["--thread_affinity"]
+
+# Helper method to hash the contents of a file.
+def hash_file(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+# Helper method to write a JSON file atomically, so a reader (or a crash) never
+# sees a partially written file.
+def write_json_atomic(file_path, data):
+    dir_name = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=dir_name, prefix=".tmp_")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(temp_path, file_path)
+
+class ResultCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.entries_dir = self.cache_dir + "/entries"
+        self.file_hashes_file = self.cache_dir + "/file_hashes.json"
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+        # Hashing the rr graph and VPR executable is expensive, so the hashes
+        # are memoized on disk and only recomputed when a file changes.
+        self.file_hashes = dict()
+        if os.path.isfile(self.file_hashes_file):
+            try:
+                with open(self.file_hashes_file, 'r') as f:
+                    self.file_hashes = json.load(f)
+            except ValueError:
+                self.file_hashes = dict()
+        self.file_hashes_dirty = False
+
+    # Get the hash of a file, using the memo if the file has not changed.
+    def get_file_hash(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        memo = self.file_hashes.get(file_path)
+        if memo is not None and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+        file_hash = hash_file(file_path)
+        self.file_hashes[file_path] = [stat.st_size, stat.st_mtime_ns, file_hash]
+        self.file_hashes_dirty = True
+        return file_hash
+
+    def save_file_hashes(self):
+        if not self.file_hashes_dirty:
+            return
+        write_json_atomic(self.file_hashes_file, self.file_hashes)
+        self.file_hashes_dirty = False
+
+    # Compute the key of a VPR run from its full command (executable first)
+    # and any other files which affect the run (such as the config file).
+    # Every argument which names an existing file is replaced by its base name
+    # (VPR names its outputs after the circuit file) and the hash of its
+    # contents, so the key does not depend on where the inputs are stored.
+    def compute_key(self, command, extra_files=()):
+        h = hashlib.sha256()
+        skip_value = False
+        for arg in command:
+            if skip_value:
+                skip_value = False
+                continue
+            if arg in UNKEYED_OPTIONS:
+                skip_value = True
+                continue
+            if os.path.isfile(arg):
+                h.update(b"file:" + os.path.basename(arg).encode() + b":" + self.get_file_hash(arg).encode())
+            else:
+                h.update(b"arg:" + arg.encode())
+            h.update(b"\0")
+        for extra_file in extra_files:
+            h.update(b"extra:" + self.get_file_hash(extra_file).encode())
+            h.update(b"\0")
+        self.save_file_hashes()
+        return h.hexdigest()
+
+    # Look up a run in the cache. If it is found, its logs are copied into the
+    # working directory and the stored run data dictionary is returned.
+    # Otherwise, returns None.
+    def lookup(self, key, working_dir):
+        entry_dir = self.entries_dir + "/" + key
+        run_data_file = entry_dir + "/run_data.json"
+        try:
+            with open(run_data_file, 'r') as f:
+                run_data_dict = json.load(f)
+            for log_file in CACHED_LOG_FILES:
+                shutil.copyfile(entry_dir + "/" + log_file, working_dir + "/" + log_file)
+        except (OSError, ValueError):
+            return None
+        # Mark the entry as recently used, for eviction.
+        os.utime(run_data_file)
+        return run_data_dict
+
+    # Store the result of a run (its run data dictionary and the logs in the
+    # working directory) in the cache.
+    def store(self, key, run_data_dict, working_dir):
+        entry_dir = self.entries_dir + "/" + key
+        if os.path.isdir(entry_dir):
+            return
+        # Build the entry in a temporary directory and rename it into place,
+        # so concurrent runs never see a half-written entry.
+        temp_dir = tempfile.mkdtemp(dir=self.entries_dir, prefix=".tmp_")
+        for log_file in CACHED_LOG_FILES:
+            shutil.copyfile(working_dir + "/" + log_file, temp_dir + "/" + log_file)
+        write_json_atomic(temp_dir + "/run_data.json", run_data_dict)
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            # Another run stored the same entry first.
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Evict entries older than max_age seconds (since last use), and then the
+    # least recently used entries until the cache is at most max_size bytes.
+    # Returns the number of entries evicted.
+    def evict(self, max_size, max_age):
+        now = time.time()
+        entries = []
+        for key in os.listdir(self.entries_dir):
+            entry_dir = self.entries_dir + "/" + key
+            if key.startswith(".tmp_"):
+                # Left behind by a run which crashed while storing.
+                if now - os.path.getmtime(entry_dir) > 3600:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            try:
+                last_used = os.path.getmtime(entry_dir + "/run_data.json")
+                size = sum(os.path.getsize(entry_dir + "/" + f) for f in os.listdir(entry_dir))
+            except OSError:
+                last_used = 0
+                size = 0
+            entries.append((last_used, size, entry_dir))
+
+        num_evicted = 0
+        total_size = sum(size for _, size, _ in entries)
+        for last_used, size, entry_dir in sorted(entries):
+            if now - last_used <= max_age and total_size <= max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+            num_evicted += 1
+
+        # Forget the hashes of files which no longer exist.
+        for file_path in list(self.file_hashes.keys()):
+            if not os.path.isfile(file_path):
+                del self.file_hashes[file_path]
+                self.file_hashes_dirty = True
+        self.save_file_hashes()
+
+        return num_evicted
@@ -0,0 +1,410 @@
+#!/usr/bin/python3
+
+# Persistent store of routing results, and comparison of runs.
+#
+# Every run of run_test.py (and run_sweep.py) appends the parsed results of its
+# circuits to an SQLite database, together with the settings of the run (T, Q,
+# flags) and the VPR revision it was run with. Runs can then be compared
+# against each other without re-parsing any logs:
+#
+#   ./results_store.py list -suite koios_large
+#   ./results_store.py compare koios_large/run017 koios_large/run042
+#   ./results_store.py import koios_large/run003 koios_large/run004
+#
+# A run is named by <suite>/<run name>, optionally followed by /<config> when
+# one run directory holds several configurations (such as an astar_fac sweep).
+#
+# The perf counters of runs with -perf are kept in their own table
+# (perf_counters), with one row per circuit and event.
+
+import os
+import re
+import sys
+import math
+import json
+import time
+import sqlite3
+import argparse
+import pathlib
+
+# The columns stored for each circuit of a run, with their SQLite types. The
+# names match the fields of run_test.RunData.
+RESULT_COLUMNS = [
+    ("runtime", "REAL"),
+    ("sssp_runtime", "REAL"),
+    ("cpd", "REAL"),
+    ("wl", "INTEGER"),
+    ("min_chan_width", "INTEGER"),
+    ("max_rss", "REAL"),
+    ("heap_pushes", "INTEGER"),
+    ("heap_pops", "INTEGER"),
+    ("vtr_magic_cookie", "INTEGER"),
+    ("total_magic_cookie", "TEXT"),
+    ("peak_rss", "REAL"),
+    ("cpu_time", "REAL"),
+    ("avg_parallelism", "REAL"),
+    ("voluntary_ctxt_switches", "INTEGER"),
+    ("nonvoluntary_ctxt_switches", "INTEGER"),
+    ("timed_out", "INTEGER"),
+    ("return_code", "INTEGER"),
+    ("cached", "INTEGER"),
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    suite TEXT NOT NULL,
+    run_name TEXT NOT NULL,
+    config TEXT NOT NULL,
+    T INTEGER,
+    Q INTEGER,
+    direct_draining INTEGER,
+    extra_vpr_args TEXT,
+    vpr_revision TEXT,
+    vpr_git_hash TEXT,
+    recorded_at REAL,
+    UNIQUE (suite, run_name, config)
+);
+CREATE INDEX IF NOT EXISTS runs_config ON runs (config);
+CREATE INDEX IF NOT EXISTS runs_run_name ON runs (run_name);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    circuit TEXT NOT NULL,
+    {", ".join(f"{name} {column_type}" for name, column_type in RESULT_COLUMNS)},
+    PRIMARY KEY (run_id, circuit)
+);
+CREATE INDEX IF NOT EXISTS results_circuit ON results (circuit);
+CREATE TABLE IF NOT EXISTS perf_counters (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    circuit TEXT NOT NULL,
+    event TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, circuit, event)
+);
+"""
+
+# Helper method to get the default location of the results database.
+def get_default_db_file():
+    return str(pathlib.Path(__file__).parent.resolve()) + "/results.db"
+
+# Helper method to get the git hash from a VTR revision string, such as
+# v8.0.0-11031-g0ebf8e6f2 (or a bare hash). Returns None if there is none.
+def get_git_hash(vpr_revision):
+    if vpr_revision is None:
+        return None
+    match = re.search(r"-g([0-9a-f]{7,40})\b", vpr_revision)
+    if match:
+        return match.group(1)
+    if re.fullmatch(r"[0-9a-f]{7,40}", vpr_revision):
+        return vpr_revision
+    return None
+
+# Helper method to get the name of the configuration of a run of run_test.py
+# from its run_info.json (the matrix label if it has one).
+def get_config_name(run_info):
+    if run_info.get("label", "") != "":
+        return run_info["label"]
+    config = [f"T={run_info.get('T')}", f"Q={run_info.get('Q')}"]
+    if run_info.get("direct_draining"):
+        config.append("direct_draining")
+    if run_info.get("extra_vpr_args", "") != "":
+        config.append(run_info["extra_vpr_args"])
+    return " ".join(config)
+
+# Helper method to compute the geomean of a list of positive values.
+def geomean(values):
+    if len(values) == 0:
+        return None
+    return math.exp(sum(math.log(value) for value in values) / len(values))
+
+class ResultsStore:
+    def __init__(self, db_file=None):
+        if db_file is None:
+            db_file = get_default_db_file()
+        # Several runs may write to the database at the same time, so wait for
+        # the lock instead of failing.
+        self.connection = sqlite3.connect(db_file, timeout=60.0)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        # Add any result columns which are newer than the database.
+        existing_columns = [row[1] for row in self.connection.execute("PRAGMA table_info(results)")]
+        for name, column_type in RESULT_COLUMNS:
+            if name not in existing_columns:
+                self.connection.execute(f"ALTER TABLE results ADD COLUMN {name} {column_type}")
+
+    def close(self):
+        self.connection.close()
+
+    # Add (or replace) a run in the store. run_info holds the settings of the
+    # run (as written to run_info.json) and circuit_run_data maps each circuit
+    # to its run data dictionary. Returns the id of the run.
+    def add_run(self, suite, run_name, config, run_info, circuit_run_data):
+        vpr_revision = None
+        for run_data_dict in circuit_run_data.values():
+            if run_data_dict.get("vpr_revision") is not None:
+                vpr_revision = run_data_dict["vpr_revision"]
+                break
+        with self.connection:
+            # Adding a run again (such as a resumed run) replaces it. Deleting
+            # the run also deletes its results (on delete cascade).
+            self.connection.execute("DELETE FROM runs WHERE suite = ? AND run_name = ? AND config = ?",
+                                    (suite, run_name, config))
+            cursor = self.connection.execute(
+                "INSERT INTO runs (suite, run_name, config, T, Q, direct_draining, extra_vpr_args,"
+                " vpr_revision, vpr_git_hash, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (suite, run_name, config, run_info.get("T"), run_info.get("Q"),
+                 run_info.get("direct_draining"), run_info.get("extra_vpr_args"),
+                 vpr_revision, get_git_hash(vpr_revision), time.time()))
+            run_id = cursor.lastrowid
+            rows = []
+            for circuit, run_data_dict in circuit_run_data.items():
+                row = [run_id, circuit]
+                for name, _ in RESULT_COLUMNS:
+                    value = run_data_dict.get(name)
+                    # The magic cookie may not fit in 64 bits.
+                    if name == "total_magic_cookie" and value is not None:
+                        value = str(value)
+                    row.append(value)
+                rows.append(row)
+            columns = ", ".join(["run_id", "circuit"] + [name for name, _ in RESULT_COLUMNS])
+            placeholders = ", ".join(["?"] * (len(RESULT_COLUMNS) + 2))
+            self.connection.executemany(f"INSERT INTO results ({columns}) VALUES ({placeholders})", rows)
+            perf_rows = []
+            for circuit, run_data_dict in circuit_run_data.items():
+                for event, value in (run_data_dict.get("perf_counters") or dict()).items():
+                    perf_rows.append((run_id, circuit, event, value))
+            self.connection.executemany("INSERT INTO perf_counters (run_id, circuit, event, value) VALUES (?, ?, ?, ?)",
+                                        perf_rows)
+        return run_id
+
+    # Find the id of a run from its name (<suite>/<run name>[/<config>]).
+    # Raises a ValueError if the name does not match exactly one run.
+    def find_run(self, name):
+        parts = name.split("/", 2)
+        if len(parts) < 2:
+            raise ValueError(f"Invalid run name {name} (expected <suite>/<run name>[/<config>])")
+        query = "SELECT run_id, config FROM runs WHERE suite = ? AND run_name = ?"
+        params = parts[:2]
+        if len(parts) == 3:
+            query += " AND config = ?"
+            params.append(parts[2])
+        matches = self.connection.execute(query, params).fetchall()
+        if len(matches) == 0:
+            raise ValueError(f"No run named {name} in the store")
+        if len(matches) > 1:
+            configs = ", ".join(config for _, config in matches)
+            raise ValueError(f"Run {name} has several configs, pick one of: {configs}")
+        return matches[0][0]
+
+    # Get the runs in the store as (suite, run name, config, VPR git hash,
+    # number of circuits) tuples.
+    def list_runs(self, suite=None, config=None):
+        query = ("SELECT suite, run_name, config, vpr_git_hash, COUNT(results.circuit) FROM runs"
+                 " LEFT JOIN results USING (run_id)")
+        conditions = []
+        params = []
+        if suite is not None:
+            conditions.append("suite = ?")
+            params.append(suite)
+        if config is not None:
+            conditions.append("config = ?")
+            params.append(config)
+        if len(conditions) != 0:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " GROUP BY run_id ORDER BY suite, run_name, config"
+        return self.connection.execute(query, params).fetchall()
+
+    # Get the settings of the runs in the store, as dictionaries of the columns
+    # of the runs table, ordered by suite, run name and config.
+    def get_runs(self, suite=None):
+        query = "SELECT run_id, suite, run_name, config, T, Q, direct_draining, extra_vpr_args FROM runs"
+        params = []
+        if suite is not None:
+            query += " WHERE suite = ?"
+            params.append(suite)
+        query += " ORDER BY suite, run_name, config"
+        cursor = self.connection.execute(query, params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    # Get the results of a run, as a dictionary mapping each circuit to its row
+    # (a dictionary of the result columns).
+    def get_run_results(self, run_id):
+        names = [name for name, _ in RESULT_COLUMNS]
+        rows = self.connection.execute(f"SELECT circuit, {', '.join(names)} FROM results WHERE run_id = ?"
+                                       " ORDER BY circuit", (run_id,)).fetchall()
+        return {row[0]: dict(zip(names, row[1:])) for row in rows}
+
+    # Compare the circuits two runs have in common. Returns a list of
+    # (circuit, base row, new row) tuples, where each row maps the result
+    # columns to their values.
+    def compare_runs(self, base_run_id, new_run_id):
+        names = [name for name, _ in RESULT_COLUMNS]
+        select = ", ".join([f"base.{name}" for name in names] + [f"new.{name}" for name in names])
+        rows = self.connection.execute(
+            f"SELECT base.circuit, {select} FROM results AS base JOIN results AS new"
+            " ON base.circuit = new.circuit WHERE base.run_id = ? AND new.run_id = ?"
+            " ORDER BY base.circuit", (base_run_id, new_run_id)).fetchall()
+        comparison = []
+        for row in rows:
+            base = dict(zip(names, row[1:1 + len(names)]))
+            new = dict(zip(names, row[1 + len(names):]))
+            comparison.append((row[0], base, new))
+        return comparison
+
+# Helper method to check if a circuit routed in a run (row of the results).
+def is_routed(row):
+    return (not row["timed_out"]) and row["return_code"] in (0, None) and row["runtime"] is not None
+
+# Helper method to get the ratio of two values, or None if it is undefined.
+def get_ratio(numerator, denominator):
+    if numerator is None or denominator is None or numerator <= 0 or denominator <= 0:
+        return None
+    return numerator / denominator
+
+# Helper method to format a value which may be missing.
+def format_value(value, format_spec=".3f"):
+    if value is None:
+        return "-"
+    return format(value, format_spec)
+
+# Print the per-circuit comparison of two runs: the speedup of the new run over
+# the base run (base time / new time), and the change in QoR (new / base - 1).
+def print_comparison(base_name, new_name, comparison, file=None):
+    print(f"Base: {base_name}\tNew: {new_name}", file=file)
+    print("Circuit:\tSpeedup\tSSSP-Speedup\tHeap-Pops-Ratio\tCPD-Delta(%)\tWL-Delta(%)\tMax-RSS-Ratio\tSame-Cookie", file=file)
+    columns = {"speedup": [], "sssp_speedup": [], "heap_pops": [], "cpd": [], "wl": [], "max_rss": []}
+    for circuit, base, new in comparison:
+        if not is_routed(base) or not is_routed(new):
+            print(f"{circuit}:\t-\t-\t-\t-\t-\t-\t-", file=file)
+            continue
+        values = {
+            "speedup": get_ratio(base["runtime"], new["runtime"]),
+            "sssp_speedup": get_ratio(base["sssp_runtime"], new["sssp_runtime"]),
+            "heap_pops": get_ratio(new["heap_pops"], base["heap_pops"]),
+            "cpd": get_ratio(new["cpd"], base["cpd"]),
+            "wl": get_ratio(new["wl"], base["wl"]),
+            "max_rss": get_ratio(new["max_rss"], base["max_rss"]),
+        }
+        for key, value in values.items():
+            if value is not None:
+                columns[key].append(value)
+        same_cookie = "-"
+        if base["total_magic_cookie"] is not None and new["total_magic_cookie"] is not None:
+            same_cookie = "yes" if base["total_magic_cookie"] == new["total_magic_cookie"] else "no"
+        cpd_delta = None if values["cpd"] is None else 100.0 * (values["cpd"] - 1.0)
+        wl_delta = None if values["wl"] is None else 100.0 * (values["wl"] - 1.0)
+        print(f"{circuit}:\t{format_value(values['speedup'])}\t{format_value(values['sssp_speedup'])}\t"
+              f"{format_value(values['heap_pops'])}\t{format_value(cpd_delta, '+.2f')}\t"
+              f"{format_value(wl_delta, '+.2f')}\t{format_value(values['max_rss'])}\t{same_cookie}", file=file)
+    geomeans = {key: geomean(values) for key, values in columns.items()}
+    cpd_delta = None if geomeans["cpd"] is None else 100.0 * (geomeans["cpd"] - 1.0)
+    wl_delta = None if geomeans["wl"] is None else 100.0 * (geomeans["wl"] - 1.0)
+    print(f"Geomean ({len(columns['speedup'])} circuits):\t{format_value(geomeans['speedup'])}\t"
+          f"{format_value(geomeans['sssp_speedup'])}\t{format_value(geomeans['heap_pops'])}\t"
+          f"{format_value(cpd_delta, '+.2f')}\t{format_value(wl_delta, '+.2f')}\t"
+          f"{format_value(geomeans['max_rss'])}", file=file)
+    return geomeans
+
+# Helper method to read the run data of every circuit of a run directory. The
+# manifest is used if the run has one; otherwise the logs are parsed.
+def read_run_dir(run_dir):
+    import run_manifest
+    import run_test
+    manifest = run_manifest.RunManifest.load(run_dir)
+    circuit_run_data = dict()
+    for arch in os.listdir(run_dir):
+        arch_dir = run_dir + "/" + arch
+        if not os.path.isdir(arch_dir):
+            continue
+        for circuit in sorted(os.listdir(arch_dir)):
+            run_data_dict = None
+            if manifest is not None and circuit in manifest.circuits:
+                run_data_dict = manifest.get_run_data_dict(circuit)
+            if run_data_dict is None:
+                vpr_out_file = arch_dir + "/" + circuit + "/common/vpr.out"
+                if not os.path.isfile(vpr_out_file):
+                    continue
+                run_data_dict = run_test.parse_vpr_out(circuit, vpr_out_file).to_dict()
+            circuit_run_data[circuit] = run_data_dict
+    return circuit_run_data
+
+# Add an existing run directory of run_test.py (testing/<suite>/runNNN) to the
+# store. Returns the id of the run.
+def import_run_dir(store, run_dir):
+    run_dir = os.path.abspath(run_dir)
+    run_name = os.path.basename(run_dir)
+    run_info = {"test_name": os.path.basename(os.path.dirname(run_dir))}
+    run_info_file = run_dir + "/run_info.json"
+    if os.path.isfile(run_info_file):
+        with open(run_info_file, 'r') as f:
+            run_info = json.load(f)
+    return store.add_run(run_info["test_name"], run_name, get_config_name(run_info), run_info,
+                         read_run_dir(run_dir))
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Stores routing results and compares runs."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    parser.add_argument(
+        "-db",
+        default=get_default_db_file(),
+        type=str,
+        metavar="DB_FILE",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List the runs in the store.")
+    list_parser.add_argument("-suite", default=None, type=str)
+    list_parser.add_argument("-config", default=None, type=str)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare runs against a base run.")
+    compare_parser.add_argument("base_run")
+    compare_parser.add_argument("new_runs", nargs="+")
+
+    import_parser = subparsers.add_parser("import", help="Add existing run directories to the store.")
+    import_parser.add_argument("run_dirs", nargs="+")
+
+    return parser
+
+def results_store_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    store = ResultsStore(args.db)
+
+    if args.command == "list":
+        print("Run:\tConfig\tVPR-Hash\tCircuits")
+        for suite, run_name, config, vpr_git_hash, num_circuits in store.list_runs(args.suite, args.config):
+            print(f"{suite}/{run_name}:\t{config}\t{vpr_git_hash or '-'}\t{num_circuits}")
+    elif args.command == "import":
+        for run_dir in args.run_dirs:
+            import_run_dir(store, run_dir)
+            print(f"Imported {run_dir}")
+    elif args.command == "compare":
+        try:
+            base_run_id = store.find_run(args.base_run)
+            new_run_ids = [store.find_run(new_run) for new_run in args.new_runs]
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return
+        summaries = []
+        for new_run, new_run_id in zip(args.new_runs, new_run_ids):
+            geomeans = print_comparison(args.base_run, new_run, store.compare_runs(base_run_id, new_run_id))
+            summaries.append((new_run, geomeans))
+            print("")
+        if len(summaries) > 1:
+            print(f"Geomean speedup over {args.base_run}:")
+            for new_run, geomeans in summaries:
+                print(f"{new_run}:\t{format_value(geomeans['speedup'])}")
+
+    store.close()
+
+if __name__ == "__main__":
+    results_store_main(sys.argv[1:])
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+# Checkpoint manifest of a run of a test suite.
+#
+# The manifest (manifest.json in the run directory) records the status and
+# results of every circuit of the run. It is rewritten atomically as each
+# circuit finishes, so if the run is interrupted, it can be resumed later by
+# only routing the circuits which did not finish.
+
+import os
+import json
+
+import result_cache
+
+# The status of a circuit in the manifest.
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+class RunManifest:
+    def __init__(self, run_dir):
+        self.manifest_file = run_dir + "/" + MANIFEST_FILE_NAME
+        # Circuit name -> {"status", "attempts", "timeout", "run_data"}
+        self.circuits = dict()
+
+    # Load the manifest of an existing run. Returns None if the run does not
+    # have a manifest.
+    @staticmethod
+    def load(run_dir):
+        manifest = RunManifest(run_dir)
+        if not os.path.isfile(manifest.manifest_file):
+            return None
+        with open(manifest.manifest_file, 'r') as f:
+            manifest.circuits = json.load(f)["circuits"]
+        return manifest
+
+    def save(self):
+        result_cache.write_json_atomic(self.manifest_file, {"circuits": self.circuits})
+
+    # Add circuits which have not been run yet.
+    def add_circuits(self, circuits):
+        for circuit in circuits:
+            if circuit not in self.circuits:
+                self.circuits[circuit] = {"status": STATUS_PENDING, "attempts": 0, "timeout": None, "run_data": None}
+
+    # Record the result of routing a circuit and save the manifest.
+    def record(self, circuit, status, timeout, run_data_dict):
+        entry = self.circuits[circuit]
+        entry["status"] = status
+        entry["attempts"] += 1
+        entry["timeout"] = timeout
+        entry["run_data"] = run_data_dict
+        self.save()
+
+    def get_status(self, circuit):
+        return self.circuits[circuit]["status"]
+
+    def get_run_data_dict(self, circuit):
+        return self.circuits[circuit]["run_data"]
+
+    # Get the circuits which still need to be routed. If only_timeouts is set,
+    # only the circuits which timed out are returned (for example, to retry
+    # them with a larger timeout).
+    def get_unfinished_circuits(self, only_timeouts=False):
+        unfinished = []
+        for circuit, entry in sorted(self.circuits.items()):
+            if only_timeouts:
+                if entry["status"] == STATUS_TIMEOUT:
+                    unfinished.append(circuit)
+            elif entry["status"] != STATUS_DONE:
+                unfinished.append(circuit)
+        return unfinished
@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+
+# Runs a matrix of test configurations, described in a TOML or YAML spec file,
+# through one global job queue.
+#
+# Instead of calling run_test.py once per configuration (each with its own pool
+# and its own barrier at the end), every circuit of every configuration is
+# handed to one scheduler, so cores never sit idle between configurations.
+# Each configuration still gets its own runNNN directory and summary. The
+# options which decide how the queue is run (SHARED_OPTIONS, such as -cores and
+# -repeat) must be the same for every configuration.
+#
+# Example spec (TOML):
+#
+#   # Options shared by every run. These are the options of run_test.py,
+#   # without the leading dash.
+#   [settings]
+#   tests-reference-dir-base = "/home/singera8/fine-grained-parallel-router/testing/tests/"
+#   cores = 12
+#   timeout = 43200
+#
+#   # Every combination of the values of these axes is run.
+#   [matrix]
+#   suite = ["koios_large"]
+#   T = [1, 2, 3, 6, 12]
+#   queues_per_thread = 4
+#
+#   # Each configuration is run at every point of the matrix. Any value may
+#   # also be a list, which adds another axis for that configuration.
+#   [[configs]]
+#   name = "directed"
+#   direct-draining = true
+#   astar_fac = 1.2
+#   post_target_prune_fac = 1.2
+#   post_target_prune_offset = 0.0
+#
+#   [[configs]]
+#   name = "astar"
+#   astar_fac = 0.9
+#   post_target_prune_fac = 1.0
+#   post_target_prune_offset = 7.2e-10
+
+import sys
+import shlex
+import argparse
+import itertools
+import pathlib
+
+import repeated_trials
+import run_manifest
+import run_test
+import scheduler
+
+# Keys of the spec which are passed to VPR as --<key> <value>.
+VPR_ARG_KEYS = ["astar_fac", "astar_offset", "post_target_prune_fac", "post_target_prune_offset"]
+
+# Keys of the spec which are not run_test.py options.
+SPECIAL_KEYS = ["name", "suite", "queues_per_thread"] + VPR_ARG_KEYS
+
+# Options of run_test.py which decide how the one queue of every configuration
+# is run, so they must be the same for every configuration. The other options
+# (such as -timeout) are kept in the jobs of each configuration.
+SHARED_OPTIONS = ["j", "cores", "coordinator", "local_workers", "heartbeat_timeout", "repeat", "min_repeat",
+                  "ci_target", "confidence", "cache_max_size", "cache_max_age"]
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    description = "Runs a matrix of test configurations through one job queue."
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        epilog="",
+    )
+
+    parser.add_argument("spec_file")
+
+    # Only print the configurations which would be run.
+    parser.add_argument(
+        "-dry-run",
+        action='store_true'
+    )
+
+    return parser
+
+# Helper method to load a spec file, which may be TOML or YAML.
+def load_spec(spec_file):
+    if spec_file.endswith(".toml"):
+        import tomllib
+        with open(spec_file, 'rb') as f:
+            return tomllib.load(f)
+    try:
+        import yaml
+    except ImportError:
+        print("ERROR: PyYAML is required to read YAML spec files (or use a .toml spec).")
+        sys.exit(1)
+    with open(spec_file, 'r') as f:
+        return yaml.safe_load(f)
+
+# Helper method to expand a dictionary whose values may be lists into every
+# combination of its values.
+def expand_dict(d):
+    keys = list(d.keys())
+    values = [v if isinstance(v, list) else [v] for v in d.values()]
+    for combination in itertools.product(*values):
+        yield dict(zip(keys, combination))
+
+# Expand a spec into the list of configurations to run. Each configuration is
+# a flat dictionary of settings.
+def expand_spec(spec):
+    settings = spec.get("settings", dict())
+    matrix = spec.get("matrix", dict())
+    configs = spec.get("configs", [dict()])
+    expanded = []
+    for point in expand_dict(matrix):
+        for config in configs:
+            for config_point in expand_dict(config):
+                configuration = dict(settings)
+                configuration.update(point)
+                configuration.update(config_point)
+                expanded.append(configuration)
+    return expanded
+
+# Helper method to get a short, readable label for a configuration.
+def get_config_label(configuration):
+    label = [str(configuration.get("name", "default"))]
+    for key in ["T", "Q", "queues_per_thread"] + VPR_ARG_KEYS:
+        if key in configuration:
+            label.append(f"{key}={configuration[key]}")
+    return " ".join(label)
+
+# Convert a configuration into the command line arguments of run_test.py.
+def get_run_test_arg_list(configuration):
+    arg_list = [str(configuration["suite"])]
+    extra_vpr_args = []
+    for key, value in configuration.items():
+        if key in SPECIAL_KEYS:
+            continue
+        if key == "extra-vpr-args":
+            extra_vpr_args.append(str(value))
+        elif isinstance(value, bool):
+            if value:
+                arg_list.append("-" + key)
+        else:
+            arg_list += ["-" + key, str(value)]
+    if "queues_per_thread" in configuration and "Q" not in configuration:
+        arg_list += ["-Q", str(int(configuration.get("T", 1)) * int(configuration["queues_per_thread"]))]
+    for key in VPR_ARG_KEYS:
+        if key in configuration:
+            extra_vpr_args.append(f"--{key} {configuration[key]}")
+    arg_list += ["-extra-vpr-args", " ".join(extra_vpr_args)]
+    return arg_list
+
+# Helper method to get the shared options which differ between the
+# configurations, with their values.
+def get_conflicting_options(configurations, all_run_args):
+    conflicts = []
+    for option in SHARED_OPTIONS:
+        values = [getattr(run_args, option) for run_args in all_run_args]
+        if any(value != values[0] for value in values):
+            conflicts.append((option, [f"{value} in {get_config_label(configuration)}"
+                                       for configuration, value in zip(configurations, values)]))
+    return conflicts
+
+def run_matrix_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
+
+    configurations = expand_spec(load_spec(args.spec_file))
+    if len(configurations) == 0:
+        print("ERROR: The spec does not contain any configurations.")
+        return
+
+    if args.dry_run:
+        for configuration in configurations:
+            print(f"{configuration['suite']}: {get_config_label(configuration)}")
+            print("\t" + shlex.join(["./run_test.py"] + get_run_test_arg_list(configuration)))
+        return
+
+    # Set up the run directory of every configuration and gather all of their
+    # jobs into one queue.
+    # Each configuration has its own manifest, so any of them can be resumed
+    # with run_test.py -resume.
+    all_run_args = [run_test.command_parser().parse_args(get_run_test_arg_list(configuration))
+                    for configuration in configurations]
+    conflicts = get_conflicting_options(configurations, all_run_args)
+    if len(conflicts) != 0:
+        for option, values in conflicts:
+            print(f"ERROR: -{option.replace('_', '-')} must be the same for every configuration ({', '.join(values)})")
+        return
+    # Every configuration is served with the same key.
+    if not run_test.check_coordinator_args(all_run_args[0]):
+        return
+    for run_args in all_run_args:
+        run_args.authkey = all_run_args[0].authkey
+        if not run_test.check_core_budget(run_args):
+            return
+
+    runs = []
+    jobs = []
+    manifest_recorders = dict()
+    for configuration, run_args in zip(configurations, all_run_args):
+        label = get_config_label(configuration)
+        test_run = run_test.setup_test_run(run_args.tests_reference_dir_base, run_args.test_name)
+        if test_run is None:
+            print(f"Invalid test: {run_args.test_name}")
+            return
+        print(f"{test_run.arch_dir}: {label}")
+        run_test.write_run_info(test_run, run_args, get_run_test_arg_list(configuration), label)
+        if run_args.repeat > 1:
+            # Repeated trials build their own jobs for each round.
+            runs.append((test_run, run_args, label, 0, 0))
+            continue
+        manifest = run_manifest.RunManifest(test_run.run_dir)
+        manifest.add_circuits(test_run.circuits)
+        manifest.save()
+        run_jobs = run_test.build_circuit_jobs(test_run, run_args, f"{run_args.test_name}/{label}/")
+        runs.append((test_run, run_args, label, len(jobs), len(jobs) + len(run_jobs)))
+        for job in run_jobs:
+            manifest_recorders[job.name] = run_test.get_manifest_recorder(manifest, run_args)
+        jobs += run_jobs
+
+    # The options shared by every run decide how the queue is scheduled.
+    shared_args = runs[0][1]
+    if shared_args.repeat > 1:
+        repeated_trials.run_repeated_trials([(test_run, run_args, label) for test_run, run_args, label, _, _ in runs],
+                                            shared_args)
+        return
+    script_dir = str(pathlib.Path(__file__).parent.resolve())
+    history = scheduler.RuntimeHistory(script_dir + "/matrix_runtime_history.json")
+    def record(job, run_data):
+        manifest_recorders[job.name](job, run_data)
+    results = run_test.run_circuit_jobs(jobs, shared_args, history, record)
+
+    # The configurations may use different caches.
+    cache_dirs = set()
+    for _, run_args, _, _, _ in runs:
+        if run_test.get_cache_dir(run_args) not in cache_dirs:
+            cache_dirs.add(run_test.get_cache_dir(run_args))
+            run_test.evict_result_cache(run_args)
+
+    # Write out the results of each configuration.
+    for test_run, run_args, label, first_job, last_job in runs:
+        circuit_run_data = run_test.collect_run_data(results[first_job:last_job])
+        print("")
+        print(f"=============== {run_args.test_name}: {label} ({test_run.run_dir}) ===============")
+        run_test.print_run_summary(test_run.circuits, circuit_run_data)
+        with open(test_run.run_dir + "/summary.txt", "w") as f:
+            run_test.print_run_summary(test_run.circuits, circuit_run_data, file=f)
+        run_test.store_run_results(test_run, run_args, circuit_run_data)
+
+if __name__ == "__main__":
+    run_matrix_main(sys.argv[1:])
@@ -1,15 +1,43 @@
 #!/usr/bin/python3
 
-import copy
 import os
 import re
 import sys
 import argparse
-from multiprocessing import Pool
-from subprocess import Popen, PIPE, TimeoutExpired
+from subprocess import Popen, PIPE
 import pathlib
 import shutil
 import math
+import json
+import codecs
+import hashlib
+import signal
+import threading
+import time
+
+import log_scanner
+import perf_stat
+import proc_sampler
+import repeated_trials
+import result_cache
+import results_store
+import run_manifest
+import scheduler
+
+# Size of the blocks read from VPR's stdout while it is running.
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Number of hex digits kept of the digests used to check determinism.
+DIGEST_LENGTH = 16
+
+# Environment variable holding the key the workers of -coordinator
+# authenticate with, if -authkey is not given.
+AUTHKEY_ENV_VAR = "ROUTE_JOBS_AUTHKEY"
+
+# Helper method to chain a value onto a digest (used to check determinism).
+# Unlike hash(), the digest is the same in every process and on every machine.
+def chain_digest(digest, value):
+    return hashlib.sha256(f"{digest}:{value}".encode()).hexdigest()[:DIGEST_LENGTH]
 
 # Helper method to get the architecture file name from a directory.
 def get_arch_file_from_dir(dir_path):
@@ -21,7 +49,8 @@ def get_arch_file_from_dir(dir_path):
     return res[0]
 
 # Helper method to parse the config file for vpr command line arguments.
-def get_vpr_args_from_config(config_file, circuit_name):
+# The special params (such as --1.3W) can be left out with special_params.
+def get_vpr_args_from_config(config_file, circuit_name, special_params=True):
     vpr_args = []
     with open(config_file, 'r') as f:
         for line in f:
@@ -32,11 +61,11 @@ def get_vpr_args_from_config(config_file, circuit_name):
                  # Split the script_params string into individual parameters
                  params_list = script_params.split(" ")
                  vpr_args += params_list
-            if line.startswith("special_params="):
-                special_params = line.split("=", 1)[1].strip()
-                if special_params == "":
+            if line.startswith("special_params=") and special_params:
+                special_params_value = line.split("=", 1)[1].strip()
+                if special_params_value == "":
                     continue;
-                if special_params == "--1.3W":
+                if special_params_value == "--1.3W":
                     # Get the minimum channel width from pre-caculated daya (Master)
                     min_w = get_min_chan_width(circuit_name, os.path.dirname(config_file))
                     # Multiply it by 1.3 to make it low-stress
@@ -149,24 +178,185 @@ def command_parser(prog=None):
         metavar="THREAD_AFFINITY"
     )
 
-    return parser
+    # Total number of cores to use. Instead of running -j circuits at once,
+    # each circuit is given -T cores of its own (pinned with --thread_affinity)
+    # and new circuits are started as soon as enough cores are free.
+    # 0 disables this and uses -j.
+    parser.add_argument(
+        "-cores",
+        default=0,
+        type=int,
+        metavar="NUM_CORES",
+    )
 
-# Run a single circuit through VPR route flow.
-# Uses pre-existing netlist and placement to save time for the whole flow.
-def run_vpr_route(thread_args):
-    # Parse the thread arguments
-    reference_dir = thread_args[0]
-    working_dir = thread_args[1]
-    circuit_name = thread_args[2]
-    arch_name = thread_args[3]
-    vtr_dir = thread_args[4]
-    config_file = thread_args[5]
-    extra_vpr_args = thread_args[6]
-    timeout = thread_args[7]
+    # Resume an interrupted run (for example, run012), only routing the
+    # circuits which have not finished or which failed.
+    parser.add_argument(
+        "-resume",
+        default="",
+        type=str,
+        metavar="RUN_NAME",
+    )
 
-    # Change directory to the working directory
-    os.chdir(working_dir)
+    # When resuming, only route the circuits which timed out (use with a
+    # larger -timeout).
+    parser.add_argument(
+        "-resume-only-timeouts",
+        action='store_true'
+    )
+
+    # Print the router's per-iteration progress while VPR is running.
+    parser.add_argument(
+        "-progress",
+        action='store_true'
+    )
+
+    # Reuse the results of earlier identical runs (same VPR executable, input
+    # files and arguments) instead of running VPR again.
+    parser.add_argument(
+        "-cache",
+        action='store_true'
+    )
+
+    # Directory of the result cache. Defaults to result_cache next to this script.
+    parser.add_argument(
+        "-cache-dir",
+        default="",
+        type=str,
+        metavar="CACHE_DIR",
+    )
+
+    # Maximum size of the result cache in GiB.
+    parser.add_argument(
+        "-cache-max-size",
+        default=20.0,
+        type=float,
+        metavar="CACHE_MAX_SIZE_GB",
+    )
+
+    # Maximum number of days a cache entry is kept since it was last used.
+    parser.add_argument(
+        "-cache-max-age",
+        default=30.0,
+        type=float,
+        metavar="CACHE_MAX_AGE_DAYS",
+    )
+
+    # Sample the memory use, CPU time and context switches of every VPR run
+    # (and of each of its threads) from /proc while it is running.
+    parser.add_argument(
+        "-telemetry",
+        action='store_true'
+    )
+
+    # Interval in seconds between the samples of -telemetry.
+    parser.add_argument(
+        "-telemetry-interval",
+        default=0.5,
+        type=float,
+        metavar="SECONDS",
+    )
+
+    # Run VPR under `perf stat`, counting hardware events (or only software
+    # events where hardware counters are not available).
+    parser.add_argument(
+        "-perf",
+        action='store_true'
+    )
+
+    # Comma-separated list of the events to count with -perf. By default, the
+    # events in perf_stat.DEFAULT_EVENTS are counted.
+    parser.add_argument(
+        "-perf-events",
+        default="",
+        type=str,
+        metavar="EVENTS",
+    )
+
+    # Route every circuit up to this many times (in rounds) and report the
+    # median, spread, and confidence interval of the run times.
+    parser.add_argument(
+        "-repeat",
+        default=1,
+        type=int,
+        metavar="NUM_TRIALS",
+    )
+
+    # Minimum number of trials before stopping early.
+    parser.add_argument(
+        "-min-repeat",
+        default=3,
+        type=int,
+        metavar="NUM_TRIALS",
+    )
+
+    # Stop the trials early once the confidence interval of every geomean run
+    # time is within +/- this fraction of it. 0 implies never stop early.
+    parser.add_argument(
+        "-ci-target",
+        default=0.01,
+        type=float,
+        metavar="FRACTION",
+    )
+
+    # Confidence level of the confidence intervals and significance tests.
+    parser.add_argument(
+        "-confidence",
+        default=0.95,
+        type=float,
+        metavar="LEVEL",
+    )
+
+    # SQLite database the results of every run are added to (see
+    # results_store.py). Pass an empty string to not record the run.
+    parser.add_argument(
+        "-results-db",
+        default=results_store.get_default_db_file(),
+        type=str,
+        metavar="DB_FILE",
+    )
+
+    # Serve the jobs on this address (HOST:PORT) to workers started with
+    # job_server.py, on this or other hosts, instead of routing them here.
+    parser.add_argument(
+        "-coordinator",
+        default="",
+        type=str,
+        metavar="ADDRESS",
+    )
+
+    # Number of workers to start on this machine with -coordinator.
+    parser.add_argument(
+        "-local-workers",
+        default=0,
+        type=int,
+        metavar="NUM_WORKERS",
+    )
+
+    # Seconds without a heartbeat after which the jobs of a worker are given
+    # to another worker.
+    parser.add_argument(
+        "-heartbeat-timeout",
+        default=60.0,
+        type=float,
+        metavar="SECONDS",
+    )
+
+    # Key the workers authenticate with (the same as their -authkey). Required
+    # to serve on an address other than loopback; on loopback, a random key is
+    # made if none is given.
+    parser.add_argument(
+        "-authkey",
+        default=os.environ.get(AUTHKEY_ENV_VAR, ""),
+        type=str,
+    )
+
+    return parser
 
+# Helper method to get the command which routes a circuit with VPR, using its
+# pre-existing netlist and placement (and its sdc, rr graph and router lookahead
+# files, if it has them).
+def get_vpr_route_command(reference_dir, circuit_name, arch_name, vtr_dir, config_args, extra_vpr_args):
     # Get the vpr executable and other required information.
     vpr_exec = vtr_dir + "/vpr/vpr"
     arch = reference_dir + "/../../../arch/" + arch_name
@@ -176,8 +366,6 @@ def run_vpr_route(thread_args):
     place_file = circuit_base + ".place"
     net_file = circuit_base + ".net"
 
-    config_args = get_vpr_args_from_config(config_file, circuit_name)
-
     # Check if an sdc file exists and if so add it to the args
     sdc_args = []
     if os.path.isfile(sdc_file):
@@ -195,42 +383,180 @@ def run_vpr_route(thread_args):
     if os.path.isfile(router_lookahead_file):
         router_lookahead_args = ["--read_router_lookahead", router_lookahead_file]
 
-    # Run the process with the correct arguments
-    process = Popen([vpr_exec,
+    return [vpr_exec,
         arch,
         circuit,
         "--net_file", net_file,
         "--place_file", place_file,
         "--route",
-        "--analysis"] + config_args + sdc_args + rr_graph_args + router_lookahead_args + extra_vpr_args,
+        "--analysis"] + config_args + sdc_args + rr_graph_args + router_lookahead_args + extra_vpr_args
+
+# Run a single circuit through VPR route flow.
+# Uses pre-existing netlist and placement to save time for the whole flow.
+# If cores is given, VPR's threads are pinned to those cores.
+def run_vpr_route(thread_args, cores=None):
+    # Parse the thread arguments
+    reference_dir = thread_args[0]
+    working_dir = thread_args[1]
+    circuit_name = thread_args[2]
+    arch_name = thread_args[3]
+    vtr_dir = thread_args[4]
+    config_file = thread_args[5]
+    extra_vpr_args = thread_args[6]
+    timeout = thread_args[7]
+    print_progress = thread_args[8]
+    cache_dir = thread_args[9]
+    telemetry_interval = thread_args[10]
+    perf_events = thread_args[11]
+
+    if cores is not None:
+        extra_vpr_args = extra_vpr_args + ["--thread_affinity", ",".join(str(core) for core in cores)]
+
+    # Change directory to the working directory
+    os.chdir(working_dir)
+
+    config_args = get_vpr_args_from_config(config_file, circuit_name)
+    vpr_command = get_vpr_route_command(reference_dir, circuit_name, arch_name, vtr_dir, config_args, extra_vpr_args)
+
+    # If this exact run (same VPR, inputs, and arguments) has been done before,
+    # reuse its results.
+    cache = None
+    if cache_dir != "":
+        cache = result_cache.ResultCache(cache_dir)
+        cache_key = cache.compute_key(vpr_command, [config_file])
+        run_data_dict = cache.lookup(cache_key, working_dir)
+        if run_data_dict is not None:
+            print(f"{circuit_name} is done! (cached)")
+            return RunData.from_cache(run_data_dict)
+
+    # Run the process with the correct arguments. stderr is sent straight to
+    # its file; stdout is streamed so it can be parsed while VPR is running.
+    # Count the hardware events of the run with perf stat.
+    perf_command = []
+    if len(perf_events) != 0:
+        perf_command = perf_stat.get_perf_command(perf_stat.find_perf(), perf_events,
+                                                  working_dir + "/" + perf_stat.PERF_STAT_FILE_NAME)
+
+    vpr_err_file = open("vpr_err.out", "w")
+    start_time = time.time()
+    # VPR (and perf, if any) is started in its own process group, so it can be
+    # killed as a whole.
+    process = Popen(perf_command + vpr_command,
         stdout=PIPE,
-        stderr=PIPE)
+        stderr=vpr_err_file,
+        start_new_session=True)
 
-    # Store the output of the command
+    # Sample the resource use of VPR while it runs.
+    sampler = None
+    if telemetry_interval != 0.0:
+        sampler = proc_sampler.ProcSampler(process.pid, working_dir, telemetry_interval,
+                                           follow_child=(len(perf_command) != 0))
+        sampler.start()
+
+    # Kill the process if it runs for longer than the timeout.
     if timeout == 0.0:
         timeout = None
-    circuit_timed_out = False
-    # https://docs.python.org/3/library/subprocess.html#subprocess.Popen.communicate
+    circuit_timed_out = threading.Event()
+    timeout_timer = None
+    if timeout is not None:
+        def kill_process():
+            circuit_timed_out.set()
+            kill_process_group(process)
+        timeout_timer = threading.Timer(timeout, kill_process)
+        timeout_timer.start()
+
+    parser = RunDataParser(circuit_name)
     try:
-        stdout, stderr = process.communicate(timeout=timeout)
-    except TimeoutExpired:
-        process.kill()
-        stdout, stderr = process.communicate()
-        circuit_timed_out = True
-
-    with open("vpr.out", "w") as f:
-        f.write(stdout.decode())
-        f.close()
-
-    with open("vpr_err.out", "w") as f:
-        f.write(stderr.decode())
-        f.close()
-
-    if not circuit_timed_out:
+        stream_vpr_output(process.stdout, "vpr.out", parser, circuit_name, print_progress)
+    except BaseException:
+        # VPR runs in its own session, so it does not get the interrupt.
+        kill_process_group(process)
+        raise
+    usage = None
+    if sampler is not None:
+        # Reap VPR with wait4 to get the resource usage of this run alone.
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        process.wait()
+    vpr_err_file.close()
+    if timeout_timer is not None:
+        timeout_timer.cancel()
+
+    run_data = parser.get_run_data()
+    run_data.timed_out = circuit_timed_out.is_set()
+    run_data.return_code = process.returncode
+
+    if len(perf_command) != 0:
+        run_data.perf_counters = perf_stat.parse_perf_stat(working_dir + "/" + perf_stat.PERF_STAT_FILE_NAME)
+
+    if sampler is not None:
+        wall_time = time.time() - start_time
+        run_data.peak_rss = sampler.stop()
+        if run_data.peak_rss is None:
+            # ru_maxrss is in KiB.
+            run_data.peak_rss = usage.ru_maxrss / 1024
+        run_data.cpu_time = usage.ru_utime + usage.ru_stime
+        # The parallelism is measured over the window VPR was sampled in, which
+        # leaves out the time to start it (and perf) and to read its output.
+        # Runs too short to be sampled twice fall back to the whole wall time.
+        run_data.avg_parallelism = sampler.get_avg_parallelism()
+        if run_data.avg_parallelism is None:
+            run_data.avg_parallelism = run_data.cpu_time / wall_time
+        run_data.voluntary_ctxt_switches = usage.ru_nvcsw
+        run_data.nonvoluntary_ctxt_switches = usage.ru_nivcsw
+
+    if not circuit_timed_out.is_set():
         print(f"{circuit_name} is done!")
+        # Only cache runs which finished, so timed out runs are retried.
+        if cache is not None and process.returncode == 0:
+            cache.store(cache_key, run_data.to_dict(), working_dir)
     else:
         print(f"{circuit_name} timed out after {timeout} seconds!")
 
+    return run_data
+
+# Helper method to kill a process started in its own session and every process
+# in its group. With -perf, the process is perf and VPR is its child, so killing
+# only the process would leave VPR running (and holding its stdout open).
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+# Copy the output of VPR from the given pipe into the output file in chunks,
+# feeding the parser as each line arrives. Only one chunk of the log is held in
+# memory at a time, no matter how long VPR runs.
+def stream_vpr_output(pipe, out_file_name, parser, circuit_name, print_progress):
+    scanner = log_scanner.LogScanner()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    sssp_time = 0.0
+    with open(out_file_name, "w") as out_file:
+        while True:
+            chunk = pipe.read1(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            text = decoder.decode(chunk)
+            out_file.write(text)
+            for metric, values in scanner.feed(text):
+                parser.add(metric, values)
+                if not print_progress:
+                    continue
+                if metric == "sssp_time":
+                    sssp_time += values[0]
+                elif metric == "route_iter":
+                    iteration, iteration_time, _, heap_pushes = values
+                    print(f"{circuit_name}: iter {iteration}\t{iteration_time} s\theap pushes {heap_pushes}\tSSSP {sssp_time:.3f} s", flush=True)
+                elif metric == "heap_push_pop":
+                    print(f"{circuit_name}: total heap pushes {values[0]}\ttotal heap pops {values[1]}", flush=True)
+        text = decoder.decode(b"", final=True)
+        out_file.write(text)
+        for metric, values in scanner.feed(text):
+            parser.add(metric, values)
+        for metric, values in scanner.flush():
+            parser.add(metric, values)
+
 # Helper method to parse the QoR and Runtimes of the run.
 def run_parse_vtr_task(test_dir, vtr_dir):
     parse_vtr_task_exec = vtr_dir + "/vtr_flow/scripts/python_libs/vtr/parse_vtr_task.py"
@@ -241,6 +567,11 @@ def run_parse_vtr_task(test_dir, vtr_dir):
     process.communicate()
     print("Parse VTR Task Completed")
 
+# Fields of RunData which are measured while VPR runs (with -telemetry or
+# -perf), rather than parsed from its log.
+TELEMETRY_FIELDS = ["peak_rss", "cpu_time", "avg_parallelism", "voluntary_ctxt_switches",
+                    "nonvoluntary_ctxt_switches", "perf_counters"]
+
 class RunData:
     circuit_name: str = None
     cpd: float = None
@@ -249,7 +580,26 @@ class RunData:
     sssp_runtime: float = None
     min_chan_width: int = None
     vtr_magic_cookie: int = None
-    total_magic_cookie: int = None
+    total_magic_cookie: str = None
+    # [attempt, iteration, digest] of every router iteration, where the digest
+    # covers the iteration and every iteration before it.
+    iteration_digests: list = None
+    max_rss: float = None
+    heap_pushes: int = None
+    heap_pops: int = None
+    vpr_revision: str = None
+    # Measured with -telemetry.
+    peak_rss: float = None
+    cpu_time: float = None
+    avg_parallelism: float = None
+    voluntary_ctxt_switches: int = None
+    nonvoluntary_ctxt_switches: int = None
+    # Event -> count, measured with -perf.
+    perf_counters: dict = None
+    timed_out: bool = False
+    return_code: int = None
+    # Whether the results were reused from the result cache.
+    cached: bool = False
 
     def __init__(self, circuit_name):
         self.circuit_name = circuit_name
@@ -257,6 +607,27 @@ class RunData:
     def has_min_chan_width(self):
         return (self.min_chan_width != None)
 
+    def to_dict(self):
+        return dict(vars(self))
+
+    @staticmethod
+    def from_dict(run_data_dict):
+        run_data = RunData(run_data_dict["circuit_name"])
+        for key, value in run_data_dict.items():
+            setattr(run_data, key, value)
+        return run_data
+
+    # Helper method to get the run data of a result cache hit. The telemetry
+    # was measured by the run which stored the entry, not this one, so it is
+    # dropped rather than reported as if it were fresh.
+    @staticmethod
+    def from_cache(run_data_dict):
+        run_data = RunData.from_dict(run_data_dict)
+        for field in TELEMETRY_FIELDS:
+            setattr(run_data, field, None)
+        run_data.cached = True
+        return run_data
+
     def has_complete_data(self, should_have_min_chan_width):
         if self.cpd == None:
             return False
@@ -274,164 +645,362 @@ class RunData:
             return False
         return True
 
-    def print(self, has_min_chan_width):
+    def has_telemetry(self):
+        return (self.avg_parallelism != None)
+
+    def print(self, has_min_chan_width, file=None, has_telemetry=False):
+        # The telemetry columns go at the end of the row.
+        telemetry = ""
+        if has_telemetry:
+            if self.has_telemetry():
+                peak_rss = "-" if self.peak_rss == None else f"{self.peak_rss:.1f}"
+                telemetry = f"\t{self.avg_parallelism:.2f}\t{peak_rss}"
+            elif self.cached:
+                telemetry = "\tcached\tcached"
+            else:
+                telemetry = "\t-\t-"
         if not self.has_complete_data(has_min_chan_width):
             if has_min_chan_width:
-                print(f"{self.circuit_name}:\t-\t-\t-\t-\t-\t-")
+                print(f"{self.circuit_name}:\t-\t-\t-\t-\t-\t-{telemetry}", file=file)
             else:
-                print(f"{self.circuit_name}:\t-\t-\t-\t-\t-")
+                print(f"{self.circuit_name}:\t-\t-\t-\t-\t-{telemetry}", file=file)
             return
         if has_min_chan_width:
-            print(f"{self.circuit_name}:\t{self.cpd}\t{self.runtime}\t{self.sssp_runtime}\t{self.wl}\t{self.vtr_magic_cookie}\t{self.min_chan_width}")
+            print(f"{self.circuit_name}:\t{self.cpd}\t{self.runtime}\t{self.sssp_runtime}\t{self.wl}\t{self.vtr_magic_cookie}\t{self.min_chan_width}{telemetry}", file=file)
         else:
-            print(f"{self.circuit_name}:\t{self.cpd}\t{self.runtime}\t{self.sssp_runtime}\t{self.wl}\t{self.vtr_magic_cookie}")
-
-def run_test_main(arg_list, prog=None):
-    # Load the arguments
-    args = command_parser(prog).parse_args(arg_list)
+            print(f"{self.circuit_name}:\t{self.cpd}\t{self.runtime}\t{self.sssp_runtime}\t{self.wl}\t{self.vtr_magic_cookie}{telemetry}", file=file)
 
-    tests_reference_dir = args.tests_reference_dir_base + "/" + args.test_name
+# Accumulates the metrics scanned from a VPR log into a RunData.
+class RunDataParser:
+    def __init__(self, circuit_name):
+        self.circuit_name = circuit_name
+        self.runtimes = []
+        self.sssp_runtimes = []
+        self.cpds = []
+        self.wls = []
+        self.min_chan_widths = []
+        self.magic_cookies = []
+        self.max_rss = []
+        self.heap_pushes = []
+        self.heap_pops = []
+        self.vpr_revision = None
+        self.iteration_digests = []
+        self.attempt = 0
+        self.last_iteration = None
+
+    def add(self, metric, values):
+        if metric == "routing_time":
+            time_taken, max_rss = values
+            self.runtimes.append(time_taken)
+            self.max_rss.append(max_rss)
+        elif metric == "sssp_time":
+            self.sssp_runtimes.append(values[0])
+        elif metric == "cpd":
+            self.cpds.append(values[0])
+        elif metric == "wl":
+            self.wls.append(values[0])
+        elif metric == "min_chan_width":
+            self.min_chan_widths.append(values[0])
+        elif metric == "magic_cookie":
+            self.magic_cookies.append(values[0])
+        elif metric == "heap_push_pop":
+            num_heap_pushes, num_heap_pops = values
+            self.heap_pushes.append(num_heap_pushes)
+            self.heap_pops.append(num_heap_pops)
+        elif metric == "vpr_revision":
+            self.vpr_revision = values[0]
+        elif metric == "route_iter":
+            iteration, _, row, _ = values
+            # The router restarts from iteration 1 for every channel width it
+            # tries (during a min channel width search).
+            if self.last_iteration is None or iteration <= self.last_iteration:
+                self.attempt += 1
+            self.last_iteration = iteration
+            # Leave out the heap pushes, which depend on the timing of the
+            # threads even when the routing is deterministic.
+            columns = row.split()
+            del columns[2]
+            digest = ""
+            if len(self.iteration_digests) != 0:
+                digest = self.iteration_digests[-1][2]
+            self.iteration_digests.append([self.attempt, iteration, chain_digest(digest, " ".join(columns))])
+
+    def get_run_data(self):
+        run_data = RunData(self.circuit_name)
+        if len(self.cpds) != 0:
+            run_data.cpd = self.cpds[-1]
+        if len(self.wls) != 0:
+            run_data.wl = self.wls[-1]
+        if len(self.magic_cookies) != 0:
+            run_data.vtr_magic_cookie = self.magic_cookies[-1]
+        if len(self.runtimes) != 0:
+            run_data.runtime = self.runtimes[-1]
+        if len(self.sssp_runtimes) != 0:
+            run_data.sssp_runtime = sum(self.sssp_runtimes)
+        if len(self.min_chan_widths) != 0:
+            run_data.min_chan_width = self.min_chan_widths[-1]
+        if len(self.max_rss) != 0:
+            run_data.max_rss = self.max_rss[-1]
+        if len(self.heap_pushes) != 0:
+            run_data.heap_pushes = self.heap_pushes[-1]
+            run_data.heap_pops = self.heap_pops[-1]
+        run_data.vpr_revision = self.vpr_revision
+        run_data.iteration_digests = self.iteration_digests
+        # Compute the magic number (used to quickly check determinism) by
+        # chaining every router iteration and result onto one digest, in order.
+        total_magic_number = ""
+        if len(self.iteration_digests) != 0:
+            total_magic_number = self.iteration_digests[-1][2]
+        for cpd in self.cpds:
+            total_magic_number = chain_digest(total_magic_number, cpd)
+        for wl in self.wls:
+            total_magic_number = chain_digest(total_magic_number, wl)
+        for magic_cookie in self.magic_cookies:
+            total_magic_number = chain_digest(total_magic_number, magic_cookie)
+        run_data.total_magic_cookie = total_magic_number
+        return run_data
+
+# Helper method to parse a VPR log file which is already on disk.
+def parse_vpr_out(circuit_name, vpr_out_file):
+    parser = RunDataParser(circuit_name)
+    for metric, values in log_scanner.scan_file(vpr_out_file):
+        parser.add(metric, values)
+    return parser.get_run_data()
+
+# The directories and circuits of one run of a test suite.
+class TestRun:
+    test_name: str = None
+    arch: str = None
+    reference_dir: str = None
+    circuits: list = None
+    test_dir: str = None
+    config_dir: str = None
+    run_dir: str = None
+    arch_dir: str = None
+
+# Helper method to get the directory the runs of a test suite are stored in.
+def get_test_dir(test_name):
+    script_dir = str(pathlib.Path(__file__).parent.resolve())
+    return script_dir + "/" + test_name
+
+# Helper method to create the run directory (runNNN) for a new run of a test
+# suite. If run_name is given, the existing run directory with that name is
+# used instead (to resume it). Returns None if the test suite (or the run)
+# does not exist.
+def setup_test_run(tests_reference_dir_base, test_name, run_name=None):
+    tests_reference_dir = tests_reference_dir_base + "/" + test_name
     if not os.path.isdir(tests_reference_dir):
-        print("Invalid test")
-        return
+        return None
 
-    arch = get_arch_file_from_dir(tests_reference_dir + "/arch")
+    test_run = TestRun()
+    test_run.test_name = test_name
+    test_run.arch = get_arch_file_from_dir(tests_reference_dir + "/arch")
 
-    reference_dir = tests_reference_dir + "/" + arch
-    circuits = os.listdir(reference_dir)
+    test_run.reference_dir = tests_reference_dir + "/" + test_run.arch
+    test_run.circuits = sorted(os.listdir(test_run.reference_dir))
 
-    script_dir = str(pathlib.Path(__file__).parent.resolve())
-    test_dir = script_dir + "/" + args.test_name
-    os.makedirs(test_dir, exist_ok=True)
-    config_dir = test_dir + "/config"
-    if not os.path.isdir(config_dir):
-        shutil.copytree(reference_dir + "/../config", config_dir)
-
-    # Get the run name
-    runs = os.listdir(test_dir)
+    test_run.test_dir = get_test_dir(test_name)
+    os.makedirs(test_run.test_dir, exist_ok=True)
+    test_run.config_dir = test_run.test_dir + "/config"
+    if not os.path.isdir(test_run.config_dir):
+        shutil.copytree(test_run.reference_dir + "/../config", test_run.config_dir)
+
+    if run_name is not None:
+        test_run.run_dir = test_run.test_dir + "/" + run_name
+        test_run.arch_dir = test_run.run_dir + "/" + test_run.arch
+        if not os.path.isdir(test_run.arch_dir):
+            return None
+        return test_run
+
+    # Get the run name. Note: the test directory also holds other files (such
+    # as the config directory), so only the run directories are considered.
     last_run_num = 0
-    if len(runs) != 0:
-        last_run = sorted(runs)[-1]
-        last_run_num = extract_run_number(last_run)
-        if last_run_num is None:
-            last_run_num = 0
+    for run in os.listdir(test_run.test_dir):
+        existing_run_num = extract_run_number(run)
+        if existing_run_num is not None and existing_run_num > last_run_num:
+            last_run_num = existing_run_num
     run_num = last_run_num + 1
     run_name = "run{:03d}".format(run_num)
-    run_dir = test_dir + "/" + run_name
-    os.mkdir(run_dir)
-
-    arch_dir = run_dir + "/" + arch
-    os.mkdir(arch_dir)
-    print(arch_dir)
-
+    test_run.run_dir = test_run.test_dir + "/" + run_name
+    os.mkdir(test_run.run_dir)
+
+    test_run.arch_dir = test_run.run_dir + "/" + test_run.arch
+    os.mkdir(test_run.arch_dir)
+
+    return test_run
+
+# Helper method to record how a run was configured in its run directory, so
+# the results can be traced back to the options which produced them.
+# arg_list is the list of command line arguments the run was started with.
+def write_run_info(test_run, args, arg_list, label=""):
+    run_info = {
+        "test_name": test_run.test_name,
+        "label": label,
+        "arg_list": arg_list,
+        "T": args.T,
+        "Q": args.Q,
+        "direct_draining": args.direct_draining,
+        "extra_vpr_args": args.extra_vpr_args,
+        "run_at_min_chan_width": args.run_at_min_chan_width,
+        "timeout": args.timeout,
+    }
+    with open(test_run.run_dir + "/run_info.json", "w") as f:
+        json.dump(run_info, f, indent=1)
+
+# Helper method to get the directory of the result cache, or an empty string
+# if caching is disabled.
+def get_cache_dir(args):
+    if not args.cache:
+        return ""
+    if args.cache_dir != "":
+        return args.cache_dir
+    return str(pathlib.Path(__file__).parent.resolve()) + "/result_cache"
+
+# Helper method to get the events to count with perf stat, or an empty list if
+# -perf is not used (or perf cannot be run).
+def get_perf_events(args):
+    if not args.perf:
+        return []
+    perf_exec = perf_stat.find_perf()
+    if perf_exec is None:
+        print("WARNING: perf is not installed. Running without -perf.")
+        return []
+    events = perf_stat.DEFAULT_EVENTS
+    if args.perf_events != "":
+        events = args.perf_events.split(",")
+    supported_events = perf_stat.probe_events(perf_exec, events)
+    if len(supported_events) == 0:
+        print("WARNING: perf stat could not count any events (check kernel.perf_event_paranoid). Running without -perf.")
+    elif len(supported_events) != len(events):
+        unsupported_events = [event for event in events if event not in supported_events]
+        print(f"WARNING: perf stat cannot count {','.join(unsupported_events)} on this machine.")
+    return supported_events
+
+# Helper method to get the extra VPR arguments to use for one circuit.
+def get_extra_vpr_args(args, circuit, config_dir):
     # Handle the extra vpr args passed in by the user
     extra_vpr_args = args.extra_vpr_args.split(" ")
     if (len(extra_vpr_args) != 0 and extra_vpr_args[0] == ""):
         extra_vpr_args = []
 
-    thread_args = []
-    for circuit in sorted(circuits):
-        circuit_path = arch_dir + "/" + circuit
-        circuit_common_path = circuit_path + "/common"
-        os.mkdir(circuit_path)
-        os.mkdir(circuit_common_path)
-
-        circuit_extra_vpr_args = copy.deepcopy(extra_vpr_args)
-        if args.run_at_min_chan_width:
-            # get the minimum channel width
-            min_chan_width = get_min_chan_width(circuit, config_dir)
-            assert(min_chan_width != None)
-            circuit_extra_vpr_args += ["--route_chan_width", str(min_chan_width)];
-        if args.T != 0:
-            circuit_extra_vpr_args += ["--multi_queue_num_threads", str(args.T)]
-        if args.Q != 0:
-            circuit_extra_vpr_args += ["--multi_queue_num_queues", str(args.Q)]
-        if args.direct_draining:
-            circuit_extra_vpr_args += ["--multi_queue_direct_draining", "on"]
-        if args.thread_affinity != "":
-            circuit_extra_vpr_args += ["--thread_affinity", args.thread_affinity]
-
-        thread_args.append([reference_dir + "/" + circuit + "/common", circuit_common_path, circuit, arch, args.vtr_dir, config_dir + "/config.txt", circuit_extra_vpr_args, args.timeout])
-
-    pool = Pool(args.j)
-    pool.map(run_vpr_route, thread_args)
-    pool.close()
-
-    # Commented out since it was hardly working and never used.
-    # run_parse_vtr_task(test_dir, args.vtr_dir)
+    if args.run_at_min_chan_width:
+        # get the minimum channel width
+        min_chan_width = get_min_chan_width(circuit, config_dir)
+        assert(min_chan_width != None)
+        extra_vpr_args += ["--route_chan_width", str(min_chan_width)];
+    if args.T != 0:
+        extra_vpr_args += ["--multi_queue_num_threads", str(args.T)]
+    if args.Q != 0:
+        extra_vpr_args += ["--multi_queue_num_queues", str(args.Q)]
+    if args.direct_draining:
+        extra_vpr_args += ["--multi_queue_direct_draining", "on"]
+    if args.thread_affinity != "" and args.cores == 0:
+        extra_vpr_args += ["--thread_affinity", args.thread_affinity]
+    return extra_vpr_args
+
+# Helper method to create the working directory of each circuit of a run and
+# the scheduler job which routes it. The job names are prefixed with the given
+# prefix (used to tell apart the jobs of different runs). By default every
+# circuit of the run is routed; a subset can be given with circuits. VPR is run
+# in the working_dir_name directory of each circuit.
+def build_circuit_jobs(test_run, args, job_name_prefix="", circuits=None, working_dir_name="common"):
+    if circuits is None:
+        circuits = test_run.circuits
+    cache_dir = get_cache_dir(args)
+    perf_events = get_perf_events(args)
+    if len(perf_events) != 0:
+        # Cached runs would have no counters.
+        cache_dir = ""
+    jobs = []
+    for circuit in circuits:
+        circuit_path = test_run.arch_dir + "/" + circuit
+        circuit_common_path = circuit_path + "/" + working_dir_name
+        os.makedirs(circuit_common_path, exist_ok=True)
+
+        circuit_extra_vpr_args = get_extra_vpr_args(args, circuit, test_run.config_dir)
+
+        jobs.append(scheduler.Job(job_name_prefix + circuit, [test_run.reference_dir + "/" + circuit + "/common", circuit_common_path, circuit, test_run.arch, args.vtr_dir, test_run.config_dir + "/config.txt", circuit_extra_vpr_args, args.timeout, args.progress, cache_dir, args.telemetry_interval if args.telemetry else 0.0, perf_events], max(args.T, 1)))
+    return jobs
+
+# Run the jobs built by build_circuit_jobs: on workers with -coordinator, on a
+# budget of cores with -cores, and otherwise on -j processes. Returns the run
+# data of the jobs, in the same order.
+def run_circuit_jobs(jobs, args, history=None, on_result=None):
+    get_runtime = lambda run_data: run_data.runtime
+    if args.coordinator != "":
+        import job_server
+        return job_server.run_distributed(jobs, args.coordinator, args.authkey, history, get_runtime, on_result,
+                                          args.local_workers, args.heartbeat_timeout)
+    if args.cores != 0:
+        return scheduler.run_with_core_budget(run_vpr_route, jobs, args.cores, history, get_runtime, on_result)
+    return scheduler.run_longest_first(run_vpr_route, jobs, args.j, history, get_runtime, on_result)
+
+# Helper method to check the -coordinator options before a run is set up.
+# A key made for a loopback address is kept in args, so every round of a run
+# (and the workers started with -persist) use the same one.
+def check_coordinator_args(args):
+    if args.coordinator == "":
+        return True
+    import job_server
+    try:
+        args.authkey = job_server.get_coordinator_authkey(args.coordinator, args.authkey)
+    except ValueError as error:
+        print(f"ERROR: {error}")
+        return False
+    return True
+
+# Helper method to check that every circuit fits in the -cores budget before a
+# run is set up. Runs on workers are not limited by the cores of this machine.
+def check_core_budget(args):
+    if args.coordinator != "" or args.cores == 0:
+        return True
+    return scheduler.check_core_budget(args.cores, max(args.T, 1))
 
-    # Collect the runtimes, CPD, and wirelengths of the circuits
+# Helper method to evict old entries from the result cache after a run.
+def evict_result_cache(args):
+    cache_dir = get_cache_dir(args)
+    if cache_dir == "":
+        return
+    num_evicted = result_cache.ResultCache(cache_dir).evict(args.cache_max_size * (1024 ** 3),
+                                                            args.cache_max_age * 24 * 60 * 60)
+    if num_evicted != 0:
+        print(f"Evicted {num_evicted} entries from the result cache.")
+
+# Helper method to get the status of a routed circuit for the run manifest.
+def get_run_status(run_data):
+    if run_data.timed_out:
+        return run_manifest.STATUS_TIMEOUT
+    if run_data.return_code != 0 or not run_data.has_complete_data(False):
+        return run_manifest.STATUS_FAILED
+    return run_manifest.STATUS_DONE
+
+# Helper method to get a callback for the scheduler which records each routed
+# circuit in the run manifest.
+def get_manifest_recorder(manifest, args):
+    def record(job, run_data):
+        manifest.record(run_data.circuit_name, get_run_status(run_data), args.timeout, run_data.to_dict())
+    return record
+
+# Helper method to add the results of a run to the results database.
+def store_run_results(test_run, args, circuit_run_data):
+    if args.results_db == "":
+        return
+    with open(test_run.run_dir + "/run_info.json", 'r') as f:
+        run_info = json.load(f)
+    store = results_store.ResultsStore(args.results_db)
+    store.add_run(test_run.test_name, os.path.basename(test_run.run_dir), results_store.get_config_name(run_info),
+                  run_info, {circuit: run_data.to_dict() for circuit, run_data in circuit_run_data.items()})
+    store.close()
+
+# Helper method to map each circuit to its run data.
+def collect_run_data(circuit_run_data_list):
     circuit_run_data = dict()
-    for circuit in sorted(circuits):
-        runtimes = []
-        sssp_runtimes = []
-        cpds = []
-        wls = []
-        min_chan_widths = []
-        magic_cookies = []
-
-        circuit_path = arch_dir + "/" + circuit
-        circuit_common_path = circuit_path + "/common"
-        vpr_out_file = circuit_common_path + "/vpr.out"
-        with open(vpr_out_file, 'r') as f:
-            routing_time_pattern = r"Routing took (\d+\.\d+) seconds.*max_rss (\d+\.\d+) MiB"
-            sssp_time_pattern = r"Time spent computing SSSP: (\d+\.\d+) seconds"
-            cpd_pattern = r"Critical path: (\d+\.\d+) ns"
-            wl_pattern = r"Total wirelength: (\d+), average net length"
-            min_chan_width_pattern = r"Best routing used a channel width factor of (\d+)."
-            magic_cookie_pattern = r"Serial number \(magic cookie\) for the routing is: (-?\d+)"
-            for line in f:
-                routing_time_match = re.search(routing_time_pattern, line)
-                if routing_time_match:
-                    time_taken = float(routing_time_match.group(1))
-                    max_rss = float(routing_time_match.group(2))
-                    runtimes.append(time_taken)
-                sssp_time_match = re.search(sssp_time_pattern, line)
-                if sssp_time_match:
-                    time_taken = float(sssp_time_match.group(1))
-                    sssp_runtimes.append(time_taken)
-                cpd_match = re.search(cpd_pattern, line)
-                if cpd_match:
-                    cpd = float(cpd_match.group(1))
-                    cpds.append(cpd)
-                wl_match = re.search(wl_pattern, line)
-                if wl_match:
-                    wl = int(wl_match.group(1))
-                    wls.append(wl)
-                min_chan_width_match = re.search(min_chan_width_pattern, line)
-                if min_chan_width_match:
-                    min_chan_width = int(min_chan_width_match.group(1))
-                    min_chan_widths.append(min_chan_width)
-                magic_cookie_match = re.search(magic_cookie_pattern, line)
-                if magic_cookie_match:
-                    magic_cookie = int(magic_cookie_match.group(1))
-                    magic_cookies.append(magic_cookie)
-        run_data = RunData(circuit)
-        if len(cpds) != 0:
-            run_data.cpd = cpds[-1]
-        if len(wls) != 0:
-            run_data.wl = wls[-1]
-        if len(magic_cookies) != 0:
-            run_data.vtr_magic_cookie = magic_cookies[-1]
-        if len(runtimes) != 0:
-            run_data.runtime = runtimes[-1]
-        if len(sssp_runtimes) != 0:
-            run_data.sssp_runtime = sum(sssp_runtimes)
-        if len(min_chan_widths) != 0:
-            run_data.min_chan_width = min_chan_widths[-1]
-        # Compute the magic number (used to quickly check determinism)
-        # Note: we use the previous magic number in a tuple to make enforce order.
-        total_magic_number = 0
-        for cpd in cpds:
-            total_magic_number = hash((total_magic_number, cpd))
-        for wl in wls:
-            total_magic_number = hash((total_magic_number, wl))
-        for magic_cookie in magic_cookies:
-            total_magic_number = hash((total_magic_number, magic_cookie))
-        run_data.total_magic_cookie = total_magic_number
-
-        circuit_run_data[circuit] = run_data
+    for run_data in circuit_run_data_list:
+        circuit_run_data[run_data.circuit_name] = run_data
+    return circuit_run_data
 
+# Print the QoR and run time of every circuit of a run, and their geomeans.
+def print_run_summary(circuits, circuit_run_data, file=None):
     # Check if any of the circuits have minimum channel width information.
     # This would mean we are doing a min channel width search
     has_min_chan_widths = False
@@ -441,6 +1010,13 @@ def run_test_main(arg_list, prog=None):
             has_min_chan_widths = True
             break;
 
+    # Check if any of the circuits were run with -telemetry.
+    has_telemetry = False
+    for circuit in sorted(circuits):
+        if circuit_run_data[circuit].has_telemetry():
+            has_telemetry = True
+            break
+
     # Count the number of circuits which routed successfully (have all of their data).
     count = 0.0
     for circuit in sorted(circuits):
@@ -450,11 +1026,11 @@ def run_test_main(arg_list, prog=None):
 
     # If no circuits have routed successfully, stop.
     if count == 0.0:
-        print(f"ERROR: No circuits routed successfully!")
+        print(f"ERROR: No circuits routed successfully!", file=file)
         return
 
     if count != len(circuits):
-        print(f"WARNING: Not all circuits routed successfully! {int(len(circuits) - count)} unrouted.")
+        print(f"WARNING: Not all circuits routed successfully! {int(len(circuits) - count)} unrouted.", file=file)
 
     # Calculate the interesting information
     geomean_runtime = 1
@@ -462,7 +1038,10 @@ def run_test_main(arg_list, prog=None):
     geomean_cpd = 1
     geomean_wl = 1
     geomean_min_chan_width = 1
-    magic_number = 0
+    magic_number = ""
+    geomean_parallelism = 1
+    geomean_peak_rss = 1
+    telemetry_count = 0
     # Note: This needs to be sorted so the magic number always returns the correct
     #       magic number regardless of machine.
     for circuit in sorted(circuits):
@@ -477,8 +1056,11 @@ def run_test_main(arg_list, prog=None):
         if has_min_chan_widths:
             geomean_min_chan_width *= run_data.min_chan_width
         # Compute the magic number (used to quickly check determinism)
-        # Note: we use the previous magic number in a tuple to make enforce order.
-        magic_number = hash((magic_number, run_data.total_magic_cookie))
+        magic_number = chain_digest(magic_number, run_data.total_magic_cookie)
+        if run_data.has_telemetry() and run_data.peak_rss is not None:
+            geomean_parallelism *= run_data.avg_parallelism
+            geomean_peak_rss *= run_data.peak_rss
+            telemetry_count += 1
 
     geomean_run_data = RunData("Geomean")
     geomean_run_data.runtime = geomean_runtime ** (1.0 / count)
@@ -488,20 +1070,148 @@ def run_test_main(arg_list, prog=None):
     geomean_run_data.min_chan_width = geomean_min_chan_width ** (1.0 / count)
     geomean_run_data.vtr_magic_cookie = magic_number
     geomean_run_data.total_magic_cookie = magic_number
-
-    print("*" * 30)
-    print("*     Routing Information    *")
-    print("*" * 30)
+    if telemetry_count != 0:
+        geomean_run_data.avg_parallelism = geomean_parallelism ** (1.0 / telemetry_count)
+        geomean_run_data.peak_rss = geomean_peak_rss ** (1.0 / telemetry_count)
+
+    print("*" * 30, file=file)
+    print("*     Routing Information    *", file=file)
+    print("*" * 30, file=file)
+    telemetry_header = ""
+    if has_telemetry:
+        telemetry_header = "\tAvg-Parallelism\tPeak-RSS(MiB)"
     if has_min_chan_widths:
-        print("Circuit:\tCPD(ns)\tRun-time(s)\tSSSP-Run-time(s)\tWirelength\tMagic-cookie\tmin_chan_width")
+        print(f"Circuit:\tCPD(ns)\tRun-time(s)\tSSSP-Run-time(s)\tWirelength\tMagic-cookie\tmin_chan_width{telemetry_header}", file=file)
     else:
-        print("Circuit:\tCPD(ns)\tRun-time(s)\tSSSP-Run-time(s)\tWirelength\tMagic-cookie")
+        print(f"Circuit:\tCPD(ns)\tRun-time(s)\tSSSP-Run-time(s)\tWirelength\tMagic-cookie{telemetry_header}", file=file)
+    for circuit in sorted(circuits):
+        run_data = circuit_run_data[circuit]
+        run_data.print(has_min_chan_widths, file=file, has_telemetry=has_telemetry)
+
+    geomean_run_data.print(has_min_chan_widths, file=file, has_telemetry=has_telemetry)
+
+    print_perf_summary(circuits, circuit_run_data, file=file)
+
+# Print the perf counters of every circuit of a run per heap pop (if the run
+# used -perf), so runs which do different amounts of work can be compared.
+def print_perf_summary(circuits, circuit_run_data, file=None):
+    events = []
+    for circuit in sorted(circuits):
+        perf_counters = circuit_run_data[circuit].perf_counters
+        if perf_counters is None:
+            continue
+        for event in perf_counters:
+            if event not in events:
+                events.append(event)
+    if len(events) == 0:
+        return
+
+    print("*" * 30, file=file)
+    print("*  Perf Counters / Heap Pop  *", file=file)
+    print("*" * 30, file=file)
+    print("Circuit:\tHeap-Pops\tIPC\t" + "\t".join(events), file=file)
     for circuit in sorted(circuits):
         run_data = circuit_run_data[circuit]
-        run_data.print(has_min_chan_widths)
+        perf_counters = run_data.perf_counters
+        if perf_counters is None or run_data.heap_pops is None or run_data.heap_pops == 0:
+            print(f"{circuit}:\t-\t-\t" + "\t".join(["-"] * len(events)), file=file)
+            continue
+        ipc = "-"
+        if perf_counters.get("cycles", 0) != 0 and "instructions" in perf_counters:
+            ipc = f"{perf_counters['instructions'] / perf_counters['cycles']:.3f}"
+        per_pop = []
+        for event in events:
+            if event in perf_counters:
+                per_pop.append(f"{perf_counters[event] / run_data.heap_pops:.4g}")
+            else:
+                per_pop.append("-")
+        print(f"{circuit}:\t{run_data.heap_pops}\t{ipc}\t" + "\t".join(per_pop), file=file)
+
+# Helper method to get the options given in an argument list, without the
+# defaults of the options which are not, as a dictionary of option -> value.
+def get_given_options(arg_list, prog=None):
+    parser = command_parser(prog)
+    for action in parser._actions:
+        action.default = argparse.SUPPRESS
+    return vars(parser.parse_args(arg_list))
+
+def run_test_main(arg_list, prog=None):
+    # Load the arguments
+    args = command_parser(prog).parse_args(arg_list)
 
-    geomean_run_data.print(has_min_chan_widths)
+    if args.resume != "" and args.repeat > 1:
+        print("Runs with repeated trials cannot be resumed.")
+        return
+
+    if args.resume != "":
+        # Resume using the options the run was started with. Options given
+        # now (for example, a larger -timeout) take precedence.
+        run_info_file = get_test_dir(args.test_name) + "/" + args.resume + "/run_info.json"
+        if not os.path.isfile(run_info_file):
+            print(f"Invalid run to resume: {args.resume}")
+            return
+        with open(run_info_file, 'r') as f:
+            saved_arg_list = json.load(f)["arg_list"]
+        given_options = get_given_options(arg_list, prog)
+        args = command_parser(prog).parse_args(saved_arg_list)
+        for option, value in given_options.items():
+            setattr(args, option, value)
+        if not check_coordinator_args(args) or not check_core_budget(args):
+            return
+
+        test_run = setup_test_run(args.tests_reference_dir_base, args.test_name, args.resume)
+        if test_run is None:
+            print(f"Invalid run to resume: {args.resume}")
+            return
+        manifest = run_manifest.RunManifest.load(test_run.run_dir)
+        if manifest is None:
+            print(f"Run {args.resume} does not have a manifest to resume from.")
+            return
+        circuits_to_run = manifest.get_unfinished_circuits(args.resume_only_timeouts)
+        print(f"Resuming {test_run.run_dir}: {len(circuits_to_run)} of {len(test_run.circuits)} circuits to route.")
+    else:
+        if not check_coordinator_args(args) or not check_core_budget(args):
+            return
+        test_run = setup_test_run(args.tests_reference_dir_base, args.test_name)
+        if test_run is None:
+            print("Invalid test")
+            return
+        print(test_run.arch_dir)
+        write_run_info(test_run, args, arg_list)
+        if args.repeat > 1:
+            repeated_trials.run_repeated_trials([(test_run, args, "")], args)
+            return
+        manifest = run_manifest.RunManifest(test_run.run_dir)
+        manifest.add_circuits(test_run.circuits)
+        manifest.save()
+        circuits_to_run = test_run.circuits
+
+    jobs = build_circuit_jobs(test_run, args, circuits=circuits_to_run)
+
+    # Run the circuits longest first, based on how long they took last time.
+    # Each circuit is recorded in the manifest as soon as it finishes.
+    history = scheduler.RuntimeHistory(test_run.test_dir + "/runtime_history.json")
+    record = get_manifest_recorder(manifest, args)
+    run_circuit_jobs(jobs, args, history, record)
+
+    evict_result_cache(args)
+
+    # Commented out since it was hardly working and never used.
+    # run_parse_vtr_task(test_dir, args.vtr_dir)
+
+    # Collect the runtimes, CPD, and wirelengths of the circuits. These were
+    # parsed from the output of VPR while it was running (in this run, or in
+    # the run being resumed).
+    circuit_run_data = dict()
+    for circuit in test_run.circuits:
+        run_data_dict = manifest.get_run_data_dict(circuit)
+        if run_data_dict is None:
+            circuit_run_data[circuit] = RunData(circuit)
+        else:
+            circuit_run_data[circuit] = RunData.from_dict(run_data_dict)
+
+    print_run_summary(test_run.circuits, circuit_run_data)
+    store_run_results(test_run, args, circuit_run_data)
 
 if __name__ == "__main__":
     run_test_main(sys.argv[1:])
-
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+
+# Longest-job-first scheduling of VPR runs.
+#
+# The run time of each job (for example, each circuit of a suite) is recorded
+# in a history file. On the next run, the jobs are submitted to the pool longest
+# first, one at a time, so one large circuit never starts last and holds up the
+# whole run.
+#
+# Multithreaded jobs can instead be scheduled against a budget of cores. Each
+# job is given its own set of cores (passed to VPR with --thread_affinity), and
+# jobs with mixed thread counts are packed onto the cores without overlapping.
+
+import os
+import json
+import time
+import heapq
+import queue
+from multiprocessing import Pool
+
+import result_cache
+
+# A single job for the scheduler. The args are passed to the job function.
+# num_threads is the number of cores the job needs when scheduling against a
+# core budget.
+class Job:
+    def __init__(self, name, args, num_threads=1):
+        self.name = name
+        self.args = args
+        self.num_threads = num_threads
+
+# The run times of jobs from earlier runs, keyed by job name.
+class RuntimeHistory:
+    def __init__(self, history_file):
+        self.history_file = history_file
+        self.runtimes = dict()
+        if os.path.isfile(history_file):
+            try:
+                with open(history_file, 'r') as f:
+                    self.runtimes = json.load(f)
+            except ValueError:
+                self.runtimes = dict()
+
+    # Get the predicted run time of a job, or None if it has never been run.
+    def predict(self, name):
+        return self.runtimes.get(name)
+
+    def record(self, name, runtime):
+        self.runtimes[name] = runtime
+
+    def save(self):
+        result_cache.write_json_atomic(self.history_file, self.runtimes)
+
+# Get the predicted run time of each job. Jobs which have never been run are
+# assumed to take as long as the longest known job, so they are started early.
+def predict_runtimes(jobs, history):
+    predictions = [None] * len(jobs)
+    if history is not None:
+        predictions = [history.predict(job.name) for job in jobs]
+    known = [p for p in predictions if p is not None]
+    default = max(known) if len(known) != 0 else 0.0
+    return [p if p is not None else default for p in predictions]
+
+# Simulate greedy list scheduling of jobs (in the given order) onto the given
+# number of workers, returning the time the last job would finish.
+def simulate_makespan(runtimes, num_workers):
+    workers = [0.0] * max(num_workers, 1)
+    for runtime in runtimes:
+        start = heapq.heappop(workers)
+        heapq.heappush(workers, start + runtime)
+    return max(workers)
+
+# Run a job function in a worker process, timing it.
+def run_timed_job(job_args):
+    index, func, args = job_args
+    start = time.time()
+    result = func(args)
+    end = time.time()
+    return index, result, start, end
+
+# Run a job function on a given set of cores in a worker process, timing it.
+def run_timed_job_on_cores(job_args):
+    index, func, args, cores = job_args
+    start = time.time()
+    result = func(args, cores)
+    end = time.time()
+    return index, result, start, end
+
+# Helper method to record the run time of a finished job in the history.
+def record_runtime(history, job, result, start, end, get_runtime):
+    if history is None:
+        return
+    runtime = None
+    if get_runtime is not None:
+        runtime = get_runtime(result)
+    if runtime is None:
+        runtime = end - start
+    history.record(job.name, runtime)
+
+# Helper method to print the predicted and actual makespan, and save the history.
+def report_makespan(history, predicted_makespan, actual_makespan):
+    if history is None:
+        return
+    history.save()
+    if predicted_makespan != 0.0:
+        print(f"Predicted makespan: {predicted_makespan:.2f} s\tActual makespan: {actual_makespan:.2f} s")
+    else:
+        print(f"Actual makespan: {actual_makespan:.2f} s (no run time history yet)")
+
+# Run all of the jobs on a pool of num_proc processes, longest job first.
+#
+# func is called with the args of each job and must be picklable. If a history
+# is given, the run time of each job is recorded in it; get_runtime can be used
+# to pull the run time out of a job's result (for example, the time VPR reports
+# for routing), otherwise the wall time of the job is used.
+#
+# If on_result is given, it is called with each job and its result as soon as
+# the job finishes (in this process).
+#
+# Returns the results in the same order as the jobs.
+def run_longest_first(func, jobs, num_proc, history=None, get_runtime=None, on_result=None):
+    predictions = predict_runtimes(jobs, history)
+    order = sorted(range(len(jobs)), key=lambda i: predictions[i], reverse=True)
+    predicted_makespan = simulate_makespan([predictions[i] for i in order], num_proc)
+
+    results = [None] * len(jobs)
+    run_start = time.time()
+    pool = Pool(num_proc)
+    job_args = [(i, func, jobs[i].args) for i in order]
+    for index, result, start, end in pool.imap_unordered(run_timed_job, job_args, chunksize=1):
+        results[index] = result
+        record_runtime(history, jobs[index], result, start, end, get_runtime)
+        if on_result is not None:
+            on_result(jobs[index], result)
+    pool.close()
+    pool.join()
+    actual_makespan = time.time() - run_start
+
+    report_makespan(history, predicted_makespan, actual_makespan)
+
+    return results
+
+# Get the cores available to this process, limited to the first num_cores.
+def get_core_budget(num_cores):
+    available = sorted(os.sched_getaffinity(0))
+    if num_cores > len(available):
+        print(f"WARNING: Core budget of {num_cores} is larger than the {len(available)} available cores. Using {len(available)}.")
+    return available[:num_cores]
+
+# Helper method to check that jobs of num_threads threads fit in a budget of
+# num_cores cores, before anything is run. Prints an error if they do not.
+def check_core_budget(num_cores, num_threads):
+    budget_size = min(num_cores, len(os.sched_getaffinity(0)))
+    if num_threads > budget_size:
+        print(f"ERROR: Each job needs {num_threads} cores (-T) but the core budget (-cores) is {budget_size}")
+        return False
+    return True
+
+# Pick num_threads cores from the free cores, preferring a contiguous block so
+# the threads of one job share as much of the cache hierarchy as possible.
+def allocate_cores(free_cores, num_threads):
+    free_cores = sorted(free_cores)
+    for i in range(len(free_cores) - num_threads + 1):
+        block = free_cores[i:i + num_threads]
+        if block[-1] - block[0] == num_threads - 1:
+            return block
+    return free_cores[:num_threads]
+
+# Simulate list scheduling of jobs with mixed thread counts onto a core budget,
+# returning the time the last job would finish.
+def simulate_core_makespan(runtimes, threads, num_cores):
+    now = 0.0
+    free = num_cores
+    running = []
+    makespan = 0.0
+    for runtime, num_threads in zip(runtimes, threads):
+        while free < num_threads:
+            end, freed = heapq.heappop(running)
+            now = max(now, end)
+            free += freed
+        free -= num_threads
+        heapq.heappush(running, (now + runtime, num_threads))
+        makespan = max(makespan, now + runtime)
+    return makespan
+
+# Run all of the jobs against a budget of num_cores cores, longest job first.
+#
+# Each job is given job.num_threads cores of its own; func is called with the
+# args of the job and the list of cores it may use. As soon as enough cores are
+# free, the next job is started. If the longest waiting job does not fit yet,
+# smaller jobs are started in the gaps (backfilled), but only if they are not
+# predicted to delay the start of the longest waiting job. on_result is the
+# same as for run_longest_first.
+#
+# Returns the results in the same order as the jobs.
+def run_with_core_budget(func, jobs, num_cores, history=None, get_runtime=None, on_result=None):
+    core_budget = get_core_budget(num_cores)
+    for job in jobs:
+        if job.num_threads > len(core_budget):
+            raise ValueError(f"Job {job.name} needs {job.num_threads} cores but the budget is {len(core_budget)}")
+
+    predictions = predict_runtimes(jobs, history)
+    pending = sorted(range(len(jobs)), key=lambda i: predictions[i], reverse=True)
+    predicted_makespan = simulate_core_makespan([predictions[i] for i in pending],
+                                                [jobs[i].num_threads for i in pending],
+                                                len(core_budget))
+
+    results = [None] * len(jobs)
+    free_cores = list(core_budget)
+    # Job index -> (cores, predicted end time) of the jobs which are running.
+    running = dict()
+    finished = queue.Queue()
+    run_start = time.time()
+    pool = Pool(len(core_budget))
+
+    def start_job(index):
+        cores = allocate_cores(free_cores, jobs[index].num_threads)
+        for core in cores:
+            free_cores.remove(core)
+        running[index] = (cores, time.time() + predictions[index])
+        pool.apply_async(run_timed_job_on_cores, ((index, func, jobs[index].args, cores),),
+                         callback=finished.put, error_callback=finished.put)
+
+    while len(pending) != 0 or len(running) != 0:
+        # Start as many pending jobs as will fit.
+        while len(pending) != 0:
+            head = pending[0]
+            if jobs[head].num_threads <= len(free_cores):
+                start_job(pending.pop(0))
+                continue
+            # The head job does not fit. Find when enough cores are predicted
+            # to be free for it (the shadow time), and how many cores will be
+            # spare at that point.
+            num_free = len(free_cores)
+            shadow_time = time.time()
+            for cores, end in sorted(running.values(), key=lambda x: x[1]):
+                if num_free >= jobs[head].num_threads:
+                    break
+                num_free += len(cores)
+                shadow_time = end
+            spare_cores = num_free - jobs[head].num_threads
+            # Backfill jobs which fit now and either finish before the shadow
+            # time or only use the spare cores.
+            for index in list(pending[1:]):
+                num_threads = jobs[index].num_threads
+                if num_threads > len(free_cores):
+                    continue
+                if time.time() + predictions[index] <= shadow_time:
+                    pending.remove(index)
+                    start_job(index)
+                elif num_threads <= spare_cores:
+                    spare_cores -= num_threads
+                    pending.remove(index)
+                    start_job(index)
+            break
+
+        # Wait for a job to finish and give its cores back.
+        finished_job = finished.get()
+        if isinstance(finished_job, BaseException):
+            pool.terminate()
+            raise finished_job
+        index, result, start, end = finished_job
+        results[index] = result
+        cores, _ = running.pop(index)
+        free_cores.extend(cores)
+        record_runtime(history, jobs[index], result, start, end, get_runtime)
+        if on_result is not None:
+            on_result(jobs[index], result)
+
+    pool.close()
+    pool.join()
+    actual_makespan = time.time() - run_start
+
+    report_makespan(history, predicted_makespan, actual_makespan)
+
+    return results
@@ -4,11 +4,17 @@ import os
 import re
 import sys
 import argparse
-from multiprocessing import Pool
 from subprocess import Popen, PIPE
 import pathlib
 import shutil
 
+# The log parsing, scheduler, and results store are shared with the testing
+# scripts.
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()) + "/../../testing")
+import results_store
+import run_test
+import scheduler
+
 # Helper method to get the architecture file name from a directory.
 def get_arch_file_from_dir(dir_path):
     res = []
@@ -70,6 +76,15 @@ def command_parser(prog=None):
         metavar="VTR_DIR",
     )
 
+    # SQLite database the results of the sweep are added to (one config per
+    # astar_fac). Pass an empty string to not record the sweep.
+    parser.add_argument(
+        "-results-db",
+        default=results_store.get_default_db_file(),
+        type=str,
+        metavar="DB_FILE",
+    )
+
     return parser
 
 # Run a single circuit through VPR route flow.
@@ -140,6 +155,10 @@ def run_vpr_route(thread_args):
 
     print(f"{circuit_name} with astar_fac {astar_fac} is done!")
 
+    # Parse the log once; the results are used to schedule the next sweep, to
+    # print the table, and to record the sweep.
+    return run_test.parse_vpr_out(circuit_name, "vpr.out")
+
 # Helper method to parse the QoR and Runtimes of the run.
 def run_parse_vtr_task(test_dir, vtr_dir):
     parse_vtr_task_exec = vtr_dir + "/vtr_flow/scripts/python_libs/vtr/parse_vtr_task.py"
@@ -171,14 +190,13 @@ def run_test_main(arg_list, prog=None):
     if not os.path.isdir(config_dir):
         shutil.copytree(reference_dir + "/../config", config_dir)
 
-    # Get the run name
-    runs = os.listdir(test_dir)
+    # Get the run name. Note: the test directory also holds other files (such
+    # as the config directory), so only the run directories are considered.
     last_run_num = 0
-    if len(runs) is not 0:
-        last_run = sorted(runs)[-1]
-        last_run_num = extract_run_number(last_run)
-        if last_run_num is None:
-            last_run_num = 0
+    for run in os.listdir(test_dir):
+        existing_run_num = extract_run_number(run)
+        if existing_run_num is not None and existing_run_num > last_run_num:
+            last_run_num = existing_run_num
     run_num = last_run_num + 1
     run_name = "run{:03d}".format(run_num)
     run_dir = test_dir + "/" + run_name
@@ -196,17 +214,18 @@ def run_test_main(arg_list, prog=None):
     interval = 0.1
     astar_fac_list = [str(round(i, 1)) for i in [start + interval * j for j in range(int((end - start) / interval))]]
 
-    thread_args = []
+    jobs = []
     for astar_fac in astar_fac_list:
         circuit_path = arch_dir + "/" + circuit + astar_fac
         circuit_common_path = circuit_path + "/common"
         os.mkdir(circuit_path)
         os.mkdir(circuit_common_path)
-        thread_args.append([reference_dir + "/" + circuit + "/common", circuit_common_path, circuit, arch, args.vtr_dir, config_dir + "/config.txt", astar_fac])
+        jobs.append(scheduler.Job(f"{circuit} {astar_fac}", [reference_dir + "/" + circuit + "/common", circuit_common_path, circuit, arch, args.vtr_dir, config_dir + "/config.txt", astar_fac]))
 
-    pool = Pool(args.j)
-    pool.map(run_vpr_route, thread_args)
-    pool.close()
+    # Run the sweep points longest first, based on how long they took last time.
+    history = scheduler.RuntimeHistory(test_dir + "/runtime_history.json")
+    results = scheduler.run_longest_first(run_vpr_route, jobs, args.j, history, lambda run_data: run_data.runtime)
+    sweep_run_data = dict(zip(astar_fac_list, results))
 
     # Parse the out files to get data on the run.
     print("*" * 30)
@@ -214,38 +233,19 @@ def run_test_main(arg_list, prog=None):
     print("*" * 30)
     print("Circuit:\tCPD(ns)\tHeap Pushes\tHeap Pops\tRun-time(s)\tWirelength")
     for astar_fac in reversed(astar_fac_list):
-        print(f"{circuit} {astar_fac}", end=':\t')
-        circuit_path = arch_dir + "/" + circuit + astar_fac
-        circuit_common_path = circuit_path + "/common"
-        vpr_out_file = circuit_common_path + "/vpr.out"
-
-        with open(vpr_out_file, 'r') as f:
-            routing_time_pattern = r"Routing took (\d+\.\d+) seconds.*max_rss (\d+\.\d+) MiB"
-            cpd_pattern = r"Critical path: (\d+\.\d+) ns"
-            wl_pattern = r"Total wirelength: (\d+), average net length"
-            push_pop_pattern = r"total_heap_pushes: (\d+) total_heap_pops: (\d+)"
-            for line in f:
-                routing_time_match = re.search(routing_time_pattern, line)
-                if routing_time_match:
-                    time_taken = float(routing_time_match.group(1))
-                    max_rss = float(routing_time_match.group(2))
-                    print(time_taken, end="\t")
-                cpd_match = re.search(cpd_pattern, line)
-                if cpd_match:
-                    cpd = float(cpd_match.group(1))
-                    print(cpd, end="\t")
-                wl_match = re.search(wl_pattern, line)
-                if wl_match:
-                    wl = int(wl_match.group(1))
-                    print(wl, end="\t")
-                push_pop_match = re.search(push_pop_pattern, line)
-                if push_pop_match:
-                    num_heap_push = int(push_pop_match.group(1))
-                    num_heap_pop = int(push_pop_match.group(2))
-                    print(num_heap_push, end="\t")
-                    print(num_heap_pop, end="\t")
-
-            print("")
+        run_data = sweep_run_data[astar_fac]
+        values = [run_data.cpd, run_data.heap_pushes, run_data.heap_pops, run_data.runtime, run_data.wl]
+        print(f"{circuit} {astar_fac}:\t" + "\t".join("-" if value is None else str(value) for value in values))
+
+    # Add every point of the sweep to the results database.
+    if args.results_db != "":
+        store = results_store.ResultsStore(args.results_db)
+        for astar_fac in astar_fac_list:
+            run_data = sweep_run_data[astar_fac]
+            run_info = {"extra_vpr_args": f"--astar_fac {astar_fac}"}
+            store.add_run(args.test_suite_name, run_name, f"astar_fac={astar_fac}", run_info,
+                          {circuit: run_data.to_dict()})
+        store.close()
 
 if __name__ == "__main__":
     run_test_main(sys.argv[1:])
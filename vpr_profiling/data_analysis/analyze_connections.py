@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming analysis of the per-connection data of many circuits.
+
+Unlike parse_connection_data.py, which loads the whole CSV into memory, the
+CSV of each circuit is read in chunks with compact column types, and every
+statistic (mean, geomean, standard deviation, correlations, quantiles, and the
+share of the route time taken by the slowest connections) is computed from
+mergeable streaming statistics. Circuits are analyzed in parallel, and the
+statistics of all of the circuits are merged at the end. If a circuit's CSV
+has been converted with convert_connection_data.py, its columnar cache is read
+instead, which is much faster.
+
+Usage:
+    python3 analyze_connections.py bwave_like.float.large-fcin mkPktMerge -j 2
+    python3 analyze_connections.py input_data/*_connection_data.csv -plot
+"""
+
+import os
+import sys
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+import connection_data
+from streaming_stats import StreamingMoments, LogHistogramSketch
+
+# Quantiles of the connection route time which are reported.
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+# Fractions of the slowest connections whose share of the route time is
+# reported.
+DEFAULT_TAIL_FRACTIONS = [0.01, 0.001]
+
+# The streaming statistics of the connections of one (or more) circuits.
+class CircuitSummary:
+    def __init__(self, name, column_names, relative_accuracy):
+        self.name = name
+        self.column_names = column_names
+        self.moments = StreamingMoments(len(column_names))
+        self.route_time_sketch = LogHistogramSketch(relative_accuracy)
+        self.heap_pops_sketch = LogHistogramSketch(relative_accuracy)
+
+    def update(self, chunk):
+        self.moments.update(chunk.to_numpy(dtype=np.float64))
+        self.route_time_sketch.update(chunk[connection_data.find_column(self.column_names,
+                                                                        connection_data.ROUTE_TIME_COLUMN)].to_numpy())
+        self.heap_pops_sketch.update(chunk[connection_data.find_column(self.column_names,
+                                                                       connection_data.HEAP_POPS_COLUMN)].to_numpy())
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.route_time_sketch.merge(other.route_time_sketch)
+        self.heap_pops_sketch.merge(other.heap_pops_sketch)
+
+# Analyze the connections of one circuit, reading its CSV (or its columnar
+# cache, if it has one) chunk by chunk. Columns whose values in a chunk do not
+# fit the types chosen from the first rows are left wide by read_chunks.
+def analyze_circuit(csv_file, chunk_size, relative_accuracy):
+    dtypes = connection_data.get_dtypes(csv_file)
+    summary = CircuitSummary(connection_data.get_circuit_name(csv_file), list(dtypes.keys()), relative_accuracy)
+    for chunk in connection_data.iterate_chunks(csv_file, dtypes, chunk_size):
+        summary.update(chunk)
+    return summary
+
+def analyze_circuit_job(job_args):
+    return analyze_circuit(*job_args)
+
+# Print the statistics of a circuit, in the same form as parse_connection_data.py.
+def print_summary(summary, quantiles, tail_fractions):
+    column_names = summary.column_names
+    route_time = connection_data.get_column_position(column_names, connection_data.ROUTE_TIME_COLUMN)
+    heap_pushes = connection_data.get_column_position(column_names, connection_data.HEAP_PUSHES_COLUMN)
+    heap_pops = connection_data.get_column_position(column_names, connection_data.HEAP_POPS_COLUMN)
+    moments = summary.moments
+    mean = moments.mean
+    geomean = moments.geomean()
+    std = moments.std()
+
+    print("For the overall distribution of:", summary.name)
+    print("Mean:", mean[route_time], "microseconds")
+    print("Geomean:", geomean[route_time], "microseconds")
+    print("STDEV:", std[route_time], "microseconds")
+    print("Median:", summary.route_time_sketch.quantile(0.5), "microseconds")
+    for q in quantiles:
+        print(f"P{100.0 * q:g}:", summary.route_time_sketch.quantile(q), "microseconds")
+    print("Total time:", moments.total[route_time] / 1000000, "seconds")
+    print("Total number of heap pops:", int(moments.total[heap_pops]))
+    print("Geomean number of heap pops:", geomean[heap_pops])
+    print("Geomean number of heap pushes:", geomean[heap_pushes])
+    print("Median number of heap pops:", summary.heap_pops_sketch.quantile(0.5))
+    print("Max number of heap pops:", int(moments.max[heap_pops]))
+    print("Max number of heap pushes:", int(moments.max[heap_pushes]))
+    print("Number of connections routed:", moments.count)
+    for fraction in tail_fractions:
+        print(f"Percent split: {100.0 * fraction:g}% of the connections make up",
+              100.0 * summary.route_time_sketch.tail_share(fraction), "% of the time.")
+
+    # Print the correlations between each of the metrics and the connection runtime
+    print("Correlations:")
+    correlation = moments.correlation()[:, route_time]
+    for name, value in zip(column_names, correlation):
+        print(f"{name}\t{value:.6f}")
+    print("")
+
+# Plot the CDF of the share of the total route time against the connection
+# route time, from the sketch of the route times.
+def plot_cdf(summary, output_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as mtick
+
+    values, shares = summary.route_time_sketch.cdf_points()
+    plt.figure()
+    plt.plot(values, shares * 100)
+    plt.xscale('log')
+    plt.xlabel("Connection Route Time (microseconds)")
+    plt.ylabel("Cummulative Percent of Total Run Time")
+    plt.title("Cummulative Percent of Total Run Time vs Connection Route Time for " + summary.name)
+    plt.yticks(np.linspace(0.0, 100, 11))
+    plt.yticks(np.linspace(0.0, 100, 101), minor=True)
+    plt.grid(which='minor', alpha=0.2)
+    plt.grid(which='major', alpha=0.5)
+    plt.gca().yaxis.set_major_formatter(mtick.PercentFormatter())
+    os.makedirs(output_dir, exist_ok=True)
+    plt.savefig(os.path.join(output_dir, "connection_route_time_cdf_" + summary.name + ".png"), dpi=300, bbox_inches="tight")
+    plt.close()
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Streams the per-connection data of circuits and prints statistics on it.",
+    )
+    parser.add_argument("circuits", nargs="+",
+                        help="circuit names (read from INPUT_DIR) or connection data CSV files")
+    parser.add_argument("-input-dir", default="input_data", type=str)
+    parser.add_argument("-output-dir", default="output_figures", type=str)
+    parser.add_argument("-j", default=1, type=int, metavar="NUM_PROC",
+                        help="number of circuits to analyze in parallel")
+    parser.add_argument("-chunk-size", default=connection_data.DEFAULT_CHUNK_SIZE, type=int, metavar="ROWS")
+    parser.add_argument("-relative-accuracy", default=0.01, type=float,
+                        help="relative accuracy of the quantiles")
+    parser.add_argument("-quantiles", default=DEFAULT_QUANTILES, type=float, nargs="+")
+    parser.add_argument("-tail-fractions", default=DEFAULT_TAIL_FRACTIONS, type=float, nargs="+")
+    parser.add_argument("-plot", action="store_true", help="plot the CDF of the route time of each circuit")
+    return parser
+
+def analyze_connections_main(arg_list, prog=None):
+    args = command_parser(prog).parse_args(arg_list)
+
+    csv_files = []
+    for circuit in args.circuits:
+        if os.path.isfile(circuit):
+            csv_files.append(circuit)
+        else:
+            csv_files.append(connection_data.get_csv_file(args.input_dir, circuit))
+    for csv_file in csv_files:
+        if not os.path.isfile(csv_file):
+            print("ERROR: Connection data not found:", csv_file)
+            return
+
+    job_args = [(csv_file, args.chunk_size, args.relative_accuracy) for csv_file in csv_files]
+    with Pool(min(args.j, len(job_args))) as pool:
+        summaries = pool.map(analyze_circuit_job, job_args, chunksize=1)
+
+    for summary in summaries:
+        print_summary(summary, args.quantiles, args.tail_fractions)
+        if args.plot:
+            plot_cdf(summary, args.output_dir)
+
+    # The statistics are mergeable, so the circuits can also be looked at as
+    # one distribution (if they have the same columns).
+    if len(summaries) > 1 and all(summary.column_names == summaries[0].column_names for summary in summaries):
+        total = CircuitSummary("all circuits", summaries[0].column_names, args.relative_accuracy)
+        for summary in summaries:
+            total.merge(summary)
+        print_summary(total, args.quantiles, args.tail_fractions)
+
+if __name__ == "__main__":
+    analyze_connections_main(sys.argv[1:])
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helpers to read the per-connection CSV data written by the instrumented VPR
+(<circuit>_connection_data.csv).
+
+The files can hold tens of millions of connections, so they are read in chunks
+with compact column types (float32 for the route time, and the smallest
+integer type which fits for the counts). The compact types are chosen from the
+first rows, so each chunk is parsed with 64-bit types and only narrowed if its
+values fit.
+
+Parsing the text of a large CSV takes minutes, so it can be converted once into
+a columnar cache next to it (<circuit>_connection_data.csv.columns/), holding
+one raw binary file per column and a meta.json describing them. The cache is
+memory-mapped when loaded, so opening it takes milliseconds and only the pages
+which are used are read from disk. The cache is rebuilt if the CSV changes.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Names of the columns of the connection data which are analyzed. They are
+# looked up in the header of a file with find_column, so the order of the
+# columns (and units, such as "Route Time (us)") do not matter.
+NET_ID_COLUMN = "Net ID"
+ROUTE_TIME_COLUMN = "Route Time"
+SINK_RR_NODE_COLUMN = "Sink RR Node"
+ROUTER_ITERATION_COLUMN = "Router Iteration"
+FANOUT_COLUMN = "Fanout"
+HEAP_PUSHES_COLUMN = "Heap Pushes"
+HEAP_POPS_COLUMN = "Heap Pops"
+
+# Positions of the columns in the files the instrumented VPR writes. A column
+# whose name is not in the header of a file is read from its position instead.
+DEFAULT_COLUMN_POSITIONS = {
+    NET_ID_COLUMN: 0,
+    ROUTE_TIME_COLUMN: 1,
+    SINK_RR_NODE_COLUMN: 2,
+    ROUTER_ITERATION_COLUMN: 3,
+    FANOUT_COLUMN: 4,
+    HEAP_PUSHES_COLUMN: 8,
+    HEAP_POPS_COLUMN: 9,
+}
+
+# Columns which have been read from their default position, so the warning is
+# only printed once for each of them.
+positional_columns = set()
+
+# Number of rows read at a time.
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Number of rows used to choose the type of each column.
+DTYPE_SAMPLE_ROWS = 10000
+
+CSV_SUFFIX = "_connection_data.csv"
+
+# Suffix of the columnar cache directory of a CSV file.
+CACHE_SUFFIX = ".columns"
+
+# Version of the layout of the columnar cache.
+CACHE_VERSION = 2
+
+# Helper method to get the CSV file of a circuit in the given directory.
+def get_csv_file(input_dir, circuit_name):
+    return os.path.join(input_dir, circuit_name + CSV_SUFFIX)
+
+# Helper method to get the name of a circuit from its CSV file.
+def get_circuit_name(csv_file):
+    name = os.path.basename(csv_file)
+    if name.endswith(CSV_SUFFIX):
+        return name[:-len(CSV_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+# Helper method to get the form of a column name which is compared: lower case,
+# without units in parentheses, spaces or punctuation.
+def normalize_column_name(name):
+    name = re.sub(r"\(.*?\)", "", str(name))
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+# Helper method to find the name of a column (one of the *_COLUMN names above)
+# as it is written in the given column names of a file. If no column has the
+# name, the column at its default position is used (with a warning).
+def find_column(column_names, column):
+    column_names = list(column_names)
+    for name in column_names:
+        if normalize_column_name(name) == normalize_column_name(column):
+            return name
+    position = DEFAULT_COLUMN_POSITIONS.get(column)
+    if position is not None and position < len(column_names):
+        if (column, column_names[position]) not in positional_columns:
+            positional_columns.add((column, column_names[position]))
+            print(f"WARNING: The connection data has no '{column}' column, using column {position} "
+                  f"('{column_names[position]}').", file=sys.stderr)
+        return column_names[position]
+    raise ValueError(f"The connection data has no '{column}' column (its columns are: {', '.join(map(str, column_names))})")
+
+# Helper method to get the position of a column in the given column names.
+def get_column_position(column_names, column):
+    return list(column_names).index(find_column(column_names, column))
+
+# Helper method to get the names of the columns of a CSV file.
+def read_column_names(csv_file):
+    return list(pd.read_csv(csv_file, nrows=0).columns)
+
+# Choose a compact type for every numeric column of a CSV file, based on the
+# first rows of the file. The route time is always float32; columns of
+# integers get the smallest unsigned (or signed) 32-bit type which fits them.
+def infer_dtypes(csv_file):
+    sample = pd.read_csv(csv_file, nrows=DTYPE_SAMPLE_ROWS)
+    route_time = find_column(sample.columns, ROUTE_TIME_COLUMN)
+    dtypes = dict()
+    for name in sample.columns:
+        values = sample[name]
+        if name == route_time:
+            dtypes[name] = np.float32
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            if len(values) == 0 or values.min() >= 0:
+                dtypes[name] = np.uint32
+            else:
+                dtypes[name] = np.int32
+        elif pd.api.types.is_float_dtype(values.dtype):
+            dtypes[name] = np.float32
+    return dtypes
+
+# Get the types of the columns of a CSV file: those of its columnar cache if it
+# is up to date, otherwise the ones chosen by infer_dtypes.
+def get_dtypes(csv_file):
+    meta = read_cache_meta(csv_file)
+    if meta is None:
+        return infer_dtypes(csv_file)
+    return {column["name"]: np.dtype(column["dtype"]) for column in meta["columns"]}
+
+# Helper method to get the 64-bit type a column is parsed as before it is
+# narrowed to its compact type. pandas silently wraps integers which do not fit
+# the type they are parsed as, so they are never parsed as 32-bit integers.
+def get_wide_dtype(dtype):
+    if np.issubdtype(dtype, np.integer):
+        return np.dtype(np.int64)
+    return np.dtype(np.float64)
+
+# Helper method to check if every value of a column fits in the given type.
+def fits_dtype(values, dtype):
+    if len(values) == 0:
+        return True
+    dtype = np.dtype(dtype)
+    info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+    return values.min() >= info.min and values.max() <= info.max
+
+# Read a CSV file in chunks of chunk_size rows, yielding a DataFrame for each
+# chunk. Only the columns with a type are read. Every column is parsed with a
+# 64-bit type and narrowed to its given type if all of its values in the chunk
+# fit; otherwise it is left wide (with a warning), so values are never wrapped.
+def read_chunks(csv_file, dtypes, chunk_size=DEFAULT_CHUNK_SIZE):
+    wide_dtypes = {name: get_wide_dtype(dtype) for name, dtype in dtypes.items()}
+    warned = set()
+    for chunk in pd.read_csv(csv_file, usecols=list(dtypes.keys()), dtype=wide_dtypes, chunksize=chunk_size):
+        for name, dtype in dtypes.items():
+            if fits_dtype(chunk[name], dtype):
+                chunk[name] = chunk[name].astype(dtype)
+            elif name not in warned:
+                warned.add(name)
+                print(f"WARNING: Column '{name}' of {csv_file} does not fit {np.dtype(dtype)}, "
+                      f"using {wide_dtypes[name]}.", file=sys.stderr)
+        yield chunk
+
+# Helper method to get the columnar cache directory of a CSV file.
+def get_cache_dir(csv_file):
+    return csv_file + CACHE_SUFFIX
+
+# Helper method to read the meta data of the columnar cache of a CSV file.
+# Returns None if there is no cache, or if it is out of date.
+def read_cache_meta(csv_file):
+    meta_file = os.path.join(get_cache_dir(csv_file), "meta.json")
+    try:
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(csv_file)
+    if meta.get("version") != CACHE_VERSION or meta.get("csv_size") != stat.st_size or meta.get("csv_mtime_ns") != stat.st_mtime_ns:
+        return None
+    return meta
+
+# Convert a CSV file into its columnar cache, reading it in chunks so it never
+# has to fit in memory. Returns the meta data of the cache.
+def convert_to_columns(csv_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    stat = os.stat(csv_file)
+    cache_dir = get_cache_dir(csv_file)
+    dtypes = infer_dtypes(csv_file)
+    # Build the cache in a temporary directory and rename it into place, so a
+    # reader never sees a half-written cache.
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(csv_file)), prefix=".tmp_columns_")
+    try:
+        # write_columns widens the type of any column whose values do not fit
+        # the type chosen from the first rows.
+        num_rows = write_columns(csv_file, dtypes, chunk_size, temp_dir)
+        meta = {
+            "version": CACHE_VERSION,
+            "csv_size": stat.st_size,
+            "csv_mtime_ns": stat.st_mtime_ns,
+            "num_rows": num_rows,
+            "columns": [{"name": name, "file": f"{position}.bin", "dtype": np.dtype(dtype).str}
+                        for position, (name, dtype) in enumerate(dtypes.items())],
+        }
+        with open(os.path.join(temp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=1)
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.rename(temp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return meta
+
+# Write every column of a CSV file to its own raw binary file in out_dir, with
+# the given types. If the values of a column in a chunk do not fit its type
+# (read_chunks then leaves the column wide), the rows already written are
+# rewritten with the wide type, and the type in dtypes is updated. Returns the
+# number of rows.
+def write_columns(csv_file, dtypes, chunk_size, out_dir):
+    column_paths = [os.path.join(out_dir, f"{position}.bin") for position in range(len(dtypes))]
+    column_files = [open(column_path, "wb") for column_path in column_paths]
+    num_rows = 0
+    try:
+        for chunk in read_chunks(csv_file, dtypes, chunk_size):
+            for position, name in enumerate(dtypes):
+                values = chunk[name].to_numpy()
+                if not np.can_cast(values.dtype, dtypes[name]):
+                    column_files[position].close()
+                    written = np.fromfile(column_paths[position], dtype=dtypes[name])
+                    written.astype(values.dtype).tofile(column_paths[position])
+                    column_files[position] = open(column_paths[position], "ab")
+                    dtypes[name] = values.dtype
+                column_files[position].write(np.ascontiguousarray(values, dtype=dtypes[name]).tobytes())
+            num_rows += len(chunk)
+    finally:
+        for column_file in column_files:
+            column_file.close()
+    return num_rows
+
+# Load the columns of a CSV file as read-only memory-mapped arrays (a dictionary
+# of column name -> array, in the order of the CSV), converting it into its
+# columnar cache first if needed.
+def load_columns(csv_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    meta = read_cache_meta(csv_file)
+    if meta is None:
+        print("Converting", csv_file, "into its columnar cache...")
+        meta = convert_to_columns(csv_file, chunk_size)
+    cache_dir = get_cache_dir(csv_file)
+    columns = dict()
+    for column in meta["columns"]:
+        dtype = np.dtype(column["dtype"])
+        if meta["num_rows"] == 0:
+            columns[column["name"]] = np.zeros(0, dtype=dtype)
+            continue
+        columns[column["name"]] = np.memmap(os.path.join(cache_dir, column["file"]), dtype=dtype, mode="r",
+                                            shape=(meta["num_rows"],))
+    return columns
+
+# Load a CSV file as a DataFrame whose columns are memory-mapped from its
+# columnar cache (without copying them).
+def load_dataframe(csv_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    return pd.DataFrame(load_columns(csv_file, chunk_size), copy=False)
+
+# Iterate over the rows of a CSV file in chunks of chunk_size rows, yielding a
+# DataFrame for each chunk. The columnar cache is used if it is up to date;
+# otherwise the CSV is parsed with the given column types.
+def iterate_chunks(csv_file, dtypes, chunk_size=DEFAULT_CHUNK_SIZE):
+    if read_cache_meta(csv_file) is None:
+        yield from read_chunks(csv_file, dtypes, chunk_size)
+        return
+    columns = load_columns(csv_file)
+    num_rows = len(next(iter(columns.values()))) if len(columns) != 0 else 0
+    for start in range(0, num_rows, chunk_size):
+        yield pd.DataFrame({name: values[start:start + chunk_size] for name, values in columns.items()}, copy=False)
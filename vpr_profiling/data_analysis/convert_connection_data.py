@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Converts the per-connection CSV data of circuits into their memory-mappable
+columnar caches (see connection_data.py), in parallel.
+
+Usage:
+    python3 convert_connection_data.py bwave_like.float.large-fcin mkPktMerge -j 2
+    python3 convert_connection_data.py input_data/*_connection_data.csv
+"""
+
+import os
+import sys
+import time
+import argparse
+from multiprocessing import Pool
+
+import connection_data
+
+def convert_job(job_args):
+    csv_file, chunk_size, force = job_args
+    if not force and connection_data.read_cache_meta(csv_file) is not None:
+        return csv_file, None
+    start = time.time()
+    meta = connection_data.convert_to_columns(csv_file, chunk_size)
+    return csv_file, (meta["num_rows"], time.time() - start)
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Converts connection data CSVs into memory-mappable columnar caches.",
+    )
+    parser.add_argument("circuits", nargs="+",
+                        help="circuit names (read from INPUT_DIR) or connection data CSV files")
+    parser.add_argument("-input-dir", default="input_data", type=str)
+    parser.add_argument("-j", default=1, type=int, metavar="NUM_PROC",
+                        help="number of circuits to convert in parallel")
+    parser.add_argument("-chunk-size", default=connection_data.DEFAULT_CHUNK_SIZE, type=int, metavar="ROWS")
+    parser.add_argument("-force", action="store_true", help="convert even if the cache is up to date")
+    return parser
+
+def convert_connection_data_main(arg_list, prog=None):
+    args = command_parser(prog).parse_args(arg_list)
+
+    csv_files = []
+    for circuit in args.circuits:
+        if os.path.isfile(circuit):
+            csv_files.append(circuit)
+        else:
+            csv_files.append(connection_data.get_csv_file(args.input_dir, circuit))
+    for csv_file in csv_files:
+        if not os.path.isfile(csv_file):
+            print("ERROR: Connection data not found:", csv_file)
+            return
+
+    job_args = [(csv_file, args.chunk_size, args.force) for csv_file in csv_files]
+    with Pool(min(args.j, len(job_args))) as pool:
+        for csv_file, result in pool.imap_unordered(convert_job, job_args):
+            if result is None:
+                print(csv_file, "is already converted.")
+            else:
+                num_rows, elapsed = result
+                print(f"Converted {csv_file} ({num_rows} connections) in {elapsed:.1f} seconds.")
+
+if __name__ == "__main__":
+    convert_connection_data_main(sys.argv[1:])
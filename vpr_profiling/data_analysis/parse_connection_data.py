@@ -6,27 +6,36 @@ Created on Mon Feb 12 17:43:05 2024
 @author: alex
 """
 
-import pandas as pd
+import sys
 import numpy as np
 from scipy import stats
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 
-# The name of the circuit to analyze the connections of
+import connection_data
+
+# The name of the circuit to analyze the connections of (can also be given on
+# the command line)
 CIRCUIT_NAME = "bwave_like.float.large-fcin"
+if len(sys.argv) > 1:
+    CIRCUIT_NAME = sys.argv[1]
 
 # Calculate the percentage of the runtime that the top 1% of the connections are
 # taking. Or, in other words, 1% of the connections make up X% of the runtime.
 def percentSplit(arr):
-    sorted_arr = np.sort(arr)
-    idx = int(len(sorted_arr) * 0.99)
-    return sorted_arr[idx:].sum() * 100.0 / sorted_arr.sum()
+    arr = np.asarray(arr)
+    idx = int(len(arr) * 0.99)
+    # Only the slowest 1% is needed, so partition the array around it rather
+    # than sorting all of it.
+    top_arr = np.partition(arr, idx)[idx:]
+    return top_arr.sum() * 100.0 / arr.sum()
 
 # Helper method for plotting the CDF of the connection route times.
 def plotCDF(arr):
     fig = plt.figure()
-    # Start by sorting the array and calculating the PDF
-    sorted_arr = np.sort(arr)
+    # Start by sorting the array and calculating the PDF. The route times are
+    # stored as float32, so accumulate in float64 for the CDF to reach 100%.
+    sorted_arr = np.sort(np.asarray(arr, dtype=np.float64))
     pdf = sorted_arr / sorted_arr.sum()
     # Use the cumsum method on the PDF to get the CDF
     cdf = np.cumsum(pdf)
@@ -54,39 +63,46 @@ def plotConnectionRouteTimes(df):
     colors = np.array(['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'])
     num_colors = len(colors)
     # set the color of each point based on their router iteration
-    conn_color = colors[df["Router Iteration"].astype(int).values % num_colors]
+    conn_color = colors[df[ROUTER_ITERATION].astype(int).values % num_colors]
     # Plot the connection route times in a logy scale.
-    ax = df.plot.scatter(x="index", y=2, c=conn_color, logy=True, title="Connection Route Time Per Execution Call for " + CIRCUIT_NAME)
+    ax = df.plot.scatter(x="index", y=ROUTE_TIME, c=conn_color, logy=True, title="Connection Route Time Per Execution Call for " + CIRCUIT_NAME)
     # Save the figure to the output figures directory
     plt.savefig("output_figures/connection_route_time_plot_" + CIRCUIT_NAME + ".png", dpi=300, bbox_inches="tight")
 
-# Read the CSV file of the data
+# Read the CSV file of the data. The columns are memory-mapped from the CSV's
+# columnar cache (which is created the first time the CSV is read).
 print("Reading data for:", CIRCUIT_NAME)
-df = pd.read_csv("input_data/" + CIRCUIT_NAME + "_connection_data.csv")
+df = connection_data.load_dataframe(connection_data.get_csv_file("input_data", CIRCUIT_NAME))
+# Find the columns by name, the same way as the other analysis tools (before
+# the index is added as a column, since it would shift the fallback positions).
+ROUTE_TIME = connection_data.find_column(df.columns, connection_data.ROUTE_TIME_COLUMN)
+HEAP_PUSHES = connection_data.find_column(df.columns, connection_data.HEAP_PUSHES_COLUMN)
+HEAP_POPS = connection_data.find_column(df.columns, connection_data.HEAP_POPS_COLUMN)
+ROUTER_ITERATION = connection_data.find_column(df.columns, connection_data.ROUTER_ITERATION_COLUMN)
 # Reset the index so that index is a column
 df = df.reset_index()
 
 # Print data on the overall distribution
 print("For the overall distribution: ")
-print("Mean:", df.iloc[:, 2].mean(), "microseconds")
-print("Geomean:", stats.gmean(df.iloc[:, 2]), "microseconds")
-print("STDEV:", df.iloc[:, 2].std(), "microseconds")
-print("Median:", df.iloc[:, 2].median(), "microseconds")
-print("Total time:", df.iloc[:, 2].sum() / 1000000, "seconds")
-print("Total number of heap pops:", df.iloc[:, 10].sum())
-print("Geomean number of heap pops:", stats.gmean(df.iloc[:, 10]))
-print("Geomean number of heap pushes:", stats.gmean(df.iloc[:, 9]))
-print("Max number of heap pops:", df.iloc[:, 10].max())
-print("Max number of heap pushes:", df.iloc[:, 9].max())
-print("Number of connections routed:", len(df.iloc[:, 2]))
-print("Percent split: 1% of the connections make up", percentSplit(df.iloc[:, 2]), "% of the time.")
+print("Mean:", df[ROUTE_TIME].mean(), "microseconds")
+print("Geomean:", stats.gmean(df[ROUTE_TIME]), "microseconds")
+print("STDEV:", df[ROUTE_TIME].std(), "microseconds")
+print("Median:", df[ROUTE_TIME].median(), "microseconds")
+print("Total time:", df[ROUTE_TIME].sum() / 1000000, "seconds")
+print("Total number of heap pops:", df[HEAP_POPS].sum())
+print("Geomean number of heap pops:", stats.gmean(df[HEAP_POPS]))
+print("Geomean number of heap pushes:", stats.gmean(df[HEAP_PUSHES]))
+print("Max number of heap pops:", df[HEAP_POPS].max())
+print("Max number of heap pushes:", df[HEAP_PUSHES].max())
+print("Number of connections routed:", len(df[ROUTE_TIME]))
+print("Percent split: 1% of the connections make up", percentSplit(df[ROUTE_TIME]), "% of the time.")
 
 # Print the correlations between each of the metrics and the connection runtime
 print("Correlations:")
-print(df.corr().iloc[:, 2])
+print(df.corr()[ROUTE_TIME])
 
 # Plot the connection route times
 plotConnectionRouteTimes(df)
 
 # Plot the CDF
-plotCDF(df.iloc[:, 2])
+plotCDF(df[ROUTE_TIME])
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Drill-down into the slowest connections of circuits.
+
+The percent split printed by parse_connection_data.py shows that the slowest 1%
+of the connections take a large share of the route time. This finds those
+connections (with np.argpartition, which selects the slowest K without sorting
+all of the connections), clusters them by router iteration and fanout, and
+writes them out:
+    <circuit>_slowest_connections.csv  every one of the slowest connections
+    <circuit>_replay_list.csv          the slowest few connections of each
+                                       cluster (from the clusters which take
+                                       the most time), to be replayed one at a
+                                       time with
+                                       vpr_single_conn_test/run_single_conn.sh
+
+The columns are read from the columnar cache of each CSV (see
+convert_connection_data.py), which is created if it does not exist.
+
+Usage:
+    python3 slow_connections.py bwave_like.float.large-fcin mkPktMerge -j 2
+    python3 slow_connections.py input_data/*_connection_data.csv -fraction 0.001
+"""
+
+import os
+import sys
+import math
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+import connection_data
+
+# Columns of the slowest connection and replay list CSVs.
+SLOWEST_COLUMNS = ["circuit", "net_id", "sink_rr_node", "router_iteration", "fanout",
+                   "route_time_us", "heap_pushes", "heap_pops", "cluster"]
+
+# Get the indices of the k largest values, from the largest to the smallest.
+# Only the k largest values are sorted.
+def top_k_indices(values, k):
+    k = min(k, len(values))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(values, len(values) - k)[len(values) - k:]
+    return top[np.argsort(values[top], kind="stable")[::-1]]
+
+# Helper method to get the fanout bucket of each fanout: bucket b holds the
+# fanouts in [2^b, 2^(b+1)).
+def get_fanout_buckets(fanout):
+    return np.floor(np.log2(np.maximum(fanout, 1))).astype(np.int64)
+
+# Helper method to get the label of a fanout bucket, such as "4-7".
+def get_fanout_label(bucket):
+    low = 1 << int(bucket)
+    high = (low << 1) - 1
+    return str(low) if low == high else f"{low}-{high}"
+
+# Find the slowest connections of a circuit. Returns a DataFrame of them (from
+# the slowest) with their cluster, a DataFrame of the clusters (from the one
+# which takes the most time), the number of connections, and the total route
+# time of all of the connections.
+def find_slowest_connections(csv_file, fraction, top):
+    columns = connection_data.load_columns(csv_file)
+    names = list(columns.keys())
+    route_time = columns[connection_data.find_column(names, connection_data.ROUTE_TIME_COLUMN)]
+    num_connections = len(route_time)
+    k = top if top is not None else math.ceil(fraction * num_connections)
+    indices = np.sort(top_k_indices(route_time, k))
+    # Gather the rows of the slowest connections (in the order of the file, so
+    # the memory-mapped columns are read in order), then order them from the
+    # slowest.
+    slowest = pd.DataFrame({
+        "circuit": connection_data.get_circuit_name(csv_file),
+        "net_id": columns[connection_data.find_column(names, connection_data.NET_ID_COLUMN)][indices],
+        "sink_rr_node": columns[connection_data.find_column(names, connection_data.SINK_RR_NODE_COLUMN)][indices],
+        "router_iteration": columns[connection_data.find_column(names, connection_data.ROUTER_ITERATION_COLUMN)][indices],
+        "fanout": columns[connection_data.find_column(names, connection_data.FANOUT_COLUMN)][indices],
+        "route_time_us": route_time[indices],
+        "heap_pushes": columns[connection_data.find_column(names, connection_data.HEAP_PUSHES_COLUMN)][indices],
+        "heap_pops": columns[connection_data.find_column(names, connection_data.HEAP_POPS_COLUMN)][indices],
+    })
+    slowest = slowest.sort_values("route_time_us", ascending=False, kind="stable").reset_index(drop=True)
+
+    # Cluster the connections by their router iteration and fanout bucket.
+    fanout_bucket = get_fanout_buckets(slowest["fanout"].to_numpy())
+    slowest["cluster"] = [f"iter{iteration}_fanout{get_fanout_label(bucket)}"
+                          for iteration, bucket in zip(slowest["router_iteration"], fanout_bucket)]
+    total_time = float(route_time.sum(dtype=np.float64))
+    tail_time = float(slowest["route_time_us"].sum())
+    clusters = slowest.groupby("cluster", sort=False).agg(
+        router_iteration=("router_iteration", "first"),
+        fanout_min=("fanout", "min"),
+        fanout_max=("fanout", "max"),
+        num_connections=("route_time_us", "size"),
+        route_time_us=("route_time_us", "sum"),
+        mean_route_time_us=("route_time_us", "mean"),
+        mean_heap_pushes=("heap_pushes", "mean"),
+        mean_heap_pops=("heap_pops", "mean"),
+    )
+    clusters["percent_of_tail_time"] = clusters["route_time_us"] * 100.0 / max(tail_time, 1e-300)
+    clusters["percent_of_total_time"] = clusters["route_time_us"] * 100.0 / max(total_time, 1e-300)
+    clusters = clusters.sort_values("route_time_us", ascending=False)
+    return slowest, clusters, num_connections, total_time
+
+# Get the replay list: the slowest per_cluster connections of each cluster,
+# from the cluster which takes the most time, up to max_replay connections.
+def get_replay_list(slowest, clusters, per_cluster, max_replay):
+    replay = slowest.groupby("cluster", sort=False).head(per_cluster)
+    cluster_order = {cluster: position for position, cluster in enumerate(clusters.index)}
+    replay = replay.assign(cluster_order=replay["cluster"].map(cluster_order))
+    replay = replay.sort_values(["cluster_order", "route_time_us"], ascending=[True, False], kind="stable")
+    return replay.drop(columns="cluster_order").head(max_replay).reset_index(drop=True)
+
+def slow_connections_job(job_args):
+    csv_file, fraction, top, per_cluster, max_replay, output_dir = job_args
+    slowest, clusters, num_connections, total_time = find_slowest_connections(csv_file, fraction, top)
+    replay = get_replay_list(slowest, clusters, per_cluster, max_replay)
+    circuit_name = connection_data.get_circuit_name(csv_file)
+    os.makedirs(output_dir, exist_ok=True)
+    slowest.to_csv(os.path.join(output_dir, circuit_name + "_slowest_connections.csv"), index=False,
+                   columns=SLOWEST_COLUMNS)
+    replay.to_csv(os.path.join(output_dir, circuit_name + "_replay_list.csv"), index=False,
+                  columns=SLOWEST_COLUMNS)
+    return circuit_name, slowest, clusters, num_connections, total_time, len(replay)
+
+# Print the clusters of the slowest connections of a circuit.
+def print_clusters(circuit_name, slowest, clusters, num_connections, total_time, max_clusters):
+    tail_time = slowest["route_time_us"].sum()
+    print(f"The {len(slowest)} slowest of the {num_connections} connections of {circuit_name} make up",
+          tail_time * 100.0 / max(total_time, 1e-300), "% of the time.")
+    if len(slowest) != 0:
+        print("Route time of the slowest connections:", slowest["route_time_us"].iloc[-1], "to",
+              slowest["route_time_us"].iloc[0], "microseconds")
+    table = clusters.head(max_clusters).copy()
+    table["fanout"] = [f"{low}-{high}" if low != high else str(low)
+                       for low, high in zip(table["fanout_min"], table["fanout_max"])]
+    table = table[["router_iteration", "fanout", "num_connections", "percent_of_tail_time", "percent_of_total_time",
+                   "mean_route_time_us", "mean_heap_pushes", "mean_heap_pops"]]
+    print(table.to_string(float_format=lambda value: f"{value:.2f}"))
+    if len(clusters) > max_clusters:
+        print(f"({len(clusters) - max_clusters} more clusters)")
+    print("")
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Finds the slowest connections of circuits and writes them out as a replay list.",
+    )
+    parser.add_argument("circuits", nargs="+",
+                        help="circuit names (read from INPUT_DIR) or connection data CSV files")
+    parser.add_argument("-input-dir", default="input_data", type=str)
+    parser.add_argument("-output-dir", default="output_data", type=str)
+    parser.add_argument("-j", default=1, type=int, metavar="NUM_PROC",
+                        help="number of circuits to analyze in parallel")
+    parser.add_argument("-fraction", default=0.01, type=float,
+                        help="fraction of the connections to take the slowest of")
+    parser.add_argument("-top", default=None, type=int, metavar="K",
+                        help="take the K slowest connections (instead of a fraction)")
+    parser.add_argument("-per-cluster", default=5, type=int, metavar="NUM",
+                        help="number of connections of each cluster in the replay list")
+    parser.add_argument("-max-replay", default=100, type=int, metavar="NUM",
+                        help="maximum number of connections in the replay list")
+    parser.add_argument("-max-clusters", default=20, type=int, metavar="NUM",
+                        help="number of clusters to print")
+    return parser
+
+def slow_connections_main(arg_list, prog=None):
+    args = command_parser(prog).parse_args(arg_list)
+
+    csv_files = []
+    for circuit in args.circuits:
+        if os.path.isfile(circuit):
+            csv_files.append(circuit)
+        else:
+            csv_files.append(connection_data.get_csv_file(args.input_dir, circuit))
+    for csv_file in csv_files:
+        if not os.path.isfile(csv_file):
+            print("ERROR: Connection data not found:", csv_file)
+            return
+
+    job_args = [(csv_file, args.fraction, args.top, args.per_cluster, args.max_replay,
+                 args.output_dir) for csv_file in csv_files]
+    with Pool(min(args.j, len(job_args))) as pool:
+        for circuit_name, slowest, clusters, num_connections, total_time, replay_size in \
+                pool.imap(slow_connections_job, job_args):
+            print_clusters(circuit_name, slowest, clusters, num_connections, total_time, args.max_clusters)
+            print(f"Wrote {replay_size} connections to replay to",
+                  os.path.join(args.output_dir, circuit_name + "_replay_list.csv"))
+            print("")
+
+if __name__ == "__main__":
+    slow_connections_main(sys.argv[1:])
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mergeable streaming statistics, used to analyze connection data which does not
+fit in memory.
+
+Every statistic here is updated one chunk of rows at a time and can be merged
+with the same statistic computed over other rows (another chunk, or another
+circuit), giving the same result as if all of the rows had been seen at once.
+"""
+
+import math
+import numpy as np
+
+# Count, mean, co-moments, sum, sum of logs, min and max of every column of a
+# stream of rows. The co-moments give the variance of each column and the
+# correlation between every pair of columns.
+class StreamingMoments:
+    def __init__(self, num_columns):
+        self.count = 0
+        self.mean = np.zeros(num_columns)
+        # Sum of the products of the deviations from the mean of every pair
+        # of columns.
+        self.comoment = np.zeros((num_columns, num_columns))
+        self.total = np.zeros(num_columns)
+        # Sum and count of the logs of the positive values (for the geomean).
+        self.log_total = np.zeros(num_columns)
+        self.log_count = np.zeros(num_columns, dtype=np.int64)
+        self.min = np.full(num_columns, np.inf)
+        self.max = np.full(num_columns, -np.inf)
+
+    # Add a chunk (a 2D array with one row per row of the stream).
+    def update(self, chunk):
+        if len(chunk) == 0:
+            return
+        chunk = np.asarray(chunk, dtype=np.float64)
+        other = StreamingMoments(chunk.shape[1])
+        other.count = len(chunk)
+        other.mean = chunk.mean(axis=0)
+        centered = chunk - other.mean
+        other.comoment = centered.T @ centered
+        other.total = chunk.sum(axis=0)
+        positive = chunk > 0
+        with np.errstate(divide="ignore"):
+            other.log_total = np.where(positive, np.log(np.where(positive, chunk, 1.0)), 0.0).sum(axis=0)
+        other.log_count = positive.sum(axis=0)
+        other.min = chunk.min(axis=0)
+        other.max = chunk.max(axis=0)
+        self.merge(other)
+
+    # Merge the statistics of other rows into these.
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update({key: np.copy(value) if isinstance(value, np.ndarray) else value
+                                  for key, value in other.__dict__.items()})
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        # Chan et al.'s parallel update of the co-moments.
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.count * other.count / count)
+        self.mean = self.mean + delta * (other.count / count)
+        self.count = count
+        self.total = self.total + other.total
+        self.log_total = self.log_total + other.log_total
+        self.log_count = self.log_count + other.log_count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+    # Sample standard deviation of every column.
+    def std(self):
+        if self.count < 2:
+            return np.zeros(len(self.mean))
+        return np.sqrt(np.diag(self.comoment) / (self.count - 1))
+
+    # Geomean of the positive values of every column.
+    def geomean(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.exp(self.log_total / self.log_count)
+
+    # Pearson correlation matrix of the columns.
+    def correlation(self):
+        variance = np.diag(self.comoment)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.comoment / np.sqrt(np.outer(variance, variance))
+
+# Quantile sketch of a stream of non-negative values (in the style of
+# DDSketch). Values are counted in buckets whose bounds grow geometrically, so
+# any quantile is found to within a relative error of relative_accuracy, using
+# memory which only depends on the range of the values. Each bucket also
+# keeps the sum of its values, so the share of the total held by the largest
+# values (the tail) can be found too.
+class LogHistogramSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # Bucket i holds the values in (gamma^(i-1), gamma^i]. The buckets are
+        # kept in dense arrays starting at bucket offset.
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0)
+        # Values which are zero (or negative) are counted separately.
+        self.zero_count = 0
+
+    def get_count(self):
+        return self.zero_count + int(self.counts.sum())
+
+    def get_total(self):
+        return float(self.sums.sum())
+
+    # Grow the bucket arrays to cover the buckets [low, high].
+    def _resize(self, low, high):
+        if len(self.counts) == 0:
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            self.sums = np.zeros(high - low + 1)
+            return
+        new_offset = min(low, self.offset)
+        new_size = max(high, self.offset + len(self.counts) - 1) - new_offset + 1
+        if new_offset == self.offset and new_size == len(self.counts):
+            return
+        counts = np.zeros(new_size, dtype=np.int64)
+        sums = np.zeros(new_size)
+        start = self.offset - new_offset
+        counts[start:start + len(self.counts)] = self.counts
+        sums[start:start + len(self.sums)] = self.sums
+        self.offset = new_offset
+        self.counts = counts
+        self.sums = sums
+
+    # Add an array of values.
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        indices = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        low = int(indices.min())
+        high = int(indices.max())
+        self._resize(low, high)
+        self.counts += np.bincount(indices - self.offset, minlength=len(self.counts))
+        self.sums += np.bincount(indices - self.offset, weights=positive, minlength=len(self.sums))
+
+    # Merge the values of another sketch (with the same accuracy) into this one.
+    def merge(self, other):
+        assert other.gamma == self.gamma
+        self.zero_count += other.zero_count
+        if len(other.counts) == 0:
+            return
+        self._resize(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        self.counts[start:start + len(other.counts)] += other.counts
+        self.sums[start:start + len(other.sums)] += other.sums
+
+    # A value in the bucket at the given position which is within the
+    # relative accuracy of every value in the bucket.
+    def _bucket_value(self, position):
+        return 2.0 * self.gamma ** (position + self.offset) / (self.gamma + 1.0)
+
+    # Get the q-th quantile (0.0 to 1.0) of the values.
+    def quantile(self, q):
+        count = self.get_count()
+        if count == 0:
+            return math.nan
+        rank = q * (count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = np.cumsum(self.counts) + self.zero_count
+        position = int(np.searchsorted(cumulative, rank, side="right"))
+        return self._bucket_value(min(position, len(self.counts) - 1))
+
+    # Get the share (0.0 to 1.0) of the total of the values held by the
+    # largest fraction of the values. For example, tail_share(0.01) is the
+    # share of the total route time taken by the slowest 1% of connections.
+    def tail_share(self, fraction):
+        total = self.get_total()
+        if total == 0.0:
+            return math.nan
+        remaining = fraction * self.get_count()
+        tail_total = 0.0
+        for position in range(len(self.counts) - 1, -1, -1):
+            count = self.counts[position]
+            if count == 0:
+                continue
+            if count >= remaining:
+                # Only part of this bucket is in the tail.
+                tail_total += self.sums[position] * remaining / count
+                break
+            tail_total += self.sums[position]
+            remaining -= count
+        return tail_total / total
+
+    # Get the (value, cumulative share of the total) of every bucket, for
+    # plotting the CDF of the total (such as the share of the route time
+    # taken by connections up to a given route time).
+    def cdf_points(self):
+        nonzero = np.nonzero(self.counts)[0]
+        values = np.array([self._bucket_value(position) for position in nonzero])
+        shares = np.cumsum(self.sums[nonzero]) / max(self.get_total(), 1e-300)
+        return values, shares
@@ -1,82 +1,188 @@
 #!/usr/bin/python3
 
+# Analyzes the mod list profiles written by VPR. Each row of a profile is one
+# mod list (the RR nodes whose routing data is reset after a connection is
+# routed), without a header:
+#   mod list size, total num nodes, min/max node ID of the chanx nodes,
+#   min/max node ID of the chany nodes, min/max node ID of the other nodes
+# (the min is larger than the max if the mod list has no nodes of that type).
+#
+# Every profile is loaded into NumPy arrays and the metrics are computed for all
+# of the rows at once; many profiles are analyzed in parallel. Besides the
+# average and geomean of the mod list size and node ID spread, the percentiles
+# and histograms of both are printed, along with an estimate of how many cache
+# lines and pages resetting each mod list touches, to judge how much reordering
+# the RR nodes for locality could save.
+
 import sys
 import argparse
+from multiprocessing import Pool
 
 import math
-import csv
+import numpy as np
+
+NUM_COLUMNS = 8
+
+# Size of a cache line and of a page, in bytes.
+CACHE_LINE_SIZE = 64
+PAGE_SIZE = 4096
+
+# Size of the per-node routing data which is reset (t_rr_node_route_inf).
+DEFAULT_NODE_BYTES = 24
+
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
 
 # Helper method to generate a parser for the command line interface.
 def command_parser(prog=None):
-    description = "Runs a given test."
+    description = "Analyzes mod list profiles."
     parser = argparse.ArgumentParser(
         prog=prog,
         description=description,
         epilog="",
     )
 
-    parser.add_argument("csv_file")
+    parser.add_argument("csv_files", nargs="+")
+    parser.add_argument("-j", default=1, type=int, metavar="NUM_PROC",
+                        help="number of profiles to analyze in parallel")
+    parser.add_argument("-node-bytes", default=DEFAULT_NODE_BYTES, type=int,
+                        help="bytes of routing data per RR node which are reset")
+    parser.add_argument("-percentiles", default=DEFAULT_PERCENTILES, type=float, nargs="+")
+    parser.add_argument("-no-histograms", action="store_true", help="do not print the histograms")
 
     return parser
 
+# Load a mod list profile into a 2D array with one row per mod list.
+def load_profile(csv_file):
+    return np.loadtxt(csv_file, delimiter=",", dtype=np.int64, ndmin=2, usecols=range(NUM_COLUMNS))
+
+# Helper method to get the number of IDs spanned by each of the node ID ranges
+# of the mod lists (as a 2D array with one column per range); empty ranges span
+# none.
+def get_range_spans(profile):
+    min_ids = profile[:, 2::2]
+    max_ids = profile[:, 3::2]
+    return np.where(min_ids <= max_ids, max_ids - min_ids + 1, 0)
+
+# Estimate the number of blocks (cache lines or pages) of block_size bytes
+# touched when resetting each mod list, if its nodes were spread uniformly over
+# its node ID ranges. The nodes of a mod list are split between its ranges in
+# proportion to their spans. Returns the expected number of blocks, and the
+# number of blocks if the nodes were packed next to each other (the best a
+# locality-aware node order could do).
+def estimate_blocks(mod_list_size, spans, node_bytes, block_size):
+    total_span = spans.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(total_span[:, None] > 0, spans / total_span[:, None], 0.0)
+    nodes = np.minimum(mod_list_size[:, None] * share, spans)
+    blocks = np.ceil(spans * node_bytes / block_size)
+    # A block holding b of the IDs of a range is skipped by all of the nodes
+    # with probability (1 - nodes/span)^b.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ids_per_block = np.where(blocks > 0, spans / blocks, 0.0)
+        fraction = np.where(spans > 0, nodes / spans, 0.0)
+        touched = blocks * -np.expm1(ids_per_block * np.log1p(-np.minimum(fraction, 1.0 - 1e-12)))
+    # A range of a single block is touched if it holds any nodes.
+    touched = np.where(blocks == 1, (nodes > 0).astype(np.float64), touched)
+    expected = touched.sum(axis=1)
+    packed = np.ceil(mod_list_size * node_bytes / block_size)
+    return expected, packed
+
+# Helper method to get the geomean of the positive values of an array.
+def geomean(values):
+    positive = values[values > 0]
+    if len(positive) == 0:
+        return math.nan
+    return math.exp(np.log(positive).mean())
+
+# Analyze one profile, returning a dictionary of its metrics (as arrays with
+# one value per mod list) and its total number of nodes.
+def analyze_profile(job_args):
+    csv_file, node_bytes = job_args
+    profile = load_profile(csv_file)
+    total_num_nodes = np.unique(profile[:, 1])
+    mod_list_size = profile[:, 0]
+    spans = get_range_spans(profile)
+    metrics = {
+        "Mod List size": mod_list_size,
+        "dist": spans.sum(axis=1),
+    }
+    metrics["Cache lines (expected)"], metrics["Cache lines (packed)"] = \
+        estimate_blocks(mod_list_size, spans, node_bytes, CACHE_LINE_SIZE)
+    metrics["Pages (expected)"], metrics["Pages (packed)"] = \
+        estimate_blocks(mod_list_size, spans, node_bytes, PAGE_SIZE)
+    return csv_file, metrics, total_num_nodes
+
+# Print a histogram of the values in power of two buckets.
+def print_histogram(name, values):
+    values = values[values > 0]
+    if len(values) == 0:
+        return
+    buckets = np.floor(np.log2(values)).astype(np.int64)
+    counts = np.bincount(buckets)
+    print(f"Histogram of {name}:")
+    bar_scale = 50.0 / counts.max()
+    for bucket, count in enumerate(counts):
+        if count == 0:
+            continue
+        low = 1 << bucket
+        print(f"  [{low}, {low << 1}):".ljust(26) + f"{count:>10}  " + "#" * int(math.ceil(count * bar_scale)))
+
+# Print the metrics of a profile (or of several profiles together).
+def print_summary(name, metrics, total_num_nodes, node_bytes, percentiles, histograms):
+    mod_list_size = metrics["Mod List size"]
+    dist = metrics["dist"]
+    print(f"{name}:")
+    print(f"Number of mod lists: {len(mod_list_size)}")
+    if len(mod_list_size) == 0:
+        print("")
+        return
+    print(f"Average Mod List size: {mod_list_size.mean()}")
+    print(f"Geomean Mod List size: {geomean(mod_list_size)}")
+    print(f"Average dist: {dist.mean()}")
+    print(f"Geomean dist: {geomean(dist)}")
+    print(f"Total num nodes: {', '.join(str(num_nodes) for num_nodes in total_num_nodes)}")
+    for metric, values in metrics.items():
+        print(f"{metric}: " + "  ".join(f"P{p:g} {value:g}" for p, value in
+                                       zip(percentiles, np.percentile(values, percentiles))) +
+              f"  max {values.max():g}")
+
+    # Compare the cache lines and pages touched by resetting the mod lists
+    # with what they would touch if their nodes were packed together, and with
+    # resetting the routing data of every node.
+    for unit, block_size in [("Cache lines", CACHE_LINE_SIZE), ("Pages", PAGE_SIZE)]:
+        expected = metrics[unit + " (expected)"].sum()
+        packed = metrics[unit + " (packed)"].sum()
+        print(f"{unit} touched in total: {expected:.0f} expected, {packed:.0f} if packed "
+              f"({expected / max(packed, 1.0):.2f}x)")
+        if len(total_num_nodes) == 1:
+            all_nodes = math.ceil(total_num_nodes[0] * node_bytes / block_size)
+            print(f"{unit} of the routing data of all nodes: {all_nodes} "
+                  f"(an average mod list touches {metrics[unit + ' (expected)'].mean() * 100.0 / all_nodes:.3f}%)")
+
+    if histograms:
+        print_histogram("Mod List size", mod_list_size)
+        print_histogram("dist", dist)
+    print("")
+
 def parse_mod_list_profile_main(arg_list, prog=None):
     # Load the arguments
     args = command_parser(prog).parse_args(arg_list)
 
-    with open(args.csv_file) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=",")
-        avg_mod_list_size = 0
-        geomean_mod_list_size = 0.0
-        count = 0
-
-        avg_dist = 0
-        geomean_dist = 0.0
-
-        total_num_nodes_set = set()
-        for row in csv_reader:
-            # Assumign no header information
-            mod_list_size = int(row[0])
-            total_num_nodes = int(row[1])
-            min_node_id_chanx = int(row[2])
-            max_node_id_chanx = int(row[3])
-            min_node_id_chany = int(row[4])
-            max_node_id_chany = int(row[5])
-            min_node_id_other = int(row[6])
-            max_node_id_other = int(row[7])
-
-            total_num_nodes_set.add(total_num_nodes)
-            
-            avg_mod_list_size += mod_list_size
-            geomean_mod_list_size += math.log(mod_list_size)
-
-            dist = 0
-            if (min_node_id_chanx <= max_node_id_chanx):
-                dist += max_node_id_chanx - min_node_id_chanx + 1
-            if (min_node_id_chany <= max_node_id_chany):
-                dist += max_node_id_chany - min_node_id_chany + 1
-            if (min_node_id_other <= max_node_id_other):
-                dist += max_node_id_other - min_node_id_other + 1
-            # dist = max_node_id - min_node_id
-            avg_dist += dist
-            geomean_dist += math.log(dist)
-
-            count += 1
-
-        assert(len(total_num_nodes_set) == 1)
-        total_num_nodes = total_num_nodes_set.pop()
-
-        avg_mod_list_size /= count
-        geomean_mod_list_size = math.exp(geomean_mod_list_size / float(count))
-
-        avg_dist /= count
-        geomean_dist = math.exp(geomean_dist / float(count))
-
-        print(f"Average Mod List size: {avg_mod_list_size}")
-        print(f"Geomean Mod List size: {geomean_mod_list_size}")
-        print(f"Average dist: {avg_dist}")
-        print(f"Geomean dist: {geomean_dist}")
-        print(f"Total num nodes: {total_num_nodes}")
+    job_args = [(csv_file, args.node_bytes) for csv_file in args.csv_files]
+    with Pool(min(args.j, len(job_args))) as pool:
+        results = pool.map(analyze_profile, job_args, chunksize=1)
+
+    for csv_file, metrics, total_num_nodes in results:
+        if len(total_num_nodes) > 1:
+            print(f"WARNING: {csv_file} has more than one total number of nodes.")
+        print_summary(csv_file, metrics, total_num_nodes, args.node_bytes, args.percentiles, not args.no_histograms)
+
+    # Look at the mod lists of all of the profiles together too.
+    if len(results) > 1:
+        metrics = {metric: np.concatenate([result[1][metric] for result in results]) for metric in results[0][1]}
+        total_num_nodes = np.unique(np.concatenate([result[2] for result in results]))
+        print_summary("All profiles", metrics, total_num_nodes, args.node_bytes, args.percentiles,
+                      not args.no_histograms)
 
 if __name__ == "__main__":
     parse_mod_list_profile_main(sys.argv[1:])
-
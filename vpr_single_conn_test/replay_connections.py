@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+
+# Batch replay of single connections.
+#
+# Routes each connection of a list of (circuit, net, sink) targets (such as the
+# replay list written by vpr_profiling/data_analysis/slow_connections.py) with
+# the single connection branch of VPR, reusing the pre-computed benchmark of the
+# circuit (benchmark_pre_compute_<circuit>, created by run_single_conn.sh). The
+# targets are run concurrently against a budget of cores, and the route time
+# and heap statistics of every connection are gathered into one table.
+
+import os
+import re
+import csv
+import sys
+import glob
+import math
+import time
+import shutil
+import argparse
+import pathlib
+import subprocess
+
+# The log scanner and scheduler are shared with the testing scripts, and the
+# columns of the connection data are looked up as the data analysis does.
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()) + "/../testing")
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()) + "/../vpr_profiling/data_analysis")
+import log_scanner
+import scheduler
+import connection_data
+
+SCRIPT_DIR = str(pathlib.Path(__file__).parent.resolve())
+
+DEFAULT_VTR_DIR = os.path.expanduser("~/vtr-verilog-to-routing")
+DEFAULT_ARCH = "vtr_flow/arch/timing/k6_frac_N10_frac_chain_mem32K_40nm.xml"
+
+BENCHMARK_DIR_PREFIX = "benchmark_pre_compute_"
+
+# Columns of the results table.
+RESULT_COLUMNS = ["circuit", "net_id", "sink_rr_node", "status", "wall_time_s", "routing_time_s", "load_time_s",
+                  "route_time_us", "heap_pushes", "heap_pops", "max_rss_mib", "baseline_route_time_us"]
+
+# Helper method to read the targets from replay list CSVs. Each row needs a
+# circuit, net_id, and sink_rr_node; the route_time_us of the connection (from
+# the connection data) is kept as its baseline if there is one.
+def read_targets(replay_lists):
+    targets = []
+    for replay_list in replay_lists:
+        with open(replay_list, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                baseline = row.get("route_time_us", "")
+                targets.append({
+                    "circuit": row["circuit"],
+                    "net_id": int(row["net_id"]),
+                    "sink_rr_node": int(row["sink_rr_node"]),
+                    "baseline_route_time_us": float(baseline) if baseline not in (None, "") else None,
+                })
+    return targets
+
+# Find the pre-computed benchmark of a circuit in benchmark_dir_base. The circuit
+# names of the connection data may have a suffix (such as
+# bwave_like.float.large-fcin), so the longest benchmark name which the circuit
+# name starts with is used. Returns (benchmark dir, benchmark circuit name), or
+# None if there is none.
+def find_benchmark(benchmark_dir_base, circuit):
+    best = None
+    for benchmark_dir in glob.glob(os.path.join(benchmark_dir_base, BENCHMARK_DIR_PREFIX + "*")):
+        name = os.path.basename(benchmark_dir)[len(BENCHMARK_DIR_PREFIX):]
+        if circuit.startswith(name) and (best is None or len(name) > len(best[1])):
+            best = (benchmark_dir, name)
+    return best
+
+# Helper method to get the channel width the benchmark's RR graph was built
+# with, from the log of the run which pre-computed it.
+def get_benchmark_chan_width(benchmark_dir):
+    log_file = os.path.join(benchmark_dir, "vpr.out")
+    if not os.path.isfile(log_file):
+        return None
+    pattern = re.compile(r"channel width factor of (\d+)")
+    chan_width = None
+    with open(log_file, 'r', errors='replace') as f:
+        for line in f:
+            match = pattern.search(line)
+            if match:
+                chan_width = int(match.group(1))
+    return chan_width
+
+# Helper method to find the row of a connection in the connection data the
+# instrumented VPR writes (if it wrote any). Returns (route time in us, heap
+# pushes, heap pops), or None.
+def read_connection_row(working_dir, net_id, sink_rr_node):
+    for csv_file in glob.glob(os.path.join(working_dir, "*connection_data.csv")):
+        with open(csv_file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            try:
+                positions = [connection_data.get_column_position(header, column)
+                             for column in [connection_data.NET_ID_COLUMN, connection_data.SINK_RR_NODE_COLUMN,
+                                            connection_data.ROUTE_TIME_COLUMN, connection_data.HEAP_PUSHES_COLUMN,
+                                            connection_data.HEAP_POPS_COLUMN]]
+            except ValueError as error:
+                print(f"WARNING: Skipping {csv_file}: {error}")
+                continue
+            net_id_pos, sink_pos, route_time_pos, heap_pushes_pos, heap_pops_pos = positions
+            for row in reader:
+                if len(row) > max(positions) and int(row[net_id_pos]) == net_id and int(row[sink_pos]) == sink_rr_node:
+                    return float(row[route_time_pos]), int(row[heap_pushes_pos]), int(row[heap_pops_pos])
+    return None
+
+# Route a single target connection with VPR, on the given cores.
+def run_replay(job_args, cores=None):
+    target, benchmark_dir, benchmark_name, vtr_dir, arch, chan_width, num_threads, extra_vpr_args, working_dir, timeout = job_args
+
+    if os.path.isdir(working_dir):
+        shutil.rmtree(working_dir)
+    os.makedirs(working_dir)
+
+    thread_args = []
+    if num_threads > 1:
+        thread_args = ["--multi_queue_num_threads", str(num_threads)]
+    if cores is not None:
+        thread_args += ["--thread_affinity", ",".join(str(core) for core in cores)]
+
+    benchmark_base = os.path.join(benchmark_dir, benchmark_name)
+    vpr_command = [vtr_dir + "/vpr/vpr",
+        arch,
+        "--net_file", benchmark_base + ".net",
+        "--place_file", benchmark_base + ".place",
+        "--read_rr_graph", benchmark_base + ".rr_graph.bin",
+        "--read_router_lookahead", benchmark_base + ".router_lookahead.capnp",
+        "--route",
+        "--route_chan_width", str(chan_width),
+        "--router_debug_net", str(target["net_id"]),
+        "--router_debug_sink_rr", str(target["sink_rr_node"])] + thread_args + extra_vpr_args + [benchmark_base + ".pre-vpr.blif"]
+
+    result = dict(target)
+    result["status"] = "ok"
+    start_time = time.time()
+    with open(os.path.join(working_dir, "vpr.out"), "w") as vpr_out, \
+            open(os.path.join(working_dir, "vpr_err.out"), "w") as vpr_err:
+        try:
+            process = subprocess.run(vpr_command, cwd=working_dir, stdout=vpr_out, stderr=vpr_err,
+                                     timeout=timeout if timeout != 0.0 else None)
+            if process.returncode != 0:
+                result["status"] = f"failed ({process.returncode})"
+        except subprocess.TimeoutExpired:
+            result["status"] = "timeout"
+    result["wall_time_s"] = time.time() - start_time
+
+    metrics = log_scanner.collect_metrics(os.path.join(working_dir, "vpr.out"), ["routing_time", "heap_push_pop"])
+    result["routing_time_s"] = None
+    result["max_rss_mib"] = None
+    result["heap_pushes"] = None
+    result["heap_pops"] = None
+    if len(metrics["routing_time"]) != 0:
+        result["routing_time_s"], result["max_rss_mib"] = metrics["routing_time"][-1]
+    if len(metrics["heap_push_pop"]) != 0:
+        result["heap_pushes"], result["heap_pops"] = metrics["heap_push_pop"][-1]
+    # Everything but routing is loading the RR graph, lookahead, netlist, and
+    # placement.
+    result["load_time_s"] = None
+    if result["routing_time_s"] is not None:
+        result["load_time_s"] = max(result["wall_time_s"] - result["routing_time_s"], 0.0)
+
+    # The connection data of the instrumented VPR is more precise than the log.
+    result["route_time_us"] = None
+    row = read_connection_row(working_dir, target["net_id"], target["sink_rr_node"])
+    if row is not None:
+        result["route_time_us"], result["heap_pushes"], result["heap_pops"] = row
+    elif result["routing_time_s"] is not None:
+        result["route_time_us"] = result["routing_time_s"] * 1e6
+    return result
+
+# Helper method to get the name of the scheduler job of a target.
+def get_target_name(target):
+    return f"{target['circuit']}/net{target['net_id']}_sink{target['sink_rr_node']}"
+
+# Helper method to format a value of the results table.
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+# Print the results table, and a summary of the connections which routed.
+def print_results(results):
+    rows = [[format_value(result.get(column)) for column in RESULT_COLUMNS] for result in results]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(RESULT_COLUMNS)]
+    print("  ".join(column.ljust(width) for column, width in zip(RESULT_COLUMNS, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+    routed = [result for result in results if result["status"] == "ok" and result["route_time_us"]]
+    print("")
+    print(f"{len(routed)} of {len(results)} connections routed.")
+    if len(routed) == 0:
+        return
+    print("Total route time:", sum(result["route_time_us"] for result in routed) / 1e6, "seconds")
+    print("Geomean route time:", math.exp(sum(math.log(result["route_time_us"]) for result in routed) / len(routed)),
+          "microseconds")
+    # Compare against the route times the connections had in the connection
+    # data they were taken from.
+    compared = [result for result in routed if result["baseline_route_time_us"]]
+    if len(compared) != 0:
+        speedup = math.exp(sum(math.log(result["baseline_route_time_us"] / result["route_time_us"])
+                               for result in compared) / len(compared))
+        print(f"Geomean speedup over the baseline route time: {speedup:.3f}x ({len(compared)} connections)")
+
+# Helper method to write the results table to a CSV file.
+def write_results(results, output_file):
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_COLUMNS)
+        for result in results:
+            writer.writerow(["" if result.get(column) is None else result.get(column) for column in RESULT_COLUMNS])
+
+# Helper method to generate a parser for the command line interface.
+def command_parser(prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Routes a list of single connections with VPR and gathers their route times into one table.",
+    )
+    parser.add_argument("replay_lists", nargs="+",
+                        help="CSV files of target connections (with circuit, net_id, and sink_rr_node columns)")
+    parser.add_argument("-vtr_dir", default=DEFAULT_VTR_DIR, type=str)
+    parser.add_argument("-arch", default=None, type=str,
+                        help=f"architecture file (default: VTR_DIR/{DEFAULT_ARCH})")
+    parser.add_argument("-benchmark-dir-base", default=SCRIPT_DIR, type=str,
+                        help=f"directory holding the {BENCHMARK_DIR_PREFIX}<circuit> directories")
+    parser.add_argument("-route_chan_width", default=None, type=int,
+                        help="channel width (default: the one the benchmark was pre-computed with)")
+    parser.add_argument("-cores", default=len(os.sched_getaffinity(0)), type=int,
+                        help="number of cores the connections are routed on")
+    parser.add_argument("-T", default=1, type=int, help="number of threads of each VPR run")
+    parser.add_argument("-timeout", default=0.0, type=float, help="timeout of each VPR run in seconds (0 for none)")
+    parser.add_argument("-extra_vpr_args", default="", type=str, help="extra arguments passed to VPR")
+    parser.add_argument("-working-dir", default=os.path.join(SCRIPT_DIR, "temp_replay"), type=str)
+    parser.add_argument("-output", default="replay_results.csv", type=str, help="CSV file the results are written to")
+    return parser
+
+def replay_connections_main(arg_list, prog=None):
+    args = command_parser(prog).parse_args(arg_list)
+
+    targets = read_targets(args.replay_lists)
+    if len(targets) == 0:
+        print("ERROR: No target connections given.")
+        return
+    if not scheduler.check_core_budget(args.cores, args.T):
+        return
+    vtr_dir = os.path.abspath(os.path.expanduser(args.vtr_dir))
+    arch = os.path.abspath(args.arch) if args.arch is not None else os.path.join(vtr_dir, DEFAULT_ARCH)
+    extra_vpr_args = args.extra_vpr_args.split()
+
+    # Find the pre-computed benchmark of every circuit.
+    benchmarks = dict()
+    for circuit in sorted(set(target["circuit"] for target in targets)):
+        benchmark = find_benchmark(args.benchmark_dir_base, circuit)
+        if benchmark is None:
+            print(f"ERROR: No pre-computed benchmark for {circuit} in {args.benchmark_dir_base} "
+                  f"(run run_single_conn.sh for it first).")
+            return
+        chan_width = args.route_chan_width
+        if chan_width is None:
+            chan_width = get_benchmark_chan_width(benchmark[0])
+        if chan_width is None:
+            print(f"ERROR: Could not find the channel width of {benchmark[0]}; give -route_chan_width.")
+            return
+        benchmarks[circuit] = benchmark + (chan_width,)
+
+    jobs = []
+    for target in targets:
+        benchmark_dir, benchmark_name, chan_width = benchmarks[target["circuit"]]
+        name = get_target_name(target)
+        working_dir = os.path.join(os.path.abspath(args.working_dir), name)
+        jobs.append(scheduler.Job(name, [target, benchmark_dir, benchmark_name, vtr_dir, arch, chan_width, args.T,
+                                         extra_vpr_args, working_dir, args.timeout], args.T))
+
+    # Routing a connection takes the time to load the benchmark plus its route
+    # time, so the longest connections are started first using the history.
+    history = scheduler.RuntimeHistory(os.path.join(SCRIPT_DIR, "replay_runtime_history.json"))
+    results = scheduler.run_with_core_budget(run_replay, jobs, args.cores, history,
+        on_result=lambda job, result: print(f"{job.name} is done! ({result['status']})"))
+
+    print("")
+    print_results(results)
+    write_results(results, args.output)
+    print("Results written to", args.output)
+
+if __name__ == "__main__":
+    replay_connections_main(sys.argv[1:])
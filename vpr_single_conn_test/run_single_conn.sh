@@ -3,9 +3,16 @@
 # It will pre-compute the benchmark circuit and store its information in a directory,
 # to make future runs of the VPR router faster. This will make debugging the router
 # easier.
+#
+# If a replay list is given (written by vpr_profiling/data_analysis/slow_connections.py),
+# VPR is run once for each of its connections of the circuit, with the net and
+# sink RR node of the connection as the target connection:
+#   ./run_single_conn.sh replay_list.csv
 
 set -ex
 
+REPLAY_LIST=$(realpath -e "${1:-/dev/null}")
+
 SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
 VTR_ROOT=~/vtr-verilog-to-routing
 ARCH=$VTR_ROOT/vtr_flow/arch/timing/k6_frac_N10_frac_chain_mem32K_40nm.xml
@@ -44,14 +51,33 @@ else
 fi
 
 # Run VPR on the pre-calculated input
-$VTR_ROOT/vpr/vpr \
-        $ARCH \
-        --net_file $BENCHMARK_DIR/$CIRCUIT_NAME.net \
-        --place_file $BENCHMARK_DIR/$CIRCUIT_NAME.place \
-        --read_rr_graph $BENCHMARK_DIR/$CIRCUIT_NAME.rr_graph.bin \
-        --read_router_lookahead $BENCHMARK_DIR/$CIRCUIT_NAME.router_lookahead.capnp \
-        --route \
-        --route_chan_width $CHANNEL_WIDTH \
-        $BENCHMARK_DIR/$CIRCUIT_NAME.pre-vpr.blif
+run_vpr() {
+	$VTR_ROOT/vpr/vpr \
+		$ARCH \
+		--net_file $BENCHMARK_DIR/$CIRCUIT_NAME.net \
+		--place_file $BENCHMARK_DIR/$CIRCUIT_NAME.place \
+		--read_rr_graph $BENCHMARK_DIR/$CIRCUIT_NAME.rr_graph.bin \
+		--read_router_lookahead $BENCHMARK_DIR/$CIRCUIT_NAME.router_lookahead.capnp \
+		--route \
+		--route_chan_width $CHANNEL_WIDTH \
+		"$@" \
+		$BENCHMARK_DIR/$CIRCUIT_NAME.pre-vpr.blif
+}
+
+if [ "$REPLAY_LIST" = "/dev/null" ]; then
+	run_vpr
+else
+	# Replay each connection of this circuit in the list (skipping the header),
+	# keeping the log of each run. The circuit names of the connection data may
+	# have a suffix (such as bwave_like.float.large-fcin).
+	tail -n +2 "$REPLAY_LIST" | while IFS=, read -r circuit net_id sink_rr_node rest; do
+		case "$circuit" in
+			"$CIRCUIT_NAME"*) ;;
+			*) continue ;;
+		esac
+		run_vpr --router_debug_net $net_id --router_debug_sink_rr $sink_rr_node \
+			> $TEMP_DIR/vpr_net${net_id}_sink${sink_rr_node}.out
+	done
+fi
 
 